@@ -0,0 +1 @@
+"""Benchmarks e utilitários de carga do backend (não fazem parte da imagem)."""
@@ -0,0 +1,147 @@
+"""
+Benchmark: AnswerStore (SQLite WAL em disco) com 100k entradas.
+
+- gravação em lote das entradas (como o flush periódico);
+- cold start: abrir o arquivo e encher o L1 com `warm`, com o L1 no
+  tamanho padrão e com capacidade para tudo. Mede o tempo total e a
+  maior travada do event loop durante a carga (o readiness não espera a
+  carga, então a travada é o que uma requisição concorrente sentiria);
+- latência de leitura: hit no L1, `fetch` do disco (via thread, como no
+  miss do L1) e a consulta direta por chave primária;
+- compactação com metade das entradas vencidas.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_answer_store [--entries 100000] [--reads 5000]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import main
+
+ANSWER = ("A Arbache Consulting desenvolve programas de liderança e educação corporativa "
+          "alinhados a ESG. Quer saber como funciona para a sua empresa?")
+
+
+def percentiles(samples: list[float]) -> str:
+    samples.sort()
+    return (f"p50={statistics.median(samples):7.1f}us "
+            f"p99={samples[int(len(samples) * 0.99) - 1]:7.1f}us")
+
+
+def populate(store: main.AnswerStore, entries: int, batch: int = 5000) -> float:
+    now = time.time()
+    started = time.perf_counter()
+    for offset in range(0, entries, batch):
+        rows = []
+        for i in range(offset, min(offset + batch, entries)):
+            cache = "research" if i % 4 == 0 else "responses"
+            fresh = now + 3600 + i  # mais recentes no fim
+            rows.append((cache, f"v2|pergunta {i}|hero||", f"{ANSWER} #{i}", fresh, fresh + 600))
+        store._write_sync(rows)
+    return time.perf_counter() - started
+
+
+async def cold_start(path: str, l1_entries: int) -> tuple[float, float, float, int]:
+    """Retorna (abrir ms, carga ms, maior travada do loop ms, entradas no L1)."""
+    started = time.perf_counter()
+    store = main.AnswerStore(path)
+    open_ms = (time.perf_counter() - started) * 1000
+    caches = [main.ResponseCache(max_entries=l1_entries, max_bytes=1 << 40, persist_as=name)
+              for name in ("responses", "research")]
+
+    stall = 0.0
+    loading = True
+
+    async def ticker() -> None:
+        nonlocal stall
+        last = time.perf_counter()
+        while loading:
+            await asyncio.sleep(0)
+            now = time.perf_counter()
+            stall = max(stall, now - last)
+            last = now
+
+    tick = asyncio.create_task(ticker())
+    started = time.perf_counter()
+    await store.warm(caches)
+    load_ms = (time.perf_counter() - started) * 1000
+    loading = False
+    await tick
+    await store.aclose()
+    return open_ms, load_ms, stall * 1000, sum(len(c._entries) for c in caches)
+
+
+async def reads(path: str, entries: int, count: int) -> None:
+    store = main.AnswerStore(path)
+    cache = main.ResponseCache(max_entries=2000, persist_as="responses")
+    keys = [f"v2|pergunta {i}|hero||" for i in random.sample(range(entries), count) if i % 4]
+    for key in keys[:2000]:
+        cache.set(key, ANSWER)
+
+    l1: list[float] = []
+    for key in keys[:2000]:
+        started = time.perf_counter()
+        cache.get(key)
+        l1.append((time.perf_counter() - started) * 1e6)
+
+    disk_async: list[float] = []
+    disk_sync: list[float] = []
+    store._pending.clear()
+    for key in keys:
+        started = time.perf_counter()
+        await store.fetch("responses", key)
+        disk_async.append((time.perf_counter() - started) * 1e6)
+        started = time.perf_counter()
+        store._fetch_sync("responses", key)
+        disk_sync.append((time.perf_counter() - started) * 1e6)
+    print(f"read  L1 hit                  {percentiles(l1)}")
+    print(f"read  disk fetch (to_thread)  {percentiles(disk_async)}")
+    print(f"read  disk point query        {percentiles(disk_sync)}")
+    await store.aclose()
+
+
+def compaction(path: str, entries: int) -> None:
+    store = main.AnswerStore(path)
+    with store._lock:
+        store._conn.execute("UPDATE answers SET stale_until = 0 WHERE CAST(substr(key, 13) AS INTEGER) % 2 = 0")
+    size_before = os.path.getsize(path)
+    started = time.perf_counter()
+    removed = store._compact_sync()
+    elapsed = (time.perf_counter() - started) * 1000
+    print(f"compact removed={removed} of {entries} in {elapsed:.0f}ms "
+          f"file {size_before / 1e6:.1f}MB -> {os.path.getsize(path) / 1e6:.1f}MB")
+    asyncio.run(store.aclose())
+
+
+def cli() -> None:
+    parser = argparse.ArgumentParser(description="AnswerStore: cold start, leitura e compactação.")
+    parser.add_argument("--entries", type=int, default=100000)
+    parser.add_argument("--reads", type=int, default=5000)
+    args = parser.parse_args()
+
+    main.log_writer.stream = open(os.devnull, "w")  # logs fora da medição
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "answers.db")
+        store = main.AnswerStore(path)
+        elapsed = populate(store, args.entries)
+        asyncio.run(store.aclose())
+        print(f"write {args.entries} entries in {elapsed * 1000:.0f}ms "
+              f"({args.entries / elapsed:,.0f} rows/s), file {os.path.getsize(path) / 1e6:.1f}MB")
+
+        for l1_entries in (main.RESPONSE_CACHE_MAX_ENTRIES, args.entries):
+            open_ms, load_ms, stall_ms, loaded = asyncio.run(cold_start(path, l1_entries))
+            print(f"cold start L1={l1_entries:<7} open={open_ms:5.1f}ms load={load_ms:7.1f}ms "
+                  f"loaded={loaded:<7} max_loop_stall={stall_ms:5.1f}ms")
+
+        asyncio.run(reads(path, args.entries, args.reads))
+        compaction(path, args.entries)
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,81 @@
+"""
+Benchmark: varredura linear antiga do FAQ vs índice invertido.
+
+Gera FAQs sintéticos de tamanhos crescentes (as 10 perguntas reais mais
+variações) e mede o tempo por consulta das duas implementações para uma
+mistura de mensagens que casam e que não casam.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_faq [--sizes 10,100,1000,5000]
+"""
+
+import argparse
+import random
+import time
+from typing import Optional
+
+import main
+
+TOPICS = [
+    "trilhas", "mentoria", "assessment", "liderança", "esg", "palestras",
+    "imersões", "hubmulher", "colabs", "certificações", "auditorias", "networking",
+    "carreira", "rh", "inovação", "sustentabilidade", "e-learning", "icons",
+]
+FORMS = [
+    "como funciona {t} {n}", "quanto custa {t} {n}", "qual o prazo de {t} {n}",
+    "quem conduz {t} {n}", "{t} {n} é online", "onde acontece {t} {n}",
+]
+QUERIES = [
+    "o que a arbache faz?", "Quem e Ana Paula Arbache", "como agendar uma reunião",
+    "ia", "qual a capital da frança", "me fale sobre mentoria de carreira para líderes",
+    "Como funciona o Assessment com IA?", "quais serviços vocês oferecem",
+]
+
+
+def legacy_check_faq(faq: dict[str, str], message: str) -> Optional[str]:
+    """Implementação anterior de check_faq_v2."""
+    lower = message.lower().strip()
+    for key, answer in faq.items():
+        if key in lower or lower in key:
+            return answer
+    return None
+
+
+def synthetic_faq(size: int, rng: random.Random) -> dict[str, str]:
+    faq = dict(main.FAQ_V2)
+    while len(faq) < size:
+        key = rng.choice(FORMS).format(t=rng.choice(TOPICS), n=f"modelo {rng.randint(0, 10**6)}")
+        faq[key] = f"Resposta para {key}."
+    return faq
+
+
+def per_call_us(fn, queries: list[str], rounds: int) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for query in queries:
+            fn(query)
+    return (time.perf_counter() - started) / (rounds * len(queries)) * 1e6
+
+
+def cli() -> None:
+    parser = argparse.ArgumentParser(description="FAQ linear vs índice invertido.")
+    parser.add_argument("--sizes", default="10,100,1000,5000")
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    for size in (int(s) for s in args.sizes.split(",")):
+        faq = synthetic_faq(size, rng)
+        started = time.perf_counter()
+        index = main.FaqIndex(faq)
+        build_ms = (time.perf_counter() - started) * 1000
+        legacy = per_call_us(lambda m: legacy_check_faq(faq, m), QUERIES, args.rounds)
+        indexed = per_call_us(index.match, QUERIES, args.rounds)
+        print(
+            f"faq={len(faq):<6} build={build_ms:8.1f}ms "
+            f"legacy={legacy:9.2f}us/query indexed={indexed:7.2f}us/query"
+        )
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,129 @@
+"""
+Benchmark: orçamento de tokens do histórico de conversa no v2.
+
+Monta conversas de 6 mensagens (respostas longas do assistente, como as
+do curador) e chama `query_openai_v2` / `query_anthropic_v2` contra o stub
+local (`stub_upstream.py`), com latência proporcional ao tamanho do corpo
+(prefill), em três configurações:
+
+- `off`: sem orçamento (todo o histórico que o modelo de request aceita);
+- `drop`: orçamento `HISTORY_TOKEN_BUDGET`, descartando o turno que não cabe;
+- `truncate`: mesmo orçamento, mantendo o fim do turno que não cabe.
+
+Reporta o tamanho médio do corpo enviado, os tokens estimados de
+histórico, os tokens economizados e a latência p50 do stub. Falha (exit 1)
+se o stub recusar alguma requisição, se a pergunta atual não for a última
+mensagem ou se o histórico passar do orçamento.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_history_budget [--conversations 40] [--budget 600]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+import httpx
+
+import main
+from benchmarks.stub_upstream import StubRoute, StubUpstream
+
+USER_TURNS = [
+    "Como funciona o programa de liderança para equipes comerciais",
+    "E quanto tempo costuma durar a parte presencial",
+    "Vocês conseguem adaptar isso para uma empresa com três unidades no interior",
+    "Como a Arbache mede os resultados depois do programa",
+]
+ASSISTANT_SENTENCES = [
+    "A Arbache Consulting desenha cada programa a partir de um diagnóstico da cultura e dos indicadores da empresa.",
+    "Os encontros combinam trilhas de aprendizagem, mentoria e projetos aplicados ao dia a dia das equipes.",
+    "Trabalhamos com líderes e times para alinhar metas comerciais a práticas de ESG e governança.",
+    "A duração varia conforme o escopo, mas os ciclos costumam ter entre três e seis meses.",
+    "Ao final, o relatório de impacto compara os indicadores de partida com os resultados alcançados.",
+]
+
+
+def conversation(rng: random.Random) -> list[main.ConversationMessage]:
+    history = []
+    for turn in range(3):
+        history.append(main.ConversationMessage(role="user", content=rng.choice(USER_TURNS) + "?"))
+        answer = " ".join(rng.choice(ASSISTANT_SENTENCES) for _ in range(rng.randint(6, 12)))
+        history.append(main.ConversationMessage(role="assistant", content=answer[:2000]))
+    return history
+
+
+def saved_total() -> dict[str, float]:
+    return {labels[0]: child.sum for labels, child in main.history_tokens_saved._children.items()}
+
+
+async def run_policy(policy: str, budget: int, histories: list, latency_ms: float,
+                     per_kb_ms: float) -> int:
+    main.HISTORY_POLICY = policy
+    stub = await StubUpstream(latency_ms=latency_ms, latency_per_kb_ms=per_kb_ms).start()
+    main.upstream_pool._build_client = lambda: httpx.AsyncClient(transport=StubRoute(stub))
+    before = saved_total()
+    latencies: dict[str, list[float]] = {"openai": [], "anthropic": []}
+    failures = 0
+    try:
+        for i, history in enumerate(histories):
+            question = f"Qual seria o próximo passo para a minha empresa ({i})"
+            for provider, query in (("openai", main.query_openai_v2), ("anthropic", main.query_anthropic_v2)):
+                started = time.perf_counter()
+                await query(question, "Seção de programas", history, "bench")
+                latencies[provider].append((time.perf_counter() - started) * 1000)
+    finally:
+        await main.upstream_pool.aclose()
+        await stub.stop()
+
+    after = saved_total()
+    for provider in ("openai", "anthropic"):
+        bodies = [body for path, body in stub.bodies
+                  if path.startswith("/v1/messages") == (provider == "anthropic")]
+        sizes = [len(json.dumps(body, ensure_ascii=False).encode()) for body in bodies]
+        history_tokens = []
+        for body in bodies:
+            messages = [m for m in body["messages"] if m["role"] != "system"]
+            if not messages[-1]["content"].startswith("Qual seria"):
+                failures += 1
+            history_tokens.append(sum(main.estimate_tokens(m["content"], provider)
+                                      + main.TOKEN_MESSAGE_OVERHEAD[provider] for m in messages[:-1]))
+        if budget and policy != "off" and max(history_tokens) > budget:
+            failures += 1
+        saved = (after.get(provider, 0) - before.get(provider, 0)) / max(len(bodies), 1)
+        print(f"{policy:<9} {provider:<10} body={statistics.mean(sizes):7.0f}B "
+              f"history_tokens={statistics.mean(history_tokens):6.0f} saved/req={saved:6.0f} "
+              f"p50={statistics.median(latencies[provider]):6.1f}ms")
+    if stub.shape_errors:
+        print(f"shape_errors={sorted(set(stub.shape_errors))}")
+    return failures + len(stub.shape_errors)
+
+
+def cli() -> None:
+    parser = argparse.ArgumentParser(description="Orçamento de tokens do histórico (v2).")
+    parser.add_argument("--conversations", type=int, default=40)
+    parser.add_argument("--budget", type=int, default=main.HISTORY_TOKEN_BUDGET)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--latency-per-kb-ms", type=float, default=4.0)
+    args = parser.parse_args()
+
+    main.log_writer.stream = open(os.devnull, "w")  # logs fora da medição
+    main.Config._openai_key = "bench"
+    main.Config._anthropic_key = "bench"
+    rng = random.Random(7)
+    histories = [conversation(rng) for _ in range(args.conversations)]
+
+    failures = 0
+    for policy in ("off", "drop", "truncate"):
+        main.HISTORY_TOKEN_BUDGET = 0 if policy == "off" else args.budget
+        failures += asyncio.run(run_policy(policy, args.budget, histories,
+                                           args.latency_ms, args.latency_per_kb_ms))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    cli()
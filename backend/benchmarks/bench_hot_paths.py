@@ -0,0 +1,326 @@
+"""
+Microbenchmarks dos helpers de CPU que toda requisição de chat executa,
+com baseline em JSON e comparação com limite de regressão.
+
+Casos: `clean_response` e `truncate_response` (saída típica e saída de
+1000 linhas com markdown, citações e URLs), `check_boundary`,
+`check_faq_v2`, `is_elaborate_question`, `is_greeting` e
+`generate_follow_up_suggestions` (pergunta curta, mensagem no limite de
+2000 caracteres e entradas adversariais), `check_rate_limit` (10k IPs
+distintos, backend em memória) e a validação Pydantic de
+`ChatRequestV2` (com 6 mensagens de histórico de 2000 caracteres) e de
+`ChatResponseV2` (montagem + JSON).
+
+Os helpers de intenção passam pelo memo de `classify_message`; os casos
+`cold` limpam o memo a cada chamada (primeira vez que a mensagem aparece,
+o custo real por requisição) e os `warm` medem o memo acertando.
+
+Cada caso é calibrado para ~`--min-time` por amostra, com o GC desligado
+(como o timeit), e a suíte inteira roda `--rounds` vezes intercalada
+(`--repeat` amostras por caso em cada volta): uma janela lenta da máquina
+não pega todas as amostras do mesmo caso. Vale o mínimo em ns por chamada.
+
+O `compare` não usa tempo absoluto: uma carga de referência fixa (regex,
+dict e str em Python puro, sem código do backend) é medida em cada volta,
+e cada caso vira a razão entre o seu tempo e o da referência na mesma
+volta. A distância entre as duas melhores voltas é o ruído do caso, e o
+limite de cada caso é o maior entre `--threshold` e duas vezes esse ruído
+(no baseline ou na rodada atual); caso acima do limite ainda é medido de
+novo antes de virar regressão.
+
+O baseline (`hot_paths_baseline.json`) é da máquina e fica fora do git:
+o primeiro `compare` sem baseline grava um e sai com sucesso; `run --save`
+regrava. Em CI, grave o baseline com o código da base e compare o da
+mudança no mesmo job.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_hot_paths run [--save] [--filter check_faq]
+    python -m benchmarks.bench_hot_paths compare [--baseline benchmarks/hot_paths_baseline.json] [--threshold 25]
+"""
+
+import argparse
+import asyncio
+import gc
+import itertools
+import json
+import os
+import platform
+import re
+import statistics
+import sys
+import time
+from typing import Any, Callable
+
+import main
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "hot_paths_baseline.json")
+
+SHORT = "Quais serviços vocês oferecem?"
+MEDIUM = "Como funciona o programa de liderança da Arbache para equipes comerciais em empresas de médio porte"
+GREETING = "Olá!"
+MAX_MESSAGE = (
+    "Boa tarde! Sou gestora de pessoas numa indústria com três unidades no interior e estamos "
+    "revendo a formação de lideranças. Queria entender como a Arbache trabalha educação "
+    "corporativa, mentoria e ESG, quanto tempo dura um programa, se há trilhas para supervisores "
+    "recém-promovidos e como vocês medem os resultados depois. "
+) * 8
+MAX_MESSAGE = MAX_MESSAGE[:2000]
+# Quase-acertos de palavras-chave, pontuação e acentos: o pior caso dos classificadores
+ADVERSARIAL = ("hierarquia apoio boiada chile métodos ágeis bonus ?!?! ... ação-reação "
+               "olá-olá oi? serviçoserviço ESGESG liderança.liderança ") * 20
+ADVERSARIAL = ADVERSARIAL[:2000]
+NO_SPACES = "ç" * 2000
+
+LLM_TYPICAL = (
+    "**A Arbache Consulting** desenvolve programas de liderança [1] alinhados a ESG.\n"
+    "- Diagnóstico da cultura e dos indicadores da empresa [2]\n"
+    "- Trilhas com mentoria e projetos aplicados (https://arbache.com/programas)\n"
+    "\n"
+    "Os ciclos costumam durar de três a seis meses [3].\n"
+    "Quer saber como funciona para a sua empresa?\n"
+)
+LLM_1000_LINES = "\n".join(
+    line
+    for i in range(250)
+    for line in (
+        f"## Seção {i}: **liderança** e _educação corporativa_ [{i % 9 + 1}]",
+        f"- Ponto {i} com citação [{i % 7 + 1}][{i % 5 + 1}] e link https://example.com/ref/{i}?q=esg",
+        f"* Outro item `código {i}` — ver fonte: www.fonte{i}.com.br",
+        "",
+    )
+)
+
+HISTORY = [
+    {"role": "user" if i % 2 == 0 else "assistant", "content": MAX_MESSAGE}
+    for i in range(6)
+]
+REQUEST_SHORT = {"message": SHORT, "section": "hero"}
+REQUEST_FULL = {"message": MAX_MESSAGE, "section": "servicos",
+                "sectionContext": "Serviços de educação corporativa" * 10,
+                "conversationHistory": HISTORY}
+
+
+_REFERENCE_RE = re.compile(r"\w+")
+
+
+def reference_workload() -> int:
+    """Carga fixa, independente do backend: régua da velocidade da máquina."""
+    counts: dict[str, int] = {}
+    for word in _REFERENCE_RE.findall(MAX_MESSAGE.lower()):
+        counts[word] = counts.get(word, 0) + 1
+    return len(sorted(counts, key=counts.__getitem__))
+
+
+def cold(fn: Callable[[str], Any], message: str) -> Callable[[], Any]:
+    clear = main.classify_message.cache_clear
+
+    def call() -> Any:
+        clear()
+        return fn(message)
+    return call
+
+
+def build_response() -> str:
+    return main.ChatResponseV2(
+        response=LLM_TYPICAL,
+        badges=["Educação Corporativa", "Liderança", "ESG", "Inovação"],
+        suggestions=["Quem é Ana Paula Arbache?", "Quais serviços vocês oferecem?", "Como agendar uma reunião?"],
+        request_id="00000000-0000-0000-0000-000000000000",
+    ).model_dump_json()
+
+
+def cases() -> dict[str, Callable[[], Any]]:
+    ips = itertools.cycle([f"10.0.{i >> 8}.{i & 255}" for i in range(10000)])
+    main.is_greeting(GREETING)  # memo quente para os casos warm
+    main.check_boundary(SHORT)
+
+    async def rate_limit() -> bool:
+        return await main.check_rate_limit(next(ips))
+
+    return {
+        "clean_response/typical": lambda: main.clean_response(LLM_TYPICAL),
+        "clean_response/1000-lines": lambda: main.clean_response(LLM_1000_LINES),
+        "truncate_response/typical": lambda: main.truncate_response(LLM_TYPICAL),
+        "truncate_response/1000-lines": lambda: main.truncate_response(LLM_1000_LINES),
+        "check_boundary/short-cold": cold(main.check_boundary, SHORT),
+        "check_boundary/short-warm": lambda: main.check_boundary(SHORT),
+        "check_boundary/max-cold": cold(main.check_boundary, MAX_MESSAGE),
+        "check_boundary/adversarial-cold": cold(main.check_boundary, ADVERSARIAL),
+        "check_boundary/no-spaces-cold": cold(main.check_boundary, NO_SPACES),
+        "check_faq_v2/short": lambda: main.check_faq_v2(SHORT),
+        "check_faq_v2/max": lambda: main.check_faq_v2(MAX_MESSAGE),
+        "check_faq_v2/adversarial": lambda: main.check_faq_v2(ADVERSARIAL),
+        "is_elaborate_question/medium-cold": cold(main.is_elaborate_question, MEDIUM),
+        "is_elaborate_question/max-cold": cold(main.is_elaborate_question, MAX_MESSAGE),
+        "is_greeting/greeting-cold": cold(main.is_greeting, GREETING),
+        "is_greeting/greeting-warm": lambda: main.is_greeting(GREETING),
+        "is_greeting/adversarial-cold": cold(main.is_greeting, ADVERSARIAL),
+        "generate_follow_up_suggestions/short-cold": cold(
+            lambda m: main.generate_follow_up_suggestions(m, "hero"), SHORT),
+        "generate_follow_up_suggestions/max-cold": cold(
+            lambda m: main.generate_follow_up_suggestions(m, "servicos"), MAX_MESSAGE),
+        "check_rate_limit/10k-ips": rate_limit,
+        "ChatRequestV2/short": lambda: main.ChatRequestV2.model_validate(REQUEST_SHORT),
+        "ChatRequestV2/max-with-history": lambda: main.ChatRequestV2.model_validate(REQUEST_FULL),
+        "ChatResponseV2/build-and-dump": build_response,
+    }
+
+
+def timer(fn: Callable[[], Any], loop: asyncio.AbstractEventLoop) -> Callable[[int], float]:
+    """Função que roda `fn` n vezes e devolve os segundos gastos."""
+    if asyncio.iscoroutinefunction(fn):
+        async def batch(number: int) -> float:
+            started = time.perf_counter()
+            for _ in range(number):
+                await fn()
+            return time.perf_counter() - started
+        return lambda number: loop.run_until_complete(batch(number))
+
+    def run(number: int) -> float:
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        return time.perf_counter() - started
+    return run
+
+
+def measure(fn: Callable[[], Any], loop: asyncio.AbstractEventLoop, min_time: float,
+            repeat: int) -> dict:
+    run = timer(fn, loop)
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        number = 1
+        while (elapsed := run(number)) < min_time:
+            number *= max(2, min(10, int(min_time / max(elapsed, 1e-9)) + 1))
+        per_call = [run(number) / number * 1e9 for _ in range(repeat)]
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return {"ns_min": round(min(per_call), 1), "ns_median": round(statistics.median(per_call), 1),
+            "number": number}
+
+
+def run_suite(args: argparse.Namespace, loop: asyncio.AbstractEventLoop) -> dict:
+    suite = {"reference_workload": reference_workload}
+    suite.update((name, fn) for name, fn in cases().items()
+                 if not args.filter or args.filter in name)
+    samples: dict[str, list[dict]] = {name: [] for name in suite}
+    for _ in range(args.rounds):
+        for name, fn in suite.items():
+            samples[name].append(measure(fn, loop, args.min_time, args.repeat))
+
+    references = [r["ns_min"] for r in samples.pop("reference_workload")]
+    results = {}
+    for name, rounds in samples.items():
+        ratios = sorted(r["ns_min"] / ref for r, ref in zip(rounds, references))
+        results[name] = {
+            "ns_min": min(r["ns_min"] for r in rounds),
+            "ns_median": statistics.median(r["ns_median"] for r in rounds),
+            "number": rounds[-1]["number"],
+            "ratio": round(ratios[0], 6),
+            # Quanto o mínimo se reproduz: distância até a segunda melhor volta
+            "noise_pct": round((ratios[1] - ratios[0]) / ratios[0] * 100, 1) if len(ratios) > 1 else 0.0,
+        }
+        print(f"{name:<45} {results[name]['ns_min'] / 1000:10.2f}us "
+              f"(median {results[name]['ns_median'] / 1000:.2f}us, n={results[name]['number']}, "
+              f"ruído {results[name]['noise_pct']:.0f}%)")
+    return {
+        "meta": {"python": platform.python_version(), "machine": platform.machine(),
+                 "reference_ns": min(references),
+                 "platform": platform.platform(), "cpus": os.cpu_count(),
+                 "created": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "results": results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float,
+            remeasure: Callable[[str], float]) -> int:
+    if baseline["meta"].get("python") != current["meta"]["python"]:
+        print(f"aviso: baseline em Python {baseline['meta'].get('python')}, "
+              f"rodando em {current['meta']['python']}")
+    regressions = 0
+    print(f"\n{'case':<45} {'baseline':>9} {'current':>9} {'delta':>8} {'limite':>7}  (razão sobre a referência)")
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name)
+        if before is None or "ratio" not in before:
+            print(f"{name:<45} {'-':>9} {result['ratio']:9.3f}      new")
+            continue
+        limit = max(threshold, 2 * before["noise_pct"], 2 * result["noise_pct"])
+        delta = (result["ratio"] - before["ratio"]) / before["ratio"] * 100
+        if delta > limit:
+            # Ruído pontual (outro processo) costuma não se repetir
+            result["ratio"] = min(result["ratio"], remeasure(name))
+            delta = (result["ratio"] - before["ratio"]) / before["ratio"] * 100
+        flag = ""
+        if delta > limit:
+            flag = "  REGRESSION"
+            regressions += 1
+        elif delta < -limit:
+            flag = "  faster"
+        print(f"{name:<45} {before['ratio']:9.3f} {result['ratio']:9.3f} "
+              f"{delta:+7.1f}% {limit:6.0f}%{flag}")
+    for name in baseline["results"].keys() - current["results"].keys():
+        print(f"{name:<45} ausente nesta rodada")
+    print(f"\n{regressions} regressão(ões) acima do limite")
+    return regressions
+
+
+def save(result: dict, path: str) -> None:
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    print(f"gravado em {path}")
+
+
+def cli() -> None:
+    parser = argparse.ArgumentParser(description="Microbenchmarks dos helpers de CPU com baseline.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name in ("run", "compare"):
+        p = sub.add_parser(name)
+        p.add_argument("--filter", default=None, help="só casos cujo nome contém o texto")
+        p.add_argument("--min-time", type=float, default=0.05, help="segundos por amostra")
+        p.add_argument("--rounds", type=int, default=3, help="voltas intercaladas na suíte")
+        p.add_argument("--repeat", type=int, default=3, help="amostras por caso em cada volta")
+    sub.choices["run"].add_argument("--save", action="store_true", help=f"grava em {BASELINE_PATH}")
+    sub.choices["run"].add_argument("--out", default=None, help="grava o resultado neste arquivo")
+    sub.choices["compare"].add_argument("--baseline", default=BASELINE_PATH)
+    sub.choices["compare"].add_argument("--threshold", type=float, default=25.0,
+                                        help="regressão máxima aceita, em %% do mínimo")
+    args = parser.parse_args()
+
+    main.log_writer.stream = open(os.devnull, "w")  # logs fora da medição
+    loop = asyncio.new_event_loop()
+    if args.command == "compare" and not os.path.exists(args.baseline):
+        # Primeira rodada nesta máquina: vira o baseline, nada a comparar
+        print(f"sem baseline em {args.baseline}; gravando esta rodada como baseline")
+        current = run_suite(args, loop)
+        loop.close()
+        save(current, args.baseline)
+        return
+
+    if args.command == "compare":
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if args.filter:
+            baseline["results"] = {k: v for k, v in baseline["results"].items() if args.filter in k}
+        current = run_suite(args, loop)
+        suite = cases()
+
+        def remeasure(name: str) -> float:
+            runs = args.repeat * args.rounds
+            reference = measure(reference_workload, loop, args.min_time, runs)["ns_min"]
+            return measure(suite[name], loop, args.min_time, runs)["ns_min"] / reference
+
+        regressions = compare(baseline, current, args.threshold, remeasure)
+        loop.close()
+        sys.exit(1 if regressions else 0)
+
+    current = run_suite(args, loop)
+    loop.close()
+    for path in filter(None, (args.out, BASELINE_PATH if args.save else None)):
+        save(current, path)
+
+
+if __name__ == "__main__":
+    cli()
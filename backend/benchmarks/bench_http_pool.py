@@ -0,0 +1,80 @@
+"""
+Benchmark: cliente por chamada vs pool upstream compartilhado.
+
+Sobe o stub local, libera o host dele na allowlist só neste processo e
+compara o padrão antigo (um httpx.AsyncClient novo por tentativa) com
+`secure_fetch` usando `upstream_pool`. O número de conexões TCP aceitas
+pelo stub mostra se o handshake por chamada desapareceu.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_http_pool [--calls 200]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import statistics
+import time
+from typing import Optional
+
+import httpx
+
+import main
+from benchmarks.stub_upstream import StubUpstream
+
+PAYLOAD = {"model": "gpt-4o-mini", "messages": [{"role": "user", "content": "oi"}]}
+
+
+async def legacy_fetch(url: str) -> Optional[dict]:
+    """Reproduz o comportamento anterior: cliente novo a cada chamada."""
+    async with httpx.AsyncClient(timeout=httpx.Timeout(main.TIMEOUT_MS / 1000)) as client:
+        response = await client.post(url, json=PAYLOAD)
+        return response.json()
+
+
+async def pooled_fetch(url: str) -> Optional[dict]:
+    return await main.secure_fetch(url, "bench", json_data=PAYLOAD)
+
+
+async def measure(label: str, fetch, stub: StubUpstream, url: str, calls: int) -> str:
+    stub.connections = 0
+    samples: list[float] = []
+    # Logs do secure_fetch não interessam aqui
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(calls):
+            start = time.perf_counter()
+            await fetch(url)
+            samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return (
+        f"{label:<8} calls={calls:<5} new_conns={stub.connections:<5} "
+        f"mean={statistics.fmean(samples):.3f}ms "
+        f"p50={samples[len(samples) // 2]:.3f}ms "
+        f"p99={samples[max(0, int(len(samples) * 0.99) - 1)]:.3f}ms"
+    )
+
+
+async def amain(calls: int) -> None:
+    stub = await StubUpstream().start()
+    main.ALLOWED_HOSTS.append(stub.netloc)
+    url = stub.url("/v1/chat/completions")
+    try:
+        main.upstream_pool.start()
+        print(await measure("legacy", legacy_fetch, stub, url, calls))
+        print(await measure("pooled", pooled_fetch, stub, url, calls))
+    finally:
+        await main.upstream_pool.aclose()
+        main.ALLOWED_HOSTS.remove(stub.netloc)
+        await stub.stop()
+
+
+def cli() -> None:
+    parser = argparse.ArgumentParser(description="Cliente por chamada vs pool upstream.")
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(amain(args.calls))
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,135 @@
+"""
+Benchmark: varreduras de substring antigas vs classificador de intenção.
+
+Antes de medir, confere o corpus de regressão abaixo contra
+`intent_classifier` (sem o memo de `classify_message`) e sai com erro
+se algum caso divergir. Depois compara, por mensagem, o custo das
+quatro varreduras antigas (saudação, boundary, elaborada, follow-up)
+com uma única chamada ao classificador.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_intent [--rounds 2000]
+"""
+
+import argparse
+import time
+from typing import Optional
+
+import main
+
+# (mensagem, saudação, no escopo, elaborada, tema de follow-up)
+CORPUS: list[tuple[str, bool, bool, bool, Optional[str]]] = [
+    ("oi", True, True, False, None),
+    ("Olá!", True, True, False, None),
+    ("Boa tarde!", True, True, False, None),
+    ("Bom dia, tudo bem?", False, True, False, None),
+    ("hey", True, False, False, None),
+    ("e aí", True, False, False, None),
+    ("hi there", True, True, False, None),
+    # Substrings que não podem disparar saudação nem escopo
+    ("hierarquia de cargos", False, False, False, None),
+    ("apoio psicológico", False, False, False, None),
+    ("boiada", False, False, False, None),
+    ("chile", False, False, False, None),
+    ("métodos ágeis", False, False, False, None),
+    ("bonus anual", False, False, False, None),
+    # Escopo
+    ("Quem é a Ana Paula Arbache?", False, True, False, "founder"),
+    ("Quais serviços vocês oferecem?", False, True, False, "services"),
+    ("Soluções em ESG para indústria", False, True, False, "services"),
+    ("Vocês têm trilhas de liderança?", False, True, False, None),
+    ("lideranças femininas", False, True, False, None),
+    ("o que é o icons.ai", False, True, False, None),
+    ("plataforma de e-learning", False, True, False, None),
+    ("preciso de ajuda", False, True, False, None),
+    ("qual o valor", False, True, False, None),
+    ("qual a capital da frança", False, False, False, None),
+    ("quem é o CEO", False, False, False, "founder"),
+    ("metas das ODS da ONU", False, True, False, "esg"),
+    # Chips do frontend
+    ("Quem são os especialistas?", False, True, False, None),
+    ("Como se tornar parceiro?", False, True, False, None),
+    ("Vocês atendem qual porte?", False, True, False, None),
+    ("Como a IA se integra?", False, True, False, None),
+    ("a dieta ideal", False, False, False, None),
+    # Elaboradas
+    ("como funciona a mentoria", False, True, True, None),
+    ("Explique o assessment", False, True, True, None),
+    ("por que investir em ESG?", False, True, True, "esg"),
+    ("diferença entre coaching e mentoria", False, True, True, None),
+    # Flexões verbais que a busca por substring pegava
+    ("Como funcionam as trilhas (educacionais)?", False, True, True, None),
+    ("como funcionaram os programas de liderança", False, True, True, None),
+    ("como funcionava a mentoria", False, True, True, None),
+    ("Expliquem o assessment", False, True, True, None),
+    ("comparem as trilhas", False, True, True, None),
+    ("bom dia, gostaria de saber quanto tempo dura a formação de vocês", False, True, True, None),
+]
+
+GREETINGS = ["olá", "oi", "bom dia", "boa tarde", "boa noite", "hello", "hi", "e aí", "eai", "hey", "opa"]
+TRIGGERS = [
+    ("services", ['serviço', 'solução', 'oferecem', 'fazem']),
+    ("founder", ['ana paula', 'fundadora', 'ceo']),
+    ("esg", ['esg', 'sustentabilidade', 'ods', 'onu']),
+]
+
+
+def legacy_route(message: str) -> tuple[bool, bool, bool, Optional[str]]:
+    """Reproduz is_greeting, check_boundary, is_elaborate_question e os gatilhos antigos."""
+    stripped = message.lower().strip().rstrip("!?.,:;")
+    greeting = stripped in GREETINGS or (
+        len(stripped.split()) <= 3 and any(g in stripped for g in GREETINGS)
+    )
+
+    lower = message.lower()
+    in_scope = (
+        any(t in lower for t in main.ALLOWED_TOPICS)
+        or any(g in lower for g in main.BOUNDARY_GREETINGS)
+        or any(w in lower for w in main.BOUNDARY_SERVICE_WORDS)
+    )
+
+    lower = message.lower()
+    elaborate = len(lower.split()) >= 10 or any(kw in lower for kw in main.ELABORATE_KEYWORDS)
+
+    lower = message.lower()
+    follow_up = next((topic for topic, words in TRIGGERS if any(w in lower for w in words)), None)
+    return greeting, in_scope, elaborate, follow_up
+
+
+def check_corpus() -> int:
+    failures = 0
+    for message, *expected in CORPUS:
+        intent = main.intent_classifier.classify(message)
+        got = [intent.greeting, intent.in_scope, intent.elaborate, intent.follow_up]
+        if got != expected:
+            failures += 1
+            print(f"FAIL {message!r}: expected={expected} got={got}")
+    return failures
+
+
+def per_call_us(fn, messages: list[str], rounds: int) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for message in messages:
+            fn(message)
+    return (time.perf_counter() - started) / (rounds * len(messages)) * 1e6
+
+
+def cli() -> None:
+    parser = argparse.ArgumentParser(description="Varreduras antigas vs classificador de intenção.")
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    failures = check_corpus()
+    print(f"corpus: {len(CORPUS) - failures}/{len(CORPUS)} ok")
+    if failures:
+        raise SystemExit(1)
+
+    messages = [message for message, *_ in CORPUS]
+    legacy = per_call_us(legacy_route, messages, args.rounds)
+    single = per_call_us(main.intent_classifier.classify, messages, args.rounds)
+    print(f"legacy 4 sweeps={legacy:7.2f}us/message  single pass={single:7.2f}us/message")
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,221 @@
+"""
+Teste de carga ponta a ponta do /chat e do /v2/chat sem chaves nem rede.
+
+Sobe o stub dos provedores (`python -m benchmarks.stub_upstream`, com
+latência, jitter e falhas configuráveis) e o servidor real
+(`uvicorn main:app`) em modo de teste: ARBACHE_TEST_MODE=1 com
+UPSTREAM_OVERRIDE_URL apontando para o stub e chaves falsas, de modo que
+`secure_fetch` percorre retries, breakers e fallbacks de verdade. Cada
+resposta traz o ramo que respondeu no header X-Chat-Branch (só em modo
+de teste).
+
+A carga é um mix de mensagens por tipo (FAQ, saudação, simples → LLM,
+elaborada → Perplexity + curadoria, fora de escopo), com sufixo único nas
+que vão para LLM para não cair no cache de respostas (o cache semântico
+fica desligado, salvo `--semantic-cache`). Reporta req/s e
+p50/p95/p99 por rota e por ramo (`faq`, `greeting`, `elaborate`,
+`openai`, `anthropic`, `static` = fallback estático, ...). `--base-url`
+usa um servidor já no ar (por exemplo o compose com as variáveis de modo
+de teste) em vez de subir um; `--json` grava o relatório.
+
+Os números só valem comparados entre si na mesma máquina: gerador, stub
+e servidor disputam os mesmos CPUs.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_load [--duration 20] [--concurrency 32] [--latency-ms 300]
+        [--error-rate 0.0] [--rate-limit-rate 0.0] [--timeout-rate 0.0] [--v1-share 0.2]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Optional
+
+import httpx
+
+from benchmarks.bench_workers import BACKEND_DIR, free_port
+
+MESSAGES = {
+    "faq": [
+        "O que a Arbache faz?",
+        "Quais serviços vocês oferecem?",
+        "Quem é Ana Paula Arbache?",
+    ],
+    "greeting": ["Olá", "Bom dia", "Oi, tudo bem?"],
+    "simple": [
+        "A Arbache atende empresas pequenas",
+        "Vocês fazem mentoria para gestores",
+        "Tem programa de ESG para indústria",
+    ],
+    "elaborate": [
+        "Como funciona um programa de liderança da Arbache para equipes comerciais grandes",
+        "Explique a diferença entre treinamento e educação corporativa na prática",
+        "Compare mentoria individual e programas de grupo para formar novos líderes",
+    ],
+    "boundary": ["Qual a previsão do tempo amanhã em Curitiba", "Me indica um restaurante japonês"],
+}
+MIX = {"faq": 0.3, "greeting": 0.1, "simple": 0.3, "elaborate": 0.2, "boundary": 0.1}
+LLM_KINDS = ("simple", "elaborate")
+
+
+def percentile(samples: list[float], q: float) -> float:
+    return samples[max(int(len(samples) * q) - 1, 0)]
+
+
+def pick(rng: random.Random, counter: int) -> tuple[str, str]:
+    kind = rng.choices(list(MIX), weights=list(MIX.values()))[0]
+    message = rng.choice(MESSAGES[kind])
+    if kind in LLM_KINDS:
+        message = f"{message} ({counter})?"
+    return kind, message
+
+
+async def load(base_url: str, duration: float, concurrency: int, v1_share: float,
+               seed: int) -> list[tuple[str, str, int, float]]:
+    """Retorna (rota, ramo, status, latência ms) de cada requisição."""
+    rng = random.Random(seed)
+    samples: list[tuple[str, str, int, float]] = []
+    deadline = time.perf_counter() + duration
+    counter = 0
+
+    async def user() -> None:
+        nonlocal counter
+        while time.perf_counter() < deadline:
+            counter += 1
+            kind, message = pick(rng, counter)
+            route = "/chat" if rng.random() < v1_share else "/v2/chat"
+            # IP diferente por requisição: o rate limit não vira o gargalo do teste
+            ip = f"10.{(counter >> 16) & 255}.{(counter >> 8) & 255}.{counter & 255}"
+            started = time.perf_counter()
+            try:
+                r = await client.post(f"{base_url}{route}", json={"message": message, "section": "hero"},
+                                      headers={"X-Forwarded-For": ip})
+                branch, status = r.headers.get("x-chat-branch", "?"), r.status_code
+            except httpx.HTTPError:
+                branch, status = "client_error", 0
+            samples.append((route, branch, status, (time.perf_counter() - started) * 1000))
+
+    async with httpx.AsyncClient(timeout=60.0, limits=httpx.Limits(max_connections=concurrency)) as client:
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+    return samples
+
+
+def report(samples: list[tuple[str, str, int, float]], duration: float) -> dict:
+    groups: dict[tuple[str, str], list[float]] = defaultdict(list)
+    statuses: dict[tuple[str, str], dict[int, int]] = defaultdict(lambda: defaultdict(int))
+    for route, branch, status, ms in samples:
+        for key in ((route, branch), (route, "*"), ("*", "*")):
+            groups[key].append(ms)
+            statuses[key][status] += 1
+
+    rows = {}
+    print(f"{'route':<10} {'branch':<15} {'count':>7} {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9}  status")
+    for (route, branch), latencies in sorted(groups.items()):
+        latencies.sort()
+        row = {
+            "count": len(latencies),
+            "rps": len(latencies) / duration,
+            "p50_ms": statistics.median(latencies),
+            "p95_ms": percentile(latencies, 0.95),
+            "p99_ms": percentile(latencies, 0.99),
+            "status": dict(statuses[(route, branch)]),
+        }
+        rows[f"{route} {branch}"] = row
+        print(f"{route:<10} {branch:<15} {row['count']:>7} {row['rps']:>8.1f} {row['p50_ms']:>7.1f}ms "
+              f"{row['p95_ms']:>7.1f}ms {row['p99_ms']:>7.1f}ms  {row['status']}")
+    return rows
+
+
+async def wait_ready(base_url: str, server: Optional[subprocess.Popen], timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while True:
+            try:
+                if (await client.get(f"{base_url}/health")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            if (server is not None and server.poll() is not None) or time.monotonic() > deadline:
+                raise RuntimeError("server did not become ready")
+            await asyncio.sleep(0.1)
+
+
+def start_processes(args: argparse.Namespace) -> tuple[str, list[subprocess.Popen]]:
+    stub_port, port = free_port(), free_port()
+    stub = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.stub_upstream", "--port", str(stub_port),
+         "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+         "--error-rate", str(args.error_rate), "--rate-limit-rate", str(args.rate_limit_rate),
+         "--timeout-rate", str(args.timeout_rate), "--seed", str(args.seed), "--report-s", "3600"],
+        cwd=BACKEND_DIR, stdout=subprocess.DEVNULL,
+    )
+    env = {
+        **os.environ,
+        "ARBACHE_TEST_MODE": "1",
+        "UPSTREAM_OVERRIDE_URL": f"http://127.0.0.1:{stub_port}",
+        "OPENAI_API_KEY": "stub",
+        "ANTHROPIC_API_KEY": "stub",
+        "PERPLEXITY_API_KEY": "stub",
+        # Chips e armazém em disco fora: só o caminho da requisição é medido
+        "CHIP_PRECOMPUTE_ENABLED": "false",
+        "ANSWER_STORE_PATH": "",
+        "SEMANTIC_CACHE_ENABLED": "true" if args.semantic_cache else "false",
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        asyncio.run(wait_ready(base_url, server))
+    except RuntimeError:
+        for process in (server, stub):
+            process.terminate()
+        raise
+    return base_url, [server, stub]
+
+
+def cli() -> None:
+    parser = argparse.ArgumentParser(description="Carga ponta a ponta do /chat e /v2/chat contra o stub.")
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--v1-share", type=float, default=0.2, help="fração das requisições no /chat")
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--jitter-ms", type=float, default=100.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--semantic-cache", action="store_true")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--base-url", default=None, help="servidor já no ar (em modo de teste)")
+    parser.add_argument("--json", default=None, help="grava o relatório neste arquivo")
+    args = parser.parse_args()
+
+    processes: list[subprocess.Popen] = []
+    if args.base_url:
+        base_url = args.base_url.rstrip("/")
+    else:
+        base_url, processes = start_processes(args)
+    try:
+        samples = asyncio.run(load(base_url, args.duration, args.concurrency, args.v1_share, args.seed))
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait(timeout=15)
+
+    rows = report(samples, args.duration)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,150 @@
+"""
+Benchmark: custo do secure_log no event loop, com stdout rápido e lento.
+
+Compara o secure_log antigo (json.dumps + print síncronos) com o
+pipeline atual (fila limitada + thread de escrita em lotes):
+
+- custo por chamada com stdout rápido (io.StringIO);
+- com stdout lento (cada write espera `--write-delay-ms`, como o driver
+  json-file ou um coletor travado): duração de `--requests` requisições
+  simuladas de 8 logs cada, maior travada do event loop medida por um
+  ticker de 1 ms, e registros descartados;
+- serialização json vs orjson.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_logging [--requests 500] [--write-delay-ms 2]
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import time
+from datetime import datetime
+
+import main
+
+LOGS_PER_REQUEST = (
+    ("info", "V2 chat request received", {"message_length": 42, "section": "hero"}),
+    ("info", "HTTP request starting", {"url": "https://api.openai.com/v1/chat/completions", "attempt": 1, "max_retries": 3}),
+    ("info", "HTTP request successful", {"status_code": 200}),
+    ("info", "HTTP request starting", {"url": "https://api.anthropic.com/v1/messages", "attempt": 1, "max_retries": 3}),
+    ("warn", "HTTP request failed", {"status_code": 429, "attempt": 1}),
+    ("info", "Retrying with backoff", {"backoff_seconds": 1.0, "next_attempt": 2}),
+    ("info", "HTTP request successful", {"status_code": 200}),
+    ("info", "V2 chat response sent", {"response_length": 310}),
+)
+
+
+def legacy_secure_log(level: str, message: str, request_id: str, **meta) -> None:
+    """Implementação anterior de secure_log."""
+    sanitized = {k: v for k, v in meta.items() if k not in [
+        "authorization", "api_key", "apiKey", "token", "password", "secret"
+    ]}
+    log_entry = {
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "level": level,
+        "message": message,
+        "request_id": request_id,
+        **sanitized
+    }
+    print(json.dumps(log_entry), file=main.sys.stdout)
+
+
+class SlowStream(io.StringIO):
+    """stdout com back-pressure: cada write bloqueia por `delay_s`."""
+
+    def __init__(self, delay_s: float) -> None:
+        super().__init__()
+        self.delay_s = delay_s
+
+    def write(self, text: str) -> int:
+        time.sleep(self.delay_s)
+        return super().write(text)
+
+
+def per_call_us(log, calls: int = 20000) -> float:
+    started = time.perf_counter()
+    for i in range(calls):
+        level, message, meta = LOGS_PER_REQUEST[i % len(LOGS_PER_REQUEST)]
+        log(level, message, f"req-{i // 8}", **meta)
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+async def simulate(log, requests: int) -> tuple[float, float]:
+    """Retorna (duração em s, maior atraso do ticker em ms)."""
+    worst = 0.0
+    running = True
+
+    async def ticker() -> None:
+        nonlocal worst
+        while running:
+            expected = time.perf_counter() + 0.001
+            await asyncio.sleep(0.001)
+            worst = max(worst, time.perf_counter() - expected)
+
+    tick = asyncio.create_task(ticker())
+    started = time.perf_counter()
+    for r in range(requests):
+        for level, message, meta in LOGS_PER_REQUEST:
+            log(level, message, f"req-{r}", **meta)
+            await asyncio.sleep(0)
+    elapsed = time.perf_counter() - started
+    running = False
+    await tick
+    return elapsed, worst * 1000
+
+
+def run(name: str, log, stream, requests: int, writer=None) -> None:
+    original = main.sys.stdout
+    main.sys.stdout = io.StringIO()
+    try:
+        fast = per_call_us(log)
+        main.sys.stdout = stream
+        elapsed, worst_ms = asyncio.run(simulate(log, requests))
+        if writer is not None:
+            writer.close()
+    finally:
+        main.sys.stdout = original
+    line = (f"{name:<7} fast stdout {fast:6.2f}us/call | slow stdout: "
+            f"{requests} requests in {elapsed * 1000:8.1f}ms, worst loop stall {worst_ms:7.1f}ms")
+    if writer is not None:
+        stats = writer.stats()
+        line += (f", written={int(stats['written'])} dropped={int(stats['dropped'])} "
+                 f"sampled_out={int(stats['sampled_out'])} batches={int(stats['batches'])}")
+    print(line)
+
+
+def encoders(calls: int = 50000) -> None:
+    entry = {"timestamp": "2026-01-01T00:00:00.000000Z", "level": "info",
+             "message": "HTTP request starting", "request_id": "x" * 36,
+             "url": "https://api.openai.com/v1/chat/completions", "attempt": 1, "max_retries": 3}
+    for name, dump in (("json", lambda e: json.dumps(e, default=str).encode()),
+                       ("orjson", main._log_json if main.orjson else None)):
+        if dump is None:
+            print("orjson  not installed")
+            continue
+        started = time.perf_counter()
+        for _ in range(calls):
+            dump(entry)
+        print(f"{name:<7} encode {(time.perf_counter() - started) / calls * 1e6:5.2f}us/record")
+
+
+def cli() -> None:
+    parser = argparse.ArgumentParser(description="secure_log síncrono vs fila + thread de escrita.")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--write-delay-ms", type=float, default=2.0)
+    parser.add_argument("--queue-max", type=int, default=main.LOG_QUEUE_MAX)
+    args = parser.parse_args()
+    delay = args.write_delay_ms / 1000
+
+    run("legacy", legacy_secure_log, SlowStream(delay), args.requests)
+
+    main.log_writer.close()
+    main.log_writer = main.AsyncLogWriter(max_queue=args.queue_max)
+    run("async", main.secure_log, SlowStream(delay), args.requests, main.log_writer)
+    encoders()
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,106 @@
+"""
+Benchmark: custo de gravação das métricas Prometheus.
+
+Mede em ns por operação:
+
+- Histogram.observe com o filho já resolvido e via `labels(...)`;
+- Counter.inc via `labels(...)`;
+- o MetricsMiddleware em volta de um app ASGI vazio (com e sem);
+- a renderização de /metrics com todas as séries de um processo típico;
+- prometheus_client, se estiver instalado, como referência.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_metrics [--ops 200000]
+"""
+
+import argparse
+import asyncio
+import time
+
+import main
+
+
+def per_op_ns(fn, ops: int) -> float:
+    started = time.perf_counter()
+    for _ in range(ops):
+        fn()
+    return (time.perf_counter() - started) / ops * 1e9
+
+
+async def empty_app(scope, receive, send) -> None:
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def asgi_ns(app, ops: int) -> float:
+    scope = {"type": "http", "path": "/v2/chat"}
+
+    async def receive() -> dict:
+        return {"type": "http.request"}
+
+    async def send(message: dict) -> None:
+        pass
+
+    async def run() -> float:
+        started = time.perf_counter()
+        for _ in range(ops):
+            await app(scope, receive, send)
+        return (time.perf_counter() - started) / ops * 1e9
+
+    return asyncio.run(run())
+
+
+def populate(registry_families) -> None:
+    """Séries de um worker depois de algum tráfego (rotas, ramos, provedores, status)."""
+    (route, branch, upstream, attempts, responses) = registry_families
+    for r in ("/chat", "/v2/chat", "/v2/chat/stream", "/health"):
+        for status in ("200", "429", "422"):
+            route.labels(r, status).observe(0.01)
+    for b in ("faq", "greeting", "boundary", "elaborate", "openai", "anthropic", "static", "cache"):
+        branch.labels("/v2/chat", b).observe(0.2)
+    for p in ("openai", "anthropic", "perplexity"):
+        upstream.labels(p).observe(0.8)
+        attempts.labels(p).inc()
+        for status in ("200", "429", "500"):
+            responses.labels(p, status).inc()
+
+
+def cli() -> None:
+    parser = argparse.ArgumentParser(description="Overhead das métricas Prometheus.")
+    parser.add_argument("--ops", type=int, default=200000)
+    args = parser.parse_args()
+    ops = args.ops
+
+    hist = main.upstream_duration.labels("openai")
+    family = main.chat_branch_duration
+    counter = main.upstream_responses
+    print(f"histogram.observe (bound child)    {per_op_ns(lambda: hist.observe(0.42), ops):7.0f} ns")
+    print(f"histogram labels().observe         {per_op_ns(lambda: family.labels('/v2/chat', 'faq').observe(0.003), ops):7.0f} ns")
+    print(f"counter labels().inc               {per_op_ns(lambda: counter.labels('openai', '200').inc(), ops):7.0f} ns")
+
+    bare = asgi_ns(empty_app, ops // 4)
+    wrapped = asgi_ns(main.MetricsMiddleware(empty_app), ops // 4)
+    print(f"ASGI empty app                     {bare:7.0f} ns")
+    print(f"ASGI empty app + MetricsMiddleware {wrapped:7.0f} ns (+{wrapped - bare:.0f} ns/request)")
+
+    populate((main.http_request_duration, main.chat_branch_duration, main.upstream_duration,
+              main.upstream_attempts, main.upstream_responses))
+    text = main.metrics.render()
+    render_us = per_op_ns(main.metrics.render, 500) / 1000
+    print(f"render /metrics                    {render_us:7.0f} us ({len(text.splitlines())} lines)")
+
+    try:
+        import prometheus_client
+    except ImportError:
+        print("prometheus_client not installed (reference skipped)")
+        return
+    registry = prometheus_client.CollectorRegistry()
+    ref = prometheus_client.Histogram("ref_seconds", "ref", ["route", "branch"],
+                                      buckets=main.LATENCY_BUCKETS_S, registry=registry)
+    child = ref.labels("/v2/chat", "faq")
+    print(f"prometheus_client observe (bound)  {per_op_ns(lambda: child.observe(0.42), ops):7.0f} ns")
+    print(f"prometheus_client labels().observe {per_op_ns(lambda: ref.labels('/v2/chat', 'faq').observe(0.003), ops):7.0f} ns")
+
+
+if __name__ == "__main__":
+    cli()
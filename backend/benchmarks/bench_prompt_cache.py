@@ -0,0 +1,148 @@
+"""
+Verificação: prefixo estático dos prompts e prompt caching dos provedores.
+
+Manda as perguntas de todas as seções para o stub local
+(`stub_upstream.py`), que confere o formato das requisições e simula o
+`usage` com prompt caching, em dois layouts:
+
+- `legacy`: o anterior, com o contexto da seção colado no fim do prompt
+  de sistema (um prefixo diferente por seção, sem cache_control);
+- `static-prefix`: `build_openai_v2_payload` / `build_anthropic_v2_payload`
+  (prompt de sistema idêntico em toda requisição, seção depois dele,
+  bloco estático com cache_control na Anthropic), pelas funções
+  `query_*_v2` e pelos streams.
+
+Reporta prefixos distintos, a fração dos tokens de entrada lidos do
+cache (a partir de `arbache_upstream_tokens_total`) e falha (exit 1) se o
+stub recusar alguma requisição ou se o layout novo tiver mais de um prefixo
+por provedor. O stub aplica o tamanho mínimo de prefixo dos provedores
+(`--cache-min-tokens`, 1024): com o prompt de sistema abaixo dele a
+fração real é zero, e o backend nem manda as marcas de cache
+(`prompt_cacheable`). `--cache-min-tokens 0` mostra o teto, o que o
+layout ganha quando o prefixo passar do mínimo (na Anthropic só com a
+marca, ou seja, com o prompt acima de PROMPT_CACHE_MIN_TOKENS).
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_prompt_cache [--cache-min-tokens 1024]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+
+import httpx
+
+import main
+from benchmarks.stub_upstream import StubRoute, StubUpstream
+
+QUESTIONS = [
+    "Como vocês trabalham isso na prática",
+    "Quanto tempo dura um programa desses",
+    "Vocês atendem empresas pequenas",
+]
+OPENAI_URL = "https://api.openai.com/v1/chat/completions"
+ANTHROPIC_URL = "https://api.anthropic.com/v1/messages"
+
+
+def legacy_payloads(question: str, section_context: str) -> tuple[dict, dict]:
+    """Montagem anterior: contexto da seção dentro do prompt de sistema."""
+    system = main.CURATOR_SYSTEM_PROMPT_V2 + f"\n\nContexto da seção atual: {section_context}"
+    openai = {"model": "gpt-4o-mini", "max_tokens": 512, "temperature": 0.7,
+              "messages": [{"role": "system", "content": system},
+                           {"role": "user", "content": question}]}
+    anthropic = {"model": "claude-haiku-4-5-20251001", "max_tokens": 256, "system": system,
+                 "messages": [{"role": "user", "content": question}]}
+    return openai, anthropic
+
+
+def token_counts() -> dict[tuple[str, str], float]:
+    return {labels: child.value for labels, child in main.upstream_tokens._children.items()}
+
+
+def cached_share(before: dict, after: dict, provider: str) -> tuple[float, int]:
+    delta = {kind: after.get((provider, kind), 0) - before.get((provider, kind), 0)
+             for kind in ("input", "cache_read", "cache_write")}
+    total = sum(delta.values())
+    return (delta["cache_read"] / total if total else 0.0), int(total)
+
+
+def prefixes(stub: StubUpstream) -> dict[str, set[str]]:
+    seen: dict[str, set[str]] = {"openai": set(), "anthropic": set()}
+    for path, body in stub.bodies:
+        if path.startswith("/v1/messages"):
+            system = body.get("system")
+            cached = [b["text"] for b in system if "cache_control" in b] if isinstance(system, list) else [system]
+            seen["anthropic"].add("".join(cached))
+        else:
+            seen["openai"].add(body["messages"][0]["content"])
+    return seen
+
+
+async def run_layout(layout: str, cache_min_tokens: int) -> tuple[int, int]:
+    stub = await StubUpstream(cache_min_tokens=cache_min_tokens).start()
+    main.upstream_pool._build_client = lambda: httpx.AsyncClient(transport=StubRoute(stub))
+    before = token_counts()
+    try:
+        for section in main.SECTION_CONTENT_V2.values():
+            context = section.get("summary", "")
+            for question in QUESTIONS:
+                if layout == "legacy":
+                    openai, anthropic = legacy_payloads(question, context)
+                    await main.secure_fetch(OPENAI_URL, "bench", json_data=openai)
+                    await main.secure_fetch(ANTHROPIC_URL, "bench", json_data=anthropic)
+                else:
+                    await main.query_openai_v2(question, context, None, "bench")
+                    await main.query_anthropic_v2(question, context, None, "bench")
+            if layout != "legacy":
+                # Streams pelo mesmo stub: o usage vem nos eventos
+                for stream in (
+                    main.stream_openai_v2(main.build_openai_v2_payload(QUESTIONS[0], context, None), "bench"),
+                    main.stream_anthropic_v2(main.build_anthropic_v2_payload(QUESTIONS[0], context, None), "bench"),
+                ):
+                    async for _ in stream:
+                        pass
+    finally:
+        await main.upstream_pool.aclose()
+        await stub.stop()
+
+    after = token_counts()
+    seen = prefixes(stub)
+    for provider in ("openai", "anthropic"):
+        share, total = cached_share(before, after, provider)
+        print(f"{layout:<14} {provider:<10} requests={sum(1 for p, _ in stub.bodies if (p.startswith('/v1/messages')) == (provider == 'anthropic')):<4} "
+              f"distinct_prefixes={len(seen[provider]):<3} input_tokens={total:<7} cached_share={share:6.1%} "
+              f"(min {cache_min_tokens} tokens{', teto' if not cache_min_tokens else ''})")
+    print(f"{layout:<14} shape_errors={len(stub.shape_errors)} {sorted(set(stub.shape_errors))}")
+    too_many = layout != "legacy" and any(len(v) != 1 for v in seen.values())
+    return len(stub.shape_errors), int(too_many)
+
+
+def cli() -> None:
+    parser = argparse.ArgumentParser(description="Prefixo estático e prompt caching (stub).")
+    parser.add_argument("--cache-min-tokens", type=int, default=1024,
+                        help="prefixo mínimo cacheável (0 = sem mínimo, mostra o teto)")
+    args = parser.parse_args()
+    main.log_writer.stream = open(os.devnull, "w")  # logs fora da medição
+    main.Config._openai_key = "bench"
+    main.Config._anthropic_key = "bench"
+    prompt_tokens = len(main.CURATOR_SYSTEM_PROMPT_V2) // 4
+    print(f"static system prompt ≈ {prompt_tokens} tokens "
+          f"({'abaixo' if prompt_tokens < 1024 else 'acima'} do mínimo de ~1024 dos provedores)")
+    marks = {provider: main.prompt_cacheable(main.CURATOR_SYSTEM_PROMPT_V2, provider)
+             for provider in ("openai", "anthropic")}
+    print("cache markers sent: " + " ".join(
+        f"{provider}={'on' if on else 'off'} (min {main.PROMPT_CACHE_MIN_TOKENS[provider]})"
+        for provider, on in marks.items()))
+    if args.cache_min_tokens and prompt_tokens < args.cache_min_tokens:
+        print("cached_share real = 0: o prefixo não chega ao mínimo; --cache-min-tokens 0 mostra o teto")
+
+    failures = 0
+    for layout in ("legacy", "static-prefix"):
+        errors, too_many = asyncio.run(run_layout(layout, args.cache_min_tokens))
+        failures += errors + too_many
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,93 @@
+"""
+Benchmark: memória e custo por verificação do rate limiter.
+
+Simula N IPs distintos (cada um com algumas requisições, o relógio
+avançando de forma que todas caibam em `--span-s` segundos) e mede,
+com tracemalloc, a memória retida pela implementação antiga (lista de
+timestamps por IP, nunca esquecida) e pelo SlidingWindowRateLimiter
+(limitado por RATE_LIMIT_MAX_CLIENTS e pela varredura de ociosos).
+Com `--span-s 30` todos os IPs chegam na mesma janela e quem segura a
+memória é o teto de clientes. O tempo por verificação é medido numa
+segunda execução, sem tracemalloc.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_rate_limit [--clients 100000,500000] [--span-s 3600] [--max-clients 50000]
+"""
+
+import argparse
+import time
+import tracemalloc
+from collections import defaultdict
+
+import main
+
+
+class LegacyRateLimiter:
+    """Implementação anterior de check_rate_limit."""
+
+    def __init__(self) -> None:
+        self.store: dict[str, list[float]] = defaultdict(list)
+
+    def allow(self, client_ip: str, now: float) -> bool:
+        window_start = now - main.RATE_LIMIT_WINDOW
+        self.store[client_ip] = [t for t in self.store[client_ip] if t > window_start]
+        if len(self.store[client_ip]) >= main.RATE_LIMIT_MAX:
+            return False
+        self.store[client_ip].append(now)
+        return True
+
+
+def synthetic_ip(i: int) -> str:
+    return f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}" if i < 1 << 24 else f"2001:db8::{i:x}"
+
+
+def replay(limiter, ips: list[str], requests_per_client: int, span_s: float) -> None:
+    step = span_s / (len(ips) * requests_per_client)
+    now = 1_000_000.0
+    for ip in ips:
+        for _ in range(requests_per_client):
+            now += step
+            limiter.allow(ip, now)
+
+
+def run(make_limiter, clients: int, requests_per_client: int, span_s: float) -> tuple:
+    """Retorna (limiter, µs por verificação, MB retidos)."""
+    ips = [synthetic_ip(i) for i in range(clients)]
+
+    started = time.perf_counter()
+    replay(make_limiter(), ips, requests_per_client, span_s)
+    per_check_us = (time.perf_counter() - started) / (clients * requests_per_client) * 1e6
+
+    tracemalloc.start()
+    limiter = make_limiter()
+    replay(limiter, ips, requests_per_client, span_s)
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return limiter, per_check_us, retained / 1024 / 1024
+
+
+def cli() -> None:
+    parser = argparse.ArgumentParser(description="Memória e custo do rate limiter com muitos IPs.")
+    parser.add_argument("--clients", default="10000,100000,500000")
+    parser.add_argument("--requests-per-client", type=int, default=3)
+    parser.add_argument("--span-s", type=float, default=3600)
+    parser.add_argument("--max-clients", type=int, default=main.RATE_LIMIT_MAX_CLIENTS)
+    args = parser.parse_args()
+
+    for clients in (int(c) for c in args.clients.split(",")):
+        legacy, us, mb = run(LegacyRateLimiter, clients, args.requests_per_client, args.span_s)
+        print(f"legacy  clients={clients:<8} tracked={len(legacy.store):<8} "
+              f"check={us:6.2f}us retained={mb:7.1f}MB")
+
+        limiter, us, mb = run(
+            lambda: main.SlidingWindowRateLimiter(max_clients=args.max_clients),
+            clients, args.requests_per_client, args.span_s,
+        )
+        stats = limiter.stats()
+        print(f"sliding clients={clients:<8} tracked={stats['tracked_clients']:<8} "
+              f"check={us:6.2f}us retained={mb:7.1f}MB "
+              f"evicted_idle={stats['evicted_idle']} evicted_capacity={stats['evicted_capacity']}")
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,227 @@
+"""
+Benchmark: sanitizador de respostas (clean_response + truncate_response).
+
+Quatro etapas:
+
+1. Corpus golden (`sanitizer_golden.json`): entradas representativas e
+   patológicas com a saída gerada pela implementação original. Qualquer
+   divergência encerra com erro.
+2. Paridade por fuzzing: textos aleatórios montados com os caracteres
+   que disparam as regras, comparados com a implementação original,
+   com e sem os atalhos por regex.
+3. Paridade do stream: o golden e textos aleatórios passam pelo
+   StreamingCleaner em chunks de tamanho aleatório, e os deltas juntos
+   têm de bater com sanitize_response. Com mais de cinco linhas, os
+   deltas param após a quinta mas mantêm os separadores originais.
+4. Entradas adversariais (parênteses sem fechamento, linhas em branco,
+   asteriscos, "Fonte"...) de tamanho crescente, medindo o tempo da
+   versão original (até `--legacy-max`) e da atual (até 1 MB).
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_sanitizer [--fuzz 20000] [--legacy-max 65536]
+    python -m benchmarks.bench_sanitizer --regenerate   # reescreve o golden
+"""
+
+import argparse
+import json
+import random
+import re
+import time
+from pathlib import Path
+
+import main
+
+GOLDEN_PATH = Path(__file__).with_name("sanitizer_golden.json")
+
+GOLDEN_INPUTS = [
+    "A Arbache oferece trilhas educacionais [1] e mentoria [2].",
+    "Veja https://arbache.com/servicos para detalhes.\nOutra linha.",
+    "Resposta curta.\nFonte: Perplexity, 2025",
+    "Segundo a pesquisa, o mercado cresce.\nDe acordo com dados recentes, sim.",
+    "O relatório (publicado em março de 2025) mostra avanços (ver anexo).",
+    "Parênteses sem ano (veja abaixo) ficam.",
+    "## Título\n\n### Subtítulo\nTexto **em negrito** e *itálico*.",
+    "- item um\n- item dois\n• item três\n  - aninhado",
+    "Linha 1\n\n\n\n\nLinha 2",
+    "a\n\n\n- b\n\n- c",
+    "-\n\nfoo",
+    "**#** cabeçalho escondido",
+    "(2024",
+    "(((( 2024 ))))",
+    "((a) 2026) fim) resto",
+    "[12][abc][3a]",
+    "http://x[1] e [1]http://y",
+    "Source:abc\nsource\tdef\nSourcex nada",
+    "***negrito triplo*** e ****quatro****",
+    "   \n  - \n\n - x",
+    "1\n2\n3\n4\n5\n6\n7",
+    "\n\n\n",
+    "",
+    "Referência: item\nReferencia sem acento fica",
+    "(a\n2024)",
+    "• nbsp bullet\n- em space",
+    "ſegundo: dobra de maiúsculas\nİ Fonte: y",
+]
+
+FUZZ_ALPHABET = ["(", ")", "2024", "2025", "20", "[", "]", "1", "*", "**", "#", "##", "-", "•",
+                 " ", "\t", "\n", "\n\n", "a", "b", "Fonte", "fonte:", "Segundo ", "https://",
+                 "http://x", ":", "é", "FONTE ", "ſegundo ", "İ", "Referência:"]
+
+
+def legacy_clean_response(text: str) -> str:
+    """Implementação original de clean_response (oito re.sub em sequência)."""
+    cleaned = re.sub(r'\[\d+\]', '', text)
+    cleaned = re.sub(r'https?://[^\s]+', '', cleaned)
+    cleaned = re.sub(
+        r'(?:Source|Fonte|Reference|Referência|According to|De acordo com|Segundo)[:\s].*',
+        '',
+        cleaned,
+        flags=re.IGNORECASE
+    )
+    cleaned = re.sub(r'\(.*?(?:2024|2025|2026).*?\)', '', cleaned)
+    cleaned = re.sub(r'^#{1,6}\s+', '', cleaned, flags=re.MULTILINE)
+    cleaned = re.sub(r'\*{1,2}([^*]+)\*{1,2}', r'\1', cleaned)
+    cleaned = re.sub(r'^[\s]*[-•]\s+', '', cleaned, flags=re.MULTILINE)
+    cleaned = re.sub(r'\n{3,}', '\n\n', cleaned).strip()
+    return cleaned
+
+
+def legacy_truncate_response(text: str, max_lines: int = 5) -> str:
+    lines = [l for l in text.split('\n') if l.strip()]
+    if len(lines) <= max_lines:
+        return text
+    return '\n'.join(lines[:max_lines])
+
+
+def legacy_sanitize(text: str) -> str:
+    return legacy_truncate_response(legacy_clean_response(text))
+
+
+def regenerate() -> None:
+    cases = [{"input": text, "expected": legacy_sanitize(text)} for text in GOLDEN_INPUTS]
+    GOLDEN_PATH.write_text(json.dumps(cases, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    print(f"{len(cases)} casos gravados em {GOLDEN_PATH.name}")
+
+
+def check_golden() -> int:
+    cases = json.loads(GOLDEN_PATH.read_text(encoding="utf-8"))
+    failures = 0
+    for case in cases:
+        got = main.sanitize_response(case["input"])
+        if got != case["expected"]:
+            failures += 1
+            print(f"GOLDEN FAIL {case['input']!r}: expected={case['expected']!r} got={got!r}")
+    print(f"golden: {len(cases) - failures}/{len(cases)} ok")
+    return failures
+
+
+def check_fuzz(count: int, rng: random.Random) -> int:
+    failures = 0
+    for _ in range(count):
+        text = "".join(rng.choice(FUZZ_ALPHABET) for _ in range(rng.randint(0, 40)))
+        expected = legacy_sanitize(text)
+        got = main.sanitize_response(text)
+        if got != expected:
+            failures += 1
+            if failures <= 5:
+                print(f"FUZZ FAIL {text!r}: expected={expected!r} got={got!r}")
+    print(f"fuzz: {count - failures}/{count} ok")
+    return failures
+
+
+def check_fuzz_scanners(count: int, rng: random.Random) -> int:
+    """Mesma paridade, desligando o atalho por regex dos bullets para exercitar a varredura linear."""
+    blank_run = main._BLANK_RUN_RE
+    main._BLANK_RUN_RE = re.compile("")
+    try:
+        print("scanners only:", end=" ")
+        return check_fuzz(count, rng)
+    finally:
+        main._BLANK_RUN_RE = blank_run
+
+
+def streamed(text: str, rng: random.Random) -> str:
+    """Deltas do StreamingCleaner juntos, com o texto partido em chunks de 1 a 8 caracteres."""
+    cleaner = main.StreamingCleaner(max_lines=5)
+    deltas = []
+    start = 0
+    while start < len(text) and not cleaner.done:
+        end = start + rng.randint(1, 8)
+        deltas.append(cleaner.feed(text[start:end]))
+        start = end
+    deltas.append(cleaner.flush())
+    return "".join(deltas)
+
+
+def check_stream(count: int, rng: random.Random) -> int:
+    texts = GOLDEN_INPUTS + [
+        "".join(rng.choice(FUZZ_ALPHABET) for _ in range(rng.randint(0, 40))) for _ in range(count)
+    ]
+    failures = 0
+    for text in texts:
+        expected = main.sanitize_response(text)
+        cut, truncated = main._cut_after_lines(main.clean_response(text), 5)
+        if truncated:
+            # Mais de cinco linhas: o corte é o mesmo, mas os separadores ficam
+            expected = cut
+        got = streamed(text, rng)
+        if got != expected:
+            failures += 1
+            if failures <= 5:
+                print(f"STREAM FAIL {text!r}: expected={expected!r} got={got!r}")
+    print(f"stream: {len(texts) - failures}/{len(texts)} ok")
+    return failures
+
+
+ADVERSARIAL = {
+    "open_parens": lambda n: "(" * n,
+    "parens_year_no_close": lambda n: "(a" * (n // 2 - 2) + "2024",
+    # Poucos "(" com ano e uma linha longa sem ")": a regex relê a linha a partir de cada um
+    "few_parens_long_line": lambda n: "(2024 " * 64 + "a" * max(n - 384, 0),
+    "sixty_parens_long_line": lambda n: "(2024 " * 60 + "a" * max(n - 360, 0),
+    "blank_lines": lambda n: "\n" * n,
+    "blank_lines_then_text": lambda n: " \n" * (n // 2 - 1) + "x",
+    "lone_star": lambda n: "*" + "a" * (n - 1),
+    "open_citations": lambda n: "[1" * (n // 2),
+    "source_words": lambda n: "fonte" * (n // 5),
+    "realistic": lambda n: ("**Trilhas** (2025) [1] https://a.b/c\n- item\n\n\n" * (n // 45 + 1))[:n],
+}
+
+
+def timed(fn, text: str) -> float:
+    started = time.perf_counter()
+    fn(text)
+    return (time.perf_counter() - started) * 1000
+
+
+def bench_adversarial(sizes: list[int], legacy_max: int) -> None:
+    for name, make in ADVERSARIAL.items():
+        for size in sizes:
+            text = make(size)
+            current = timed(main.sanitize_response, text)
+            legacy = f"{timed(legacy_sanitize, text):10.2f}ms" if size <= legacy_max else "   skipped"
+            print(f"{name:<22} size={size:<8} legacy={legacy} current={current:8.2f}ms")
+
+
+def cli() -> None:
+    parser = argparse.ArgumentParser(description="Paridade e tempo do sanitizador de respostas.")
+    parser.add_argument("--fuzz", type=int, default=20000)
+    parser.add_argument("--sizes", default="1024,16384,65536,1048576")
+    parser.add_argument("--legacy-max", type=int, default=65536)
+    parser.add_argument("--regenerate", action="store_true")
+    args = parser.parse_args()
+
+    if args.regenerate:
+        regenerate()
+        return
+
+    rng = random.Random(11)
+    failures = (check_golden() + check_fuzz(args.fuzz, rng) + check_fuzz_scanners(args.fuzz, rng)
+                + check_stream(args.fuzz, rng))
+    if failures:
+        raise SystemExit(1)
+    bench_adversarial([int(s) for s in args.sizes.split(",")], args.legacy_max)
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,120 @@
+"""
+Benchmark: latência de busca e memória do cache semântico.
+
+Preenche o cache com perguntas sintéticas em português e mede, para
+cada tamanho, o tempo do `lookup` (features + cosseno vetorizado +
+top-k) e a memória das matrizes. Com `--sections 1` todas as entradas
+caem numa única seção (pior caso); com 8 a distribuição segue o número
+real de seções do site.
+
+As buscas usam três formatos de pergunta (`--queries`): `short` (as
+perguntas sintéticas), `long` (~2000 caracteres, o máximo do modelo, com
+quase todas as dimensões não nulas) e `repeated` (a mesma palavra muitas
+vezes, contagens acima do limite int8). Antes de medir, confere que cada
+formato tem cosseno ~1 consigo mesmo; se não tiver, sai com código 1.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_semantic_cache [--sizes 1000,100000] [--sections 1,8]
+        [--queries short,long,repeated]
+"""
+
+import argparse
+import random
+import sys
+import time
+
+import main
+
+SUBJECTS = [
+    "trilhas educacionais", "mentoria", "assessment com ia", "liderança feminina",
+    "consultoria esg", "palestras", "imersões internacionais", "hubmulher",
+    "co.labs", "gestão de pessoas", "soft skills", "certificações",
+]
+TEMPLATES = [
+    "como funciona {s}?", "quanto custa {s}?", "quais empresas usam {s}",
+    "vocês oferecem {s} para pequenas empresas?", "qual o prazo de {s}",
+    "{s} é presencial ou online?", "quem conduz {s}?", "posso contratar {s} para {n} pessoas?",
+]
+
+
+def synthetic_question(rng: random.Random) -> str:
+    template = rng.choice(TEMPLATES)
+    return template.format(s=rng.choice(SUBJECTS), n=rng.randint(5, 5000)) + f" #{rng.randint(0, 10**6)}"
+
+
+def long_question(rng: random.Random) -> str:
+    parts: list[str] = []
+    while sum(len(p) + 1 for p in parts) < 1900:
+        parts.append(synthetic_question(rng))
+    return " ".join(parts)[:2000]
+
+
+def repeated_question(rng: random.Random) -> str:
+    word = rng.choice(SUBJECTS).split()[0]
+    return " ".join([word] * rng.randint(150, 300))[:2000]
+
+
+QUERIES = {"short": synthetic_question, "long": long_question, "repeated": repeated_question}
+
+
+def check_self_similarity(rng: random.Random) -> bool:
+    """Cada formato de pergunta, já no cache, precisa ter cosseno ~1 consigo mesmo."""
+    ok = True
+    for kind, make in QUERIES.items():
+        cache = main.SemanticCache(max_per_section=1000)
+        for _ in range(200):
+            cache.add(synthetic_question(rng), "s", "outra")
+        question = make(rng)
+        cache.add(question, "s", "alvo")
+        score, answer = cache.top_k(question, "s", k=1)[0]
+        passed = answer == "alvo" and abs(score - 1.0) < 1e-3
+        ok = ok and passed
+        print(f"self-similarity {kind:<9} score={score:.4f} {'ok' if passed else 'FAIL'}")
+    return ok
+
+
+def bench(size: int, sections: int, lookups: int, rng: random.Random, kind: str) -> str:
+    cache = main.SemanticCache(max_per_section=size)
+    started = time.perf_counter()
+    for i in range(size):
+        cache.add(synthetic_question(rng), f"s{i % sections}", "resposta curada")
+    fill_s = time.perf_counter() - started
+
+    queries = [QUERIES[kind](rng) for _ in range(lookups)]
+    samples: list[float] = []
+    for i, query in enumerate(queries):
+        t0 = time.perf_counter()
+        cache.lookup(query, f"s{i % sections}")
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    stats = cache.stats()
+    return (
+        f"entries={size:<7} sections={sections} queries={kind:<8} fill={fill_s:6.2f}s "
+        f"lookup p50={samples[len(samples) // 2]:.3f}ms "
+        f"p99={samples[int(len(samples) * 0.99) - 1]:.3f}ms "
+        f"matrix={stats['bytes'] / 1024 / 1024:.1f}MB"
+    )
+
+
+def cli() -> None:
+    parser = argparse.ArgumentParser(description="Latência e memória do cache semântico.")
+    parser.add_argument("--sizes", default="1000,10000,50000,100000")
+    parser.add_argument("--sections", default="1,8")
+    parser.add_argument("--lookups", type=int, default=500)
+    parser.add_argument("--queries", default="short,long,repeated")
+    args = parser.parse_args()
+
+    if main.np is None:
+        raise SystemExit("numpy não instalado: cache semântico desabilitado")
+
+    rng = random.Random(42)
+    if not check_self_similarity(rng):
+        sys.exit(1)
+    for kind in args.queries.split(","):
+        for sections in (int(s) for s in args.sections.split(",")):
+            for size in (int(s) for s in args.sizes.split(",")):
+                print(bench(size, sections, args.lookups, rng, kind))
+
+
+if __name__ == "__main__":
+    cli()
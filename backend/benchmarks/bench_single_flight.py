@@ -0,0 +1,115 @@
+"""
+Teste de carga: coalescência (single-flight) de perguntas idênticas.
+
+Dispara N requisições idênticas e simultâneas no /v2/chat pelo app ASGI
+em processo. As chamadas aos provedores vão para o stub local
+(`stub_upstream.py`, com latência), e o benchmark conta quantas chegaram lá:
+
+- `coalesced`: com `pipeline_flights`, N requisições → 1 chamada upstream;
+- `no-coalesce`: o comportamento anterior (cada requisição roda o próprio
+  pipeline), para comparação;
+- `leader-cancel`: a primeira requisição é cancelada (cliente
+  desconectou) no meio da chamada; as demais ainda recebem a resposta do
+  mesmo pipeline, sem nova chamada upstream.
+
+Falha (exit 1) se `coalesced` ou `leader-cancel` fizerem mais de uma
+chamada upstream, ou se alguma resposta vier diferente.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_single_flight [--requests 200] [--latency-ms 200]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from typing import Optional
+
+import httpx
+
+import main
+from benchmarks.stub_upstream import StubRoute, StubUpstream
+
+QUESTION = "Como funcionam os programas de liderança da Arbache para equipes comerciais"
+
+
+class NoCoalesce:
+    """Como antes do single-flight: cada requisição roda o próprio pipeline."""
+
+    async def run(self, key: str, compute) -> Optional[str]:
+        return await compute()
+
+
+async def fire(client: httpx.AsyncClient, requests: int, tag: str,
+               cancel_first_after: Optional[float] = None) -> tuple[list[float], set, int]:
+    body = {"message": f"{QUESTION} ({tag})?", "section": "hero"}
+
+    async def one(i: int) -> tuple[float, Optional[str]]:
+        started = time.perf_counter()
+        r = await client.post("/v2/chat", json=body, headers={"X-Forwarded-For": f"10.7.{i >> 8}.{i & 255}"})
+        return (time.perf_counter() - started) * 1000, r.json()["response"]
+
+    first = asyncio.create_task(one(0))
+    await asyncio.sleep(0.01)  # o primeiro vira o líder
+    rest = [asyncio.create_task(one(i)) for i in range(1, requests)]
+    cancelled = 0
+    if cancel_first_after is not None:
+        await asyncio.sleep(cancel_first_after)
+        first.cancel()
+        cancelled = 1
+    results = await asyncio.gather(first, *rest, return_exceptions=True)
+    done = [r for r in results if not isinstance(r, BaseException)]
+    return [r[0] for r in done], {r[1] for r in done}, cancelled
+
+
+async def amain(requests: int, latency_ms: float) -> int:
+    stub = await StubUpstream(latency_ms=latency_ms).start()
+    main.upstream_pool._build_client = lambda: httpx.AsyncClient(transport=StubRoute(stub))
+    main.Config._openai_key = "bench"
+    main.Config._anthropic_key = None
+    main.Config._perplexity_key = None
+    main.semantic_cache.enabled = False
+    main.HEDGE_ENABLED = False
+
+    failures = 0
+    transport = httpx.ASGITransport(app=main.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            flights = main.pipeline_flights
+            for name, cancel in (("coalesced", None), ("no-coalesce", None), ("leader-cancel", latency_ms / 2000)):
+                main.pipeline_flights = NoCoalesce() if name == "no-coalesce" else flights
+                before = stub.requests
+                started = time.perf_counter()
+                latencies, answers, cancelled = await fire(client, requests, name, cancel)
+                wall = time.perf_counter() - started
+                upstream = stub.requests - before
+                latencies.sort()
+                print(f"{name:<14} requests={requests} answered={len(latencies)} cancelled={cancelled} "
+                      f"upstream_calls={upstream:<4} distinct_answers={len(answers)} "
+                      f"p50={statistics.median(latencies):7.1f}ms "
+                      f"p99={latencies[int(len(latencies) * 0.99) - 1]:7.1f}ms wall={wall * 1000:7.1f}ms")
+                if name != "no-coalesce" and (upstream != 1 or len(answers) != 1):
+                    failures += 1
+            main.pipeline_flights = flights
+            print(f"single_flight stats: {flights.stats()}")
+    finally:
+        await main.upstream_pool.aclose()
+        await stub.stop()
+    return failures
+
+
+def cli() -> None:
+    parser = argparse.ArgumentParser(description="Coalescência de perguntas idênticas em voo.")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    args = parser.parse_args()
+
+    main.log_writer.stream = open(os.devnull, "w")  # logs fora da medição
+    main.RATE_LIMIT_MAX = max(main.RATE_LIMIT_MAX, args.requests)
+    sys.exit(1 if asyncio.run(amain(args.requests, args.latency_ms)) else 0)
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,106 @@
+"""
+Benchmark: backends de estado compartilhado (memory, sqlite, redis).
+
+Para cada backend:
+
+- latência do round-trip do rate limit (incremento + leitura da janela
+  anterior + prefetch do cache), e quantos round-trips o stub Redis viu
+  por requisição;
+- vários processos disparando `check_rate_limit` para o mesmo IP: com
+  backend compartilhado o total aceito tem que ser RATE_LIMIT_MAX, e não
+  RATE_LIMIT_MAX por processo.
+
+O Redis é o stub de `stub_redis.py` (sem servidor externo).
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_state_backend [--requests 2000] [--processes 4]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import main
+from benchmarks.stub_redis import StubRedis
+
+
+def worker(url: str, client_ip: str, attempts: int) -> int:
+    """Roda num processo separado, como um worker do uvicorn."""
+    async def run() -> int:
+        main.state_backend = main.create_state_backend(url)
+        try:
+            return sum([await main.check_rate_limit(client_ip) for _ in range(attempts)])
+        finally:
+            await main.state_backend.aclose()
+    return asyncio.run(run())
+
+
+async def latency(url: str, requests: int) -> tuple[float, float]:
+    backend = main.create_state_backend(url)
+    samples: list[float] = []
+    try:
+        for i in range(requests):
+            started = time.perf_counter()
+            await backend.batch(
+                incr={f"rl:bench:{i % 50}": 1},
+                get=[f"rl:bench:{i % 50}:prev", f"cache:{i}"],
+                ttl_s=120,
+            )
+            samples.append((time.perf_counter() - started) * 1e6)
+    finally:
+        await backend.aclose()
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+async def amain(requests: int, processes: int) -> None:
+    stub = await StubRedis().start()
+    tmp = tempfile.mkdtemp()
+    urls = {
+        "memory": "memory://",
+        "sqlite": f"sqlite:///{os.path.join(tmp, 'state.db')}",
+        "redis": stub.url,
+    }
+    loop = asyncio.get_running_loop()
+    try:
+        for name, url in urls.items():
+            round_trips = stub.round_trips
+            p50, p99 = await latency(url, requests)
+            per_request = (stub.round_trips - round_trips) / requests if name == "redis" else 0
+            line = f"{name:<7} batch p50={p50:7.1f}us p99={p99:7.1f}us"
+            if name == "redis":
+                line += f" round_trips/request={per_request:.2f}"
+
+            client_ip = f"bench-{uuid.uuid4().hex[:8]}"
+            attempts = main.RATE_LIMIT_MAX * 2
+            # Um processo novo por tarefa, como workers independentes
+            with ProcessPoolExecutor(
+                processes, mp_context=get_context("spawn"), max_tasks_per_child=1
+            ) as pool:
+                results = await asyncio.gather(*(
+                    loop.run_in_executor(pool, worker, url, client_ip, attempts)
+                    for _ in range(processes)
+                ))
+            line += (f" | {processes} processes x {attempts} attempts: "
+                     f"allowed={sum(results)} (limit {main.RATE_LIMIT_MAX})")
+            print(line)
+    finally:
+        await stub.stop()
+
+
+def cli() -> None:
+    parser = argparse.ArgumentParser(description="Backends de estado compartilhado.")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--processes", type=int, default=4)
+    args = parser.parse_args()
+    asyncio.run(amain(args.requests, args.processes))
+
+
+if __name__ == "__main__":
+    cli()
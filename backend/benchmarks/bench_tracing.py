@@ -0,0 +1,83 @@
+"""
+Benchmark: custo do tracing desligado, ligado e da exportação OTLP.
+
+- `trace_span` sem trace ativo (o caso com TRACE_SAMPLE_RATE=0) e com
+  trace ativo, em ns por span;
+- uma requisição FAQ no /v2/chat pelo app ASGI em processo, sem o
+  TracingMiddleware e com ele amostrando 100%;
+- serialização OTLP/JSON de um trace típico.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_tracing [--ops 200000] [--requests 2000]
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+
+import main
+
+
+def per_op_ns(fn, ops: int) -> float:
+    started = time.perf_counter()
+    for _ in range(ops):
+        fn()
+    return (time.perf_counter() - started) / ops * 1e9
+
+
+def open_span() -> None:
+    with main.trace_span("stage", attempt=1):
+        pass
+
+
+def request_us(app, requests: int) -> float:
+    async def run() -> float:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            body = {"message": "O que a Arbache faz?"}
+            for i in range(50):
+                await client.post("/v2/chat", json=body, headers={"X-Forwarded-For": f"10.9.0.{i}"})
+            started = time.perf_counter()
+            for i in range(requests):
+                ip = f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}"
+                await client.post("/v2/chat", json=body, headers={"X-Forwarded-For": ip})
+            return (time.perf_counter() - started) / requests * 1e6
+    return asyncio.run(run())
+
+
+def cli() -> None:
+    parser = argparse.ArgumentParser(description="Overhead do tracing por requisição.")
+    parser.add_argument("--ops", type=int, default=200000)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    main.log_writer.stream = open(os.devnull, "w")  # logs fora da medição
+
+    print(f"trace_span, tracing off   {per_op_ns(open_span, args.ops):7.0f} ns/span")
+    trace = main.RequestTrace()
+    root = main.Span(trace, "request", None, {})
+    trace.spans.append(root)
+    with root:
+        def traced() -> None:
+            del trace.spans[1:]
+            open_span()
+        print(f"trace_span, tracing on    {per_op_ns(traced, args.ops):7.0f} ns/span")
+
+    traced_app = main.TracingMiddleware(main.app, sample_rate=1.0)
+    off = min(request_us(main.app, args.requests) for _ in range(3))
+    on = min(request_us(traced_app, args.requests) for _ in range(3))
+    print(f"/v2/chat FAQ, no tracing  {off:7.1f} us/request")
+    print(f"/v2/chat FAQ, 100% traced {on:7.1f} us/request (+{on - off:.1f} us, Server-Timing included)")
+
+    for name in ("rate_limit", "shortcut", "cache", "semantic_cache", "pipeline", "openai",
+                 "fetch.openai", "backoff", "fetch.openai", "sanitize", "validation"):
+        trace.spans.append(main.Span(trace, name, root.span_id, {"attempt": 1}))
+    print(f"OTLP/JSON encode ({len(trace.spans)} spans) "
+          f"{per_op_ns(lambda: main._log_json(trace.to_otlp()), 5000) / 1000:7.1f} us/trace")
+
+
+if __name__ == "__main__":
+    cli()
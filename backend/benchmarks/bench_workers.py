@@ -0,0 +1,180 @@
+"""
+Benchmark: throughput do caminho FAQ do /v2/chat por forma de subir o servidor.
+
+Compara:
+
+- `single`: o CMD atual do Dockerfile (`uvicorn main:app`, um processo, TCP);
+- `single-asyncio`: o mesmo com `--loop asyncio --http h11`, para isolar
+  o ganho de uvloop/httptools;
+- `serve`: `python serve.py` (workers pelo número de CPUs, TCP, estado
+  compartilhado em SQLite num diretório temporário);
+- `serve-uds`: `serve.py` com UDS_PATH (Unix socket, sem TCP de loopback).
+
+A carga vem de processos separados (`--load-processes`), cada um com
+`--concurrency` requisições em voo. Cada requisição usa um
+X-Forwarded-For diferente (a conexão vem de 127.0.0.1 ou do socket, que
+são proxies confiáveis) para o rate limit não transformar o teste em
+429. Também reporta a latência da primeira requisição após o servidor
+ficar pronto (efeito do warmup).
+
+Os números só fazem sentido comparados entre si na mesma máquina: com
+poucos CPUs o gerador de carga disputa CPU com os workers.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_workers [--duration 10] [--concurrency 32] [--load-processes 2] [--workers N]
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Optional
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FAQ_BODY = {"message": "O que a Arbache faz?", "section": "hero"}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def make_client(uds: Optional[str]) -> httpx.AsyncClient:
+    transport = httpx.AsyncHTTPTransport(uds=uds) if uds else None
+    return httpx.AsyncClient(transport=transport, timeout=10.0,
+                             limits=httpx.Limits(max_connections=256))
+
+
+def load_worker(base_url: str, uds: Optional[str], concurrency: int, duration: float, seed: int) -> tuple:
+    """Roda num processo separado. Retorna (ok, erros, latências em ms)."""
+    async def run() -> tuple:
+        ok = errors = 0
+        latencies: list[float] = []
+        deadline = time.perf_counter() + duration
+        counter = seed << 20
+
+        async def user() -> None:
+            nonlocal ok, errors, counter
+            while time.perf_counter() < deadline:
+                counter += 1
+                ip = f"10.{(counter >> 16) & 255}.{(counter >> 8) & 255}.{counter & 255}"
+                started = time.perf_counter()
+                try:
+                    r = await client.post(f"{base_url}/v2/chat", json=FAQ_BODY,
+                                          headers={"X-Forwarded-For": ip})
+                    ok += r.status_code == 200
+                    errors += r.status_code != 200
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        async with make_client(uds) as client:
+            await asyncio.gather(*(user() for _ in range(concurrency)))
+        return ok, errors, latencies
+
+    return asyncio.run(run())
+
+
+async def wait_ready(base_url: str, uds: Optional[str], timeout: float = 30.0) -> float:
+    """Espera o /health responder e mede a primeira requisição FAQ (ms)."""
+    deadline = time.monotonic() + timeout
+    async with make_client(uds) as client:
+        while True:
+            try:
+                if (await client.get(f"{base_url}/health")).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError("server did not become ready")
+            await asyncio.sleep(0.1)
+        started = time.perf_counter()
+        await client.post(f"{base_url}/v2/chat", json=FAQ_BODY,
+                          headers={"X-Forwarded-For": "192.0.2.1"})
+        return (time.perf_counter() - started) * 1000
+
+
+def scenarios(workers: Optional[int], tmp: str) -> dict:
+    uvicorn = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+               "--log-level", "warning"]
+    serve = [sys.executable, "serve.py"]
+    # Mais de um worker exige estado compartilhado (serve.py recusa memory://)
+    extra = {"STATE_BACKEND_URL": f"sqlite:///{os.path.join(tmp, 'state.db')}"}
+    if workers:
+        extra["WEB_CONCURRENCY"] = str(workers)
+    uds = os.path.join(tmp, "api.sock")
+    return {
+        "single": (uvicorn, {}, None),
+        "single-asyncio": (uvicorn + ["--loop", "asyncio", "--http", "h11"], {}, None),
+        "serve": (serve, {"HOST": "127.0.0.1", **extra}, None),
+        "serve-uds": (serve, {"UDS_PATH": uds, **extra}, uds),
+    }
+
+
+def run_scenario(name: str, command: list, env_extra: dict, uds: Optional[str], args) -> None:
+    port = free_port()
+    env = {**os.environ, **env_extra, "PORT": str(port)}
+    # Sem chaves: o caminho FAQ não chama LLM, e nada deve sair para a rede
+    for key in ("OPENAI_API_KEY", "ANTHROPIC_API_KEY", "PERPLEXITY_API_KEY"):
+        env.pop(key, None)
+    if not uds:
+        command = command + ["--port", str(port)] if "uvicorn" in command else command
+    base_url = "http://bench" if uds else f"http://127.0.0.1:{port}"
+
+    server = subprocess.Popen(command, cwd=BACKEND_DIR, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        first_ms = asyncio.run(wait_ready(base_url, uds))
+        with ProcessPoolExecutor(args.load_processes, mp_context=get_context("spawn")) as pool:
+            futures = [
+                pool.submit(load_worker, base_url, uds, args.concurrency, args.duration, seed)
+                for seed in range(args.load_processes)
+            ]
+            results = [f.result() for f in futures]
+    finally:
+        server.terminate()
+        server.wait(timeout=15)
+
+    ok = sum(r[0] for r in results)
+    errors = sum(r[1] for r in results)
+    latencies = sorted(l for r in results for l in r[2])
+    p99 = latencies[int(len(latencies) * 0.99) - 1] if latencies else 0.0
+    print(f"{name:<15} {ok / args.duration:8.0f} req/s  errors={errors:<5} "
+          f"p50={statistics.median(latencies) if latencies else 0:6.1f}ms p99={p99:6.1f}ms "
+          f"first_request={first_ms:6.1f}ms")
+
+
+def cli() -> None:
+    parser = argparse.ArgumentParser(description="Throughput do caminho FAQ por forma de servir.")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--load-processes", type=int, default=2)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="WEB_CONCURRENCY para serve.py (padrão: automático)")
+    parser.add_argument("--only", default=None, help="cenários separados por vírgula")
+    args = parser.parse_args()
+
+    sys.path.insert(0, BACKEND_DIR)
+    import serve
+    print(f"available_cpus={serve.available_cpus()} cgroup_limit={serve.cgroup_cpu_limit()} "
+          f"serve_workers={args.workers or serve.worker_count()}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, (command, env_extra, uds) in scenarios(args.workers, tmp).items():
+            if args.only and name not in args.only.split(","):
+                continue
+            run_scenario(name, command, env_extra, uds, args)
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,120 @@
+"""
+Stub local do protocolo Redis (RESP2) para os benchmarks.
+
+Implementa só os comandos que `RedisStateBackend` usa (INCRBY,
+PEXPIRE, GET, SET com PX, MULTI/EXEC) e os que o cliente redis-py
+manda ao conectar. Conta leituras do socket (round-trips) e comandos,
+o que permite verificar que um batch é um único round-trip.
+"""
+
+import asyncio
+import time
+from typing import Optional
+
+
+class StubRedis:
+    """Servidor RESP2 mínimo em asyncio, com TTL por chave."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0.0) -> None:
+        self.host = host
+        self.port = port
+        self.latency_ms = latency_ms
+        self.round_trips = 0
+        self.commands = 0
+        self._data: dict[bytes, tuple[bytes, Optional[float]]] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def url(self) -> str:
+        return f"redis://{self.host}:{self.port}/0"
+
+    def _read(self, key: bytes) -> Optional[bytes]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        if item[1] is not None and item[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return item[0]
+
+    def _execute(self, args: list[bytes]) -> bytes:
+        self.commands += 1
+        name = args[0].upper()
+        if name == b"INCRBY":
+            current = self._read(args[1])
+            value = int(current or 0) + int(args[2])
+            expires = self._data[args[1]][1] if current is not None else None
+            self._data[args[1]] = (str(value).encode(), expires)
+            return b":%d\r\n" % value
+        if name == b"PEXPIRE":
+            if self._read(args[1]) is None:
+                return b":0\r\n"
+            self._data[args[1]] = (self._data[args[1]][0], time.monotonic() + int(args[2]) / 1000)
+            return b":1\r\n"
+        if name == b"GET":
+            value = self._read(args[1])
+            return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+        if name == b"SET":
+            expires = None
+            if len(args) >= 5 and args[3].upper() == b"PX":
+                expires = time.monotonic() + int(args[4]) / 1000
+            self._data[args[1]] = (args[2], expires)
+            return b"+OK\r\n"
+        if name in (b"PING",):
+            return b"+PONG\r\n"
+        if name in (b"CLIENT", b"SELECT"):
+            return b"+OK\r\n"
+        return b"-ERR unknown command '%s'\r\n" % name
+
+    @staticmethod
+    async def _read_command(reader: asyncio.StreamReader) -> list[bytes]:
+        header = await reader.readline()
+        if not header:
+            raise asyncio.IncompleteReadError(b"", None)
+        count = int(header[1:])
+        args: list[bytes] = []
+        for _ in range(count):
+            size = int((await reader.readline())[1:])
+            args.append((await reader.readexactly(size + 2))[:-2])
+        return args
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        queued: Optional[list[list[bytes]]] = None
+        try:
+            while True:
+                args = await self._read_command(reader)
+                # Comandos já no buffer chegaram no mesmo pacote: mesmo round-trip
+                if not reader._buffer:  # type: ignore[attr-defined]
+                    self.round_trips += 1
+                name = args[0].upper()
+                if name == b"MULTI":
+                    queued = []
+                    writer.write(b"+OK\r\n")
+                elif name == b"EXEC" and queued is not None:
+                    replies = [self._execute(cmd) for cmd in queued]
+                    writer.write(b"*%d\r\n" % len(replies) + b"".join(replies))
+                    queued = None
+                elif queued is not None:
+                    queued.append(args)
+                    writer.write(b"+QUEUED\r\n")
+                else:
+                    writer.write(self._execute(args))
+                if not reader._buffer:  # type: ignore[attr-defined]
+                    if self.latency_ms:
+                        await asyncio.sleep(self.latency_ms / 1000)
+                    await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.CancelledError, ConnectionResetError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self) -> "StubRedis":
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self) -> None:
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
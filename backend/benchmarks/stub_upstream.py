@@ -0,0 +1,382 @@
+"""
+Stub local dos provedores upstream (Perplexity / OpenAI / Anthropic).
+
+Servidor HTTP/1.1 mínimo em asyncio, com keep-alive, que responde nos
+formatos que `secure_fetch` espera. Conta conexões TCP abertas e
+requisições atendidas para que os benchmarks possam medir reuso de
+conexão sem depender de rede ou chaves reais.
+
+Também confere o formato das requisições (mensagens, blocos de system e
+cache_control da Anthropic) e responde 400 como o provedor responderia,
+e preenche `usage` simulando o prompt caching: um prefixo marcado com
+cache_control (Anthropic, correspondência exata) ou o maior prefixo em
+comum com um prompt anterior, em blocos de 128 tokens (OpenAI) volta
+como tokens lidos do cache. Como nos provedores, prefixos abaixo de
+`cache_min_tokens` (1024) não entram no cache; 0 desliga o mínimo e
+mostra o teto. Tokens ≈ caracteres / 4. Com
+`latency_per_kb_ms`, a latência cresce com o tamanho do corpo (prefill).
+
+Falhas injetáveis por fração das requisições: 500 (`error_rate`), 429
+com Retry-After (`rate_limit_rate`) e timeout (`timeout_rate`: segura a
+resposta por `hang_s` e fecha a conexão). `jitter_ms` soma uma cauda
+exponencial à latência.
+
+Também roda sozinho, para testes de carga contra o servidor real em modo
+de teste (ARBACHE_TEST_MODE=1, UPSTREAM_OVERRIDE_URL=http://127.0.0.1:8900):
+    python -m benchmarks.stub_upstream --port 8900 --latency-ms 300 --error-rate 0.02
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+from collections import deque
+from typing import Optional
+
+import httpx
+
+
+def openai_payload(text: str, usage: Optional[dict] = None) -> dict:
+    payload: dict = {"choices": [{"message": {"role": "assistant", "content": text}}]}
+    if usage:
+        payload["usage"] = usage
+    return payload
+
+
+def anthropic_payload(text: str, usage: Optional[dict] = None) -> dict:
+    payload: dict = {"content": [{"type": "text", "text": text}]}
+    if usage:
+        payload["usage"] = usage
+    return payload
+
+
+def tokens(text: str) -> int:
+    return len(text) // 4
+
+
+def check_shape(path: str, body: dict) -> list[str]:
+    """Erros de formato que o provedor recusaria (lista vazia = ok)."""
+    errors: list[str] = []
+    messages = body.get("messages")
+    if not isinstance(messages, list) or not messages:
+        return ["messages ausente ou vazio"]
+    if path.startswith("/v1/messages"):
+        system = body.get("system", "")
+        if isinstance(system, list):
+            breakpoints = 0
+            for block in system:
+                if block.get("type") != "text" or not isinstance(block.get("text"), str):
+                    errors.append("bloco de system sem type=text")
+                if "cache_control" in block:
+                    breakpoints += 1
+                    if block["cache_control"] != {"type": "ephemeral"}:
+                        errors.append("cache_control inválido")
+            if breakpoints > 4:
+                errors.append("mais de 4 cache_control")
+        elif not isinstance(system, str):
+            errors.append("system deve ser texto ou lista de blocos")
+        if messages[0].get("role") != "user":
+            errors.append("primeira mensagem precisa ser do usuário")
+        if any(m.get("role") not in ("user", "assistant") for m in messages):
+            errors.append("role inválido em messages")
+    else:
+        roles = [m.get("role") for m in messages]
+        if "system" in roles[roles.index("user") if "user" in roles else len(roles):]:
+            errors.append("mensagem de sistema depois da conversa")
+        if any(not isinstance(m.get("content"), str) for m in messages):
+            errors.append("content precisa ser texto")
+    return errors
+
+
+def sse_events(path: str, text: str, chunk_size: int = 8,
+               usage: Optional[dict] = None) -> list[bytes]:
+    """Quebra o texto em eventos SSE no formato do provedor."""
+    pieces = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+    events: list[bytes] = []
+    if usage and path.startswith("/v1/messages"):
+        start = {"type": "message_start", "message": {"usage": {**usage, "output_tokens": 1}}}
+        events.append(f"event: message_start\ndata: {json.dumps(start)}\n\n".encode())
+    for piece in pieces:
+        if path.startswith("/v1/messages"):
+            data = {"type": "content_block_delta", "index": 0,
+                    "delta": {"type": "text_delta", "text": piece}}
+            events.append(f"event: content_block_delta\ndata: {json.dumps(data)}\n\n".encode())
+        else:
+            data = {"choices": [{"delta": {"content": piece}}]}
+            events.append(f"data: {json.dumps(data)}\n\n".encode())
+    if path.startswith("/v1/messages"):
+        if usage:
+            delta = {"type": "message_delta", "usage": {"output_tokens": usage["output_tokens"]}}
+            events.append(f"event: message_delta\ndata: {json.dumps(delta)}\n\n".encode())
+        events.append(b'event: message_stop\ndata: {"type": "message_stop"}\n\n')
+    else:
+        if usage:
+            events.append(f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n".encode())
+        events.append(b"data: [DONE]\n\n")
+    return events
+
+
+class StubUpstream:
+    """Servidor stub que fala os formatos de resposta dos provedores."""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency_ms: float = 0.0,
+        text: str = "Resposta do stub sobre a Arbache Consulting.",
+        chunk_delay_ms: float = 0.0,
+        latency_per_kb_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        timeout_rate: float = 0.0,
+        retry_after_s: int = 1,
+        hang_s: float = 60.0,
+        seed: Optional[int] = None,
+        cache_min_tokens: int = 1024,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.latency_ms = latency_ms
+        self.text = text
+        self.chunk_delay_ms = chunk_delay_ms
+        self.latency_per_kb_ms = latency_per_kb_ms  # custo de prefill por KB do corpo
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.timeout_rate = timeout_rate
+        self.retry_after_s = retry_after_s
+        self.hang_s = hang_s
+        self.random = random.Random(seed)
+        self.cache_min_tokens = cache_min_tokens  # prefixo mínimo cacheável dos provedores
+        self.faults = {"error": 0, "rate_limit": 0, "timeout": 0}
+        self.connections = 0
+        self.requests = 0
+        self.bodies: deque[tuple[str, dict]] = deque(maxlen=1000)
+        self.shape_errors: list[str] = []
+        self._cached_prefixes: set[str] = set()
+        self._openai_prompts: deque[str] = deque(maxlen=200)
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def netloc(self) -> str:
+        return f"{self.host}:{self.port}"
+
+    def url(self, path: str) -> str:
+        return f"http://{self.netloc}{path}"
+
+    def _usage_for(self, path: str, body: dict) -> dict:
+        """`usage` no formato do provedor, com o prompt caching simulado."""
+        output = tokens(self.text)
+        if path.startswith("/v1/messages"):
+            system = body.get("system", "")
+            blocks = system if isinstance(system, list) else [{"type": "text", "text": system}]
+            # Prefixo cacheável: até o último bloco com cache_control
+            marked = [i for i, b in enumerate(blocks) if "cache_control" in b]
+            cut = marked[-1] + 1 if marked else 0
+            prefix = "".join(b["text"] for b in blocks[:cut])
+            rest = "".join(b["text"] for b in blocks[cut:])
+            rest += "".join(str(m.get("content")) for m in body.get("messages", []))
+            read = write = 0
+            if prefix and tokens(prefix) < self.cache_min_tokens:
+                # Curto demais para o cache: cobrado como entrada normal
+                rest = prefix + rest
+            elif prefix:
+                if prefix in self._cached_prefixes:
+                    read = tokens(prefix)
+                else:
+                    write = tokens(prefix)
+                    self._cached_prefixes.add(prefix)
+            return {"input_tokens": tokens(rest), "cache_read_input_tokens": read,
+                    "cache_creation_input_tokens": write, "output_tokens": output}
+
+        text = "".join(f"{m.get('role')}:{m.get('content')}\n" for m in body.get("messages", []))
+        common = max((len(os.path.commonprefix([text, seen])) for seen in self._openai_prompts), default=0)
+        self._openai_prompts.append(text)
+        cached = tokens(text[:common]) // 128 * 128
+        return {"prompt_tokens": tokens(text), "completion_tokens": output,
+                "prompt_tokens_details": {"cached_tokens": cached if cached >= self.cache_min_tokens else 0}}
+
+    def _payload_for(self, path: str, body: dict) -> dict:
+        usage = self._usage_for(path, body)
+        if path.startswith("/v1/messages"):
+            return anthropic_payload(self.text, usage)
+        return openai_payload(self.text, usage)
+
+    async def _write_stream(self, writer: asyncio.StreamWriter, path: str, body: dict) -> None:
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream\r\n"
+            b"Transfer-Encoding: chunked\r\n"
+            b"\r\n"
+        )
+        usage = None
+        if path.startswith("/v1/messages") or (body.get("stream_options") or {}).get("include_usage"):
+            usage = self._usage_for(path, body)
+        for event in sse_events(path, self.text, usage=usage):
+            if self.chunk_delay_ms:
+                await asyncio.sleep(self.chunk_delay_ms / 1000)
+            writer.write(f"{len(event):x}\r\n".encode() + event + b"\r\n")
+            await writer.drain()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                _, path, _ = request_line.decode("latin-1").split(" ", 2)
+
+                content_length = 0
+                keep_alive = True
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    name = name.strip().lower()
+                    if name == "content-length":
+                        content_length = int(value.strip())
+                    elif name == "connection" and value.strip().lower() == "close":
+                        keep_alive = False
+                raw = await reader.readexactly(content_length) if content_length else b""
+                try:
+                    request_body = json.loads(raw or b"{}")
+                except ValueError:
+                    request_body = {}
+                wants_stream = bool(request_body.get("stream"))
+
+                self.requests += 1
+                self.bodies.append((path, request_body))
+                fault = self._pick_fault()
+                if fault == "timeout":
+                    await asyncio.sleep(self.hang_s)
+                    break
+                delay_ms = self.latency_ms + self.latency_per_kb_ms * len(raw) / 1024
+                if self.jitter_ms:
+                    delay_ms += self.random.expovariate(1 / self.jitter_ms)
+                if delay_ms:
+                    await asyncio.sleep(delay_ms / 1000)
+
+                errors = check_shape(path, request_body) if request_body else []
+                extra_headers = b""
+                if fault == "error":
+                    body = json.dumps({"error": {"message": "stub: internal error"}}).encode()
+                    status = b"HTTP/1.1 500 Internal Server Error\r\n"
+                elif fault == "rate_limit":
+                    body = json.dumps({"error": {"message": "stub: rate limited"}}).encode()
+                    status = b"HTTP/1.1 429 Too Many Requests\r\n"
+                    extra_headers = f"Retry-After: {self.retry_after_s}\r\n".encode()
+                elif errors:
+                    self.shape_errors.extend(errors)
+                    body = json.dumps({"error": {"message": "; ".join(errors)}}).encode()
+                    status = b"HTTP/1.1 400 Bad Request\r\n"
+                elif wants_stream:
+                    await self._write_stream(writer, path, request_body)
+                    if not keep_alive:
+                        break
+                    continue
+                else:
+                    body = json.dumps(self._payload_for(path, request_body)).encode()
+                    status = b"HTTP/1.1 200 OK\r\n"
+                writer.write(
+                    status
+                    + b"Content-Type: application/json\r\n"
+                    + f"Content-Length: {len(body)}\r\n".encode()
+                    + extra_headers
+                    + (b"Connection: keep-alive\r\n" if keep_alive else b"Connection: close\r\n")
+                    + b"\r\n"
+                    + body
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, asyncio.CancelledError, ConnectionResetError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def _pick_fault(self) -> Optional[str]:
+        roll = self.random.random()
+        for fault, rate in (("error", self.error_rate), ("rate_limit", self.rate_limit_rate),
+                            ("timeout", self.timeout_rate)):
+            if roll < rate:
+                self.faults[fault] += 1
+                return fault
+            roll -= rate
+        return None
+
+    async def start(self) -> "StubUpstream":
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self) -> None:
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+
+class StubRoute(httpx.AsyncBaseTransport):
+    """Transporte httpx que reescreve as URLs dos provedores para o stub."""
+
+    def __init__(self, stub: StubUpstream) -> None:
+        self.stub = stub
+        self.inner = httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        request.url = request.url.copy_with(scheme="http", host=self.stub.host, port=self.stub.port)
+        return await self.inner.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+
+async def serve(args: argparse.Namespace) -> None:
+    stub = await StubUpstream(
+        host=args.host, port=args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        latency_per_kb_ms=args.latency_per_kb_ms, chunk_delay_ms=args.chunk_delay_ms,
+        error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+        timeout_rate=args.timeout_rate, retry_after_s=args.retry_after_s, hang_s=args.hang_s,
+        seed=args.seed,
+    ).start()
+    print(f"stub upstream em http://{stub.netloc}", flush=True)
+    try:
+        while True:
+            await asyncio.sleep(args.report_s)
+            print(f"requests={stub.requests} connections={stub.connections} faults={stub.faults} "
+                  f"shape_errors={len(stub.shape_errors)}", flush=True)
+    finally:
+        await stub.stop()
+
+
+def cli() -> None:
+    parser = argparse.ArgumentParser(description="Stub local dos provedores (Perplexity/OpenAI/Anthropic).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--latency-per-kb-ms", type=float, default=0.0)
+    parser.add_argument("--chunk-delay-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after-s", type=int, default=1)
+    parser.add_argument("--hang-s", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--report-s", type=float, default=10.0)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    cli()
@@ -12,19 +12,50 @@ MCP Guardrails Applied:
 
 import os
 import re
+import string
 import uuid
 import json
 import asyncio
+import atexit
+import sqlite3
+import sys
+import queue
+import threading
 import time
-from typing import Optional, Any
-from datetime import datetime
-from contextlib import asynccontextmanager
-from functools import wraps
-from collections import defaultdict
+import hashlib
+import hmac
+import ipaddress
+import unicodedata
+import zlib
+import math
+import random
+from abc import ABC, abstractmethod
+from typing import Optional, Any, AsyncIterator, Awaitable, Callable
+from bisect import bisect_left
+from contextvars import Context, ContextVar, copy_context
+from datetime import datetime, timezone
+from contextlib import asynccontextmanager, aclosing, suppress
+from functools import lru_cache, wraps
+from collections import defaultdict, deque, OrderedDict
+from urllib.parse import urlparse
+from email.utils import parsedate_to_datetime
 
 import httpx
-from fastapi import FastAPI, HTTPException, Request
+try:
+    import numpy as np
+except ImportError:  # cache semântico fica desabilitado
+    np = None
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:  # backend de estado Redis indisponível
+    redis_asyncio = None
+try:
+    import orjson
+except ImportError:  # logs serializados com json da stdlib
+    orjson = None
+from fastapi import Depends, FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Field, field_validator, ConfigDict
 from dotenv import load_dotenv
 
@@ -111,10 +142,17 @@ ALLOWED_PATHS = [
 ]
 
 
+# Modo de teste (carga local com benchmarks/stub_upstream.py): as chamadas
+# aos hosts da allowlist saem para UPSTREAM_OVERRIDE_URL e as respostas de
+# chat levam o header X-Chat-Branch. Sem ARBACHE_TEST_MODE a variável é
+# ignorada; a allowlist continua valendo para as URLs montadas no código.
+TEST_MODE = os.getenv("ARBACHE_TEST_MODE", "").lower() in ("1", "true", "yes")
+UPSTREAM_OVERRIDE_URL = os.getenv("UPSTREAM_OVERRIDE_URL", "") if TEST_MODE else ""
+
+
 def validate_url(url: str) -> bool:
     """Valida URL contra allowlist."""
     try:
-        from urllib.parse import urlparse
         parsed = urlparse(url)
         host_allowed = parsed.netloc in ALLOWED_HOSTS
         path_allowed = any(parsed.path.startswith(p) or parsed.path == p for p in ALLOWED_PATHS)
@@ -131,11 +169,273 @@ TIMEOUT_MS = 30000  # 30 segundos
 MAX_RETRIES = 3
 BACKOFF_BASE_MS = 1000
 
+# Prazo total de cada requisição de chat (0 = sem prazo). O cliente pode
+# pedir um prazo menor pelo header, nunca maior.
+REQUEST_DEADLINE_MS = int(os.getenv("REQUEST_DEADLINE_MS", "20000"))
+DEADLINE_HEADER = "x-request-deadline-ms"
+DEADLINE_CLIENT_MIN_MS = 1000
+# Tentativa com menos tempo que isso não chega a responder: nem começa
+DEADLINE_MIN_ATTEMPT_MS = int(os.getenv("DEADLINE_MIN_ATTEMPT_MS", "750"))
+RETRY_AFTER_MAX_S = 30  # sem prazo, Retry-After acima disso desiste
+
+# Pool de conexões upstream (keep-alive / HTTP/2)
+HTTP_POOL_MAX_CONNECTIONS = int(os.getenv("HTTP_POOL_MAX_CONNECTIONS", "20"))
+HTTP_POOL_MAX_KEEPALIVE = int(os.getenv("HTTP_POOL_MAX_KEEPALIVE", "10"))
+HTTP_KEEPALIVE_EXPIRY_S = float(os.getenv("HTTP_KEEPALIVE_EXPIRY_S", "30"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "false").lower() in ("1", "true", "yes")
+
+# Hedging v2: dispara Anthropic em paralelo se a OpenAI demorar
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "true").lower() in ("1", "true", "yes")
+HEDGE_DELAY_MS = int(os.getenv("HEDGE_DELAY_MS", "0"))  # 0 = usa p95 aprendido
+HEDGE_DEFAULT_DELAY_MS = 2500  # enquanto não há amostras suficientes
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MAX_RATIO = float(os.getenv("HEDGE_MAX_RATIO", "0.1"))  # máx. 10% de chamadas extras
+HEDGE_BURST = 5
+
+# Circuit breaker por provedor: abre com N falhas seguidas ou taxa de erro
+# alta nas últimas chamadas; depois de BREAKER_OPEN_S deixa passar sondas
+BREAKER_ENABLED = os.getenv("BREAKER_ENABLED", "true").lower() in ("1", "true", "yes")
+BREAKER_CONSECUTIVE_FAILURES = int(os.getenv("BREAKER_CONSECUTIVE_FAILURES", "5"))
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))  # últimas chamadas consideradas
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "10"))  # antes disso, só falhas seguidas
+BREAKER_OPEN_S = float(os.getenv("BREAKER_OPEN_S", "30"))
+BREAKER_HALF_OPEN_PROBES = int(os.getenv("BREAKER_HALF_OPEN_PROBES", "1"))
+
+# Cache de respostas curadas (/chat e /v2/chat)
+RESPONSE_CACHE_TTL_S = int(os.getenv("RESPONSE_CACHE_TTL_S", "3600"))
+RESPONSE_CACHE_SWR_S = int(os.getenv("RESPONSE_CACHE_SWR_S", "600"))  # janela stale-while-revalidate
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2000"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+
+# Cache da pesquisa bruta do Perplexity (fatos da empresa mudam pouco)
+RESEARCH_CACHE_TTL_S = int(os.getenv("RESEARCH_CACHE_TTL_S", str(12 * 3600)))
+RESEARCH_CACHE_SWR_S = int(os.getenv("RESEARCH_CACHE_SWR_S", str(48 * 3600)))
+RESEARCH_CACHE_MAX_ENTRIES = int(os.getenv("RESEARCH_CACHE_MAX_ENTRIES", "1000"))
+RESEARCH_CACHE_MAX_BYTES = int(os.getenv("RESEARCH_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+
+# Histórico de conversa do v2: orçamento de tokens (estimados) por chamada.
+# Mantém os turnos mais novos; "truncate" corta o primeiro que não cabe,
+# "drop" descarta-o inteiro. 0 = sem orçamento (só o limite de 6 mensagens).
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "600"))
+HISTORY_POLICY = os.getenv("HISTORY_POLICY", "truncate")
+HISTORY_TRUNCATE_MIN_TOKENS = 40  # trecho menor que isso não vale a pena manter
+
+# Armazém em disco (SQLite WAL) das respostas e pesquisas: sobrevive a deploys
+ANSWER_STORE_PATH = os.getenv("ANSWER_STORE_PATH", "")  # vazio = desligado
+ANSWER_STORE_MAX_ROWS = int(os.getenv("ANSWER_STORE_MAX_ROWS", "200000"))
+ANSWER_STORE_FLUSH_S = float(os.getenv("ANSWER_STORE_FLUSH_S", "1"))
+ANSWER_STORE_COMPACT_S = int(os.getenv("ANSWER_STORE_COMPACT_S", "3600"))
+ANSWER_STORE_LOAD_CHUNK = 1000  # linhas por fatia da carga inicial (cede o loop entre fatias)
+
+# Respostas pré-computadas dos chips de sugestão (conjunto fechado)
+CHIP_PRECOMPUTE_ENABLED = os.getenv("CHIP_PRECOMPUTE_ENABLED", "true").lower() in ("1", "true", "yes")
+CHIP_REFRESH_INTERVAL_S = int(os.getenv("CHIP_REFRESH_INTERVAL_S", str(6 * 3600)))
+CHIP_PRECOMPUTE_CONCURRENCY = int(os.getenv("CHIP_PRECOMPUTE_CONCURRENCY", "3"))
+CHIP_ANSWER_MAX_AGE_S = int(os.getenv("CHIP_ANSWER_MAX_AGE_S", str(24 * 3600)))  # depois disso, volta ao LLM
+CHIP_RELOAD_S = int(os.getenv("CHIP_RELOAD_S", "60"))  # releitura do disco enquanto outro worker gera
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")  # Bearer dos endpoints /admin (sem token: desabilitados)
+
+# /v2/chat/batch (jobs internos, autenticado pelo ADMIN_TOKEN)
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))  # padrão por batch
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))  # teto do que o job pode pedir
+
+# Cache semântico (perguntas parecidas na mesma seção)
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.80"))
+SEMANTIC_CACHE_TTL_S = int(os.getenv("SEMANTIC_CACHE_TTL_S", "21600"))
+SEMANTIC_CACHE_MAX_PER_SECTION = int(os.getenv("SEMANTIC_CACHE_MAX_PER_SECTION", "20000"))
+SEMANTIC_DIM = 256
+
 
 # ===================================
 # STRUCTURED LOGGING
 # ===================================
 
+LOG_QUEUE_MAX = int(os.getenv("LOG_QUEUE_MAX", "10000"))
+LOG_BATCH_MAX = int(os.getenv("LOG_BATCH_MAX", "256"))
+LOG_FLUSH_INTERVAL_S = float(os.getenv("LOG_FLUSH_INTERVAL_S", "0.05"))
+# Fração mantida por nível, só para as mensagens ruidosas abaixo
+# (ex.: "info=0.1,warn=1"). Níveis ausentes não são amostrados; o
+# padrão (vazio) mantém todas.
+LOG_SAMPLE_RATES: dict[str, float] = {
+    level.strip(): float(rate)
+    for level, _, rate in (
+        item.partition("=") for item in os.getenv("LOG_SAMPLE_RATES", "").split(",")
+    )
+    if level.strip() and rate
+}
+LOG_SAMPLED_MESSAGES = frozenset({"HTTP request starting", "HTTP request successful"})
+_LOG_REDACTED_KEYS = frozenset({"authorization", "api_key", "apiKey", "token", "password", "secret"})
+
+
+def _log_json(entry: dict) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(entry, default=str)
+    return json.dumps(entry, default=str).encode()
+
+
+class AsyncLogWriter:
+    """
+    Escrita de logs fora do event loop.
+
+    `emit` só monta uma tupla e faz put_nowait numa fila limitada; uma
+    thread daemon serializa e escreve em lotes no stdout. Com a fila
+    cheia (stdout travado, coletor lento) o registro é descartado e
+    contado, em vez de travar a API. A amostragem é por request_id, então
+    uma requisição amostrada mantém todas as suas linhas ruidosas.
+    """
+
+    def __init__(
+        self,
+        max_queue: int = LOG_QUEUE_MAX,
+        batch_max: int = LOG_BATCH_MAX,
+        flush_interval_s: float = LOG_FLUSH_INTERVAL_S,
+        sample_rates: Optional[dict[str, float]] = None,
+        stream: Any = None,
+    ) -> None:
+        self.batch_max = batch_max
+        self.flush_interval_s = flush_interval_s
+        self.sample_rates = LOG_SAMPLE_RATES if sample_rates is None else sample_rates
+        self.stream = stream
+        self._queue: queue.Queue = queue.Queue(max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._closed = False
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.sampled_out = 0
+        self.batches = 0
+        self._dropped_reported = 0
+        os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _reset_after_fork(self) -> None:
+        # A thread não sobrevive ao fork; o filho sobe a sua no primeiro log
+        self._queue = queue.Queue(self._queue.maxsize)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _keep(self, level: str, message: str, request_id: str) -> bool:
+        if message not in LOG_SAMPLED_MESSAGES:
+            return True
+        rate = self.sample_rates.get(level, 1.0)
+        if rate >= 1.0:
+            return True
+        return zlib.crc32(request_id.encode()) % 10000 < rate * 10000
+
+    def emit(self, level: str, message: str, request_id: str, meta: dict) -> None:
+        if not self._keep(level, message, request_id):
+            self.sampled_out += 1
+            return
+        self._enqueue((time.time(), level, message, request_id, meta))
+
+    def _enqueue(self, record: Any) -> None:
+        if self._closed:
+            self._write([record])
+            return
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(record)
+            self.enqueued += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+                self._thread.start()
+
+    @staticmethod
+    def _format(record: tuple) -> bytes:
+        ts, level, message, request_id, meta = record
+        return _log_json({
+            "timestamp": datetime.fromtimestamp(ts, timezone.utc).isoformat().removesuffix("+00:00") + "Z",
+            "level": level,
+            "message": message,
+            "request_id": request_id,
+            **meta,
+        })
+
+    def _overflow_line(self) -> Optional[bytes]:
+        if self.dropped <= self._dropped_reported:
+            return None
+        line = _log_json({
+            "timestamp": datetime.now(timezone.utc).isoformat().removesuffix("+00:00") + "Z",
+            "level": "warn",
+            "message": "Log records dropped",
+            "request_id": "log-writer",
+            "dropped_since_last": self.dropped - self._dropped_reported,
+            "dropped_total": self.dropped,
+        })
+        self._dropped_reported = self.dropped
+        return line
+
+    def _write(self, records: list) -> None:
+        lines = [self._format(r) for r in records]
+        overflow = self._overflow_line()
+        if overflow is not None:
+            lines.append(overflow)
+        stream = self.stream or sys.stdout
+        try:
+            stream.write(b"\n".join(lines).decode() + "\n")
+            stream.flush()
+        except (OSError, ValueError):  # stdout fechado: não há onde logar
+            return
+        self.written += len(records)
+        self.batches += 1
+
+    def _run(self) -> None:
+        while True:
+            record = self._queue.get()
+            if record is None:
+                return
+            batch = [record]
+            stop = False
+            deadline = time.monotonic() + self.flush_interval_s
+            while len(batch) < self.batch_max:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._write(batch)
+            if stop:
+                return
+
+    def close(self, timeout_s: float = 2.0) -> None:
+        """Escreve o que está na fila; logs posteriores saem síncronos."""
+        thread = self._thread
+        self._closed = True
+        if thread is not None:
+            try:
+                self._queue.put(None, timeout=timeout_s)
+            except queue.Full:
+                pass
+            thread.join(timeout_s)
+            self._thread = None
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "sampled_out": self.sampled_out,
+            "batches": self.batches,
+            "queue_depth": self._queue.qsize(),
+        }
+
+
+log_writer = AsyncLogWriter()
+atexit.register(log_writer.close)
+
+
 def secure_log(
     level: str,
     message: str,
@@ -145,6 +445,8 @@ def secure_log(
     """
     Log estruturado sem PII/secrets.
 
+    Enfileira o registro; serialização e escrita ficam com `log_writer`.
+
     Args:
         level: info, warn, error
         message: Mensagem do log
@@ -152,19 +454,801 @@ def secure_log(
         **meta: Metadados adicionais
     """
     # Sanitiza metadados - remove possíveis secrets
-    sanitized = {k: v for k, v in meta.items() if k not in [
-        "authorization", "api_key", "apiKey", "token", "password", "secret"
-    ]}
-
-    log_entry = {
-        "timestamp": datetime.utcnow().isoformat() + "Z",
-        "level": level,
-        "message": message,
-        "request_id": request_id,
-        **sanitized
-    }
+    if not _LOG_REDACTED_KEYS.isdisjoint(meta):
+        meta = {k: v for k, v in meta.items() if k not in _LOG_REDACTED_KEYS}
+
+    log_writer.emit(level, message, request_id, meta)
+
+
+# ===================================
+# MÉTRICAS (Prometheus)
+# ===================================
+
+# Segundos; cobre de um FAQ em memória (~ms) a um LLM com retries
+LATENCY_BUCKETS_S = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+METRICS_ROUTES = frozenset({"/chat", "/v2/chat", "/v2/chat/stream", "/v2/chat/batch", "/health", "/version", "/metrics"})
+UPSTREAM_PROVIDERS = {
+    "api.openai.com": "openai",
+    "api.anthropic.com": "anthropic",
+    "api.perplexity.ai": "perplexity",
+}
+
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+
+class Histogram:
+    """Buckets pré-alocados; observar é um bisect e três somas."""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple[float, ...]) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # último = +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class MetricFamily:
+    """
+    Uma métrica com labels. `labels(...)` devolve o filho (Counter ou
+    Histogram), criado uma vez e reaproveitado; chamadores quentes podem
+    guardar a referência.
+
+    Não há lock: toda gravação acontece no event loop, e a exposição só
+    lê. Com vários workers cada processo expõe os próprios valores.
+    """
+
+    def __init__(self, name: str, help_text: str, kind: str,
+                 labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = LATENCY_BUCKETS_S) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._children: dict[tuple[str, ...], Any] = {}
+
+    def labels(self, *values: str) -> Any:
+        child = self._children.get(values)
+        if child is None:
+            child = Histogram(self.buckets) if self.kind == "histogram" else Counter()
+            self._children[values] = child
+        return child
+
+    def _labels_text(self, values: tuple[str, ...], extra: str = "") -> str:
+        pairs = [f'{n}="{_label_value(v)}"' for n, v in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self._children.items()):
+            if self.kind == "counter":
+                lines.append(f"{self.name}{self._labels_text(values)} {child.value}")
+                continue
+            cumulative = 0
+            for bound, count in zip(self.buckets, child.counts):
+                cumulative += count
+                le = self._labels_text(values, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            le = self._labels_text(values, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {child.count}")
+            lines.append(f"{self.name}_sum{self._labels_text(values)} {child.sum}")
+            lines.append(f"{self.name}_count{self._labels_text(values)} {child.count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._families: list[MetricFamily] = []
+
+    def counter(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()) -> MetricFamily:
+        family = MetricFamily(name, help_text, "counter", labelnames)
+        self._families.append(family)
+        return family
+
+    def histogram(self, name: str, help_text: str, labelnames: tuple[str, ...] = (),
+                  buckets: tuple[float, ...] = LATENCY_BUCKETS_S) -> MetricFamily:
+        family = MetricFamily(name, help_text, "histogram", labelnames, buckets)
+        self._families.append(family)
+        return family
+
+    def render(self) -> str:
+        """Formato texto de exposição do Prometheus (0.0.4)."""
+        lines: list[str] = []
+        for family in self._families:
+            lines.extend(family.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+http_request_duration = metrics.histogram(
+    "arbache_http_request_duration_seconds",
+    "Duração das requisições HTTP por rota e status.",
+    ("route", "status"),
+)
+chat_branch_duration = metrics.histogram(
+    "arbache_chat_branch_duration_seconds",
+    "Duração das requisições de chat pelo ramo que respondeu.",
+    ("route", "branch"),
+)
+upstream_duration = metrics.histogram(
+    "arbache_upstream_request_duration_seconds",
+    "Duração de cada tentativa do secure_fetch por provedor.",
+    ("provider",),
+)
+upstream_attempts = metrics.counter(
+    "arbache_upstream_attempts_total", "Tentativas de chamada upstream.", ("provider",),
+)
+upstream_retries = metrics.counter(
+    "arbache_upstream_retries_total", "Novas tentativas após falha (com backoff).", ("provider",),
+)
+upstream_timeouts = metrics.counter(
+    "arbache_upstream_timeouts_total", "Tentativas encerradas por timeout.", ("provider",),
+)
+upstream_errors = metrics.counter(
+    "arbache_upstream_errors_total", "Tentativas com erro de rede/protocolo.", ("provider",),
+)
+upstream_responses = metrics.counter(
+    "arbache_upstream_responses_total", "Respostas upstream por status HTTP.", ("provider", "status"),
+)
+deadline_skips = metrics.counter(
+    "arbache_deadline_skips_total", "Tentativas/retries pulados por falta de prazo.", ("provider",),
+)
+upstream_short_circuits = metrics.counter(
+    "arbache_upstream_short_circuits_total", "Chamadas puladas com o circuito aberto.", ("provider",),
+)
+history_tokens_saved = metrics.histogram(
+    "arbache_history_tokens_saved",
+    "Tokens estimados de histórico removidos por chamada ao provedor.",
+    ("provider",),
+    buckets=(0, 25, 50, 100, 200, 400, 800, 1600, 3200),
+)
+batch_items = metrics.counter(
+    "arbache_batch_items_total",
+    "Itens do /v2/chat/batch: executados (unique) e repetidos no mesmo batch (deduplicated).",
+    ("kind",),
+)
+upstream_tokens = metrics.counter(
+    "arbache_upstream_tokens_total",
+    "Tokens informados pelos provedores (input sem cache, cache_read, cache_write, output).",
+    ("provider", "kind"),
+)
+research_cache_lookups = metrics.counter(
+    "arbache_research_cache_lookups_total", "Consultas ao cache de pesquisa do Perplexity.", ("result",),
+)
+research_cache_saved = metrics.counter(
+    "arbache_research_cache_saved_seconds_total", "Latência upstream estimada poupada por hits.",
+)
+rate_limit_rejections = metrics.counter(
+    "arbache_rate_limit_rejections_total", "Requisições recusadas pelo rate limit.", ("route",),
+)
+
+
+def upstream_provider(url: str) -> str:
+    return UPSTREAM_PROVIDERS.get(urlparse(url).netloc, "other")
+
+
+def record_usage(provider: str, usage: Optional[dict]) -> None:
+    """
+    Contabiliza o `usage` de uma resposta. OpenAI/Perplexity informam
+    prompt_tokens (com os cacheados dentro); a Anthropic separa
+    input_tokens das leituras e gravações de cache.
+    """
+    if not usage:
+        return
+    if "prompt_tokens" in usage or "completion_tokens" in usage:
+        cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+        counts = {
+            "input": (usage.get("prompt_tokens") or 0) - cached,
+            "cache_read": cached,
+            "output": usage.get("completion_tokens") or 0,
+        }
+    else:
+        counts = {
+            "input": usage.get("input_tokens") or 0,
+            "cache_read": usage.get("cache_read_input_tokens") or 0,
+            "cache_write": usage.get("cache_creation_input_tokens") or 0,
+            "output": usage.get("output_tokens") or 0,
+        }
+    for kind, tokens in counts.items():
+        if tokens:
+            upstream_tokens.labels(provider, kind).inc(tokens)
+
+
+class _BranchMark:
+    __slots__ = ("branch",)
+
+    def __init__(self) -> None:
+        self.branch = "unknown"
+
+
+# Mutável de propósito: tarefas filhas (hedge) herdam a referência
+_chat_branch: ContextVar[Optional[_BranchMark]] = ContextVar("chat_branch", default=None)
+
+
+def start_branch() -> _BranchMark:
+    # Reaproveita a marca do BranchHeaderMiddleware (modo de teste)
+    mark = _chat_branch.get()
+    if mark is None:
+        mark = _BranchMark()
+        _chat_branch.set(mark)
+    return mark
+
+
+def mark_branch(branch: str) -> None:
+    """Registra qual ramo respondeu a requisição de chat corrente."""
+    mark = _chat_branch.get()
+    if mark is not None:
+        mark.branch = branch
+
+
+class MetricsMiddleware:
+    """Middleware ASGI puro: tempo total por rota (inclui o corpo em streaming)."""
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        path = scope["path"]
+        route = path if path in METRICS_ROUTES else "other"
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message: dict) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_request_duration.labels(route, str(status)).observe(time.perf_counter() - started)
+
+
+class BranchHeaderMiddleware:
+    """Modo de teste: expõe o ramo que respondeu no header X-Chat-Branch."""
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        mark = _BranchMark()
+        _chat_branch.set(mark)
+
+        async def send_wrapper(message: dict) -> None:
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [
+                    *message.get("headers", []), (b"x-chat-branch", mark.branch.encode()),
+                ]}
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+# ===================================
+# TRACING (spans por requisição)
+# ===================================
+
+# Fração das requisições rastreadas; 0 = middleware nem é instalado
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+TRACE_SERVER_TIMING = os.getenv("TRACE_SERVER_TIMING", "true").lower() in ("1", "true", "yes")
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "")  # arquivo OTLP/JSON (uma linha por trace)
+TRACE_EXPORT_MIN_MS = float(os.getenv("TRACE_EXPORT_MIN_MS", "0"))  # só exporta traces mais lentos
+TRACE_MAX_SPANS = 256  # por trace; protege a memória numa tempestade de retries
+
+
+class Span:
+    """Um estágio cronometrado. Vira o span corrente enquanto está aberto."""
+
+    __slots__ = ("trace", "name", "span_id", "parent_id", "attributes",
+                 "start_ns", "end_ns", "error", "_token")
+
+    def __init__(self, trace: "RequestTrace", name: str, parent_id: Optional[str],
+                 attributes: dict) -> None:
+        self.trace = trace
+        self.name = name
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start_ns = 0
+        self.end_ns = 0
+        self.error: Optional[str] = None
+        self._token = None
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def __enter__(self) -> "Span":
+        self.start_ns = time.perf_counter_ns()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.end_ns = time.perf_counter_ns()
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        try:
+            _current_span.reset(self._token)
+        except ValueError:  # fechado em outro contexto (gerador finalizado fora da tarefa)
+            pass
+        return False
+
+
+class _NoopSpan:
+    """Devolvido quando a requisição não está sendo rastreada."""
+
+    __slots__ = ()
+
+    def set(self, **attributes: Any) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class RequestTrace:
+    """Spans de uma requisição; o trace_id vem do request_id quando ele existe."""
+
+    __slots__ = ("trace_id", "spans", "epoch_offset_ns")
+
+    def __init__(self) -> None:
+        self.trace_id = f"{random.getrandbits(128):032x}"
+        self.spans: list[Span] = []
+        # perf_counter_ns → relógio de parede, para exportar
+        self.epoch_offset_ns = time.time_ns() - time.perf_counter_ns()
+
+    def server_timing(self) -> str:
+        """Header Server-Timing: duração somada por nome de estágio (ms)."""
+        totals: dict[str, int] = {}
+        root = self.spans[0]
+        for span in self.spans[1:]:
+            if span.end_ns:
+                totals[span.name] = totals.get(span.name, 0) + span.end_ns - span.start_ns
+        entries = [f"{name};dur={ns / 1e6:.2f}" for name, ns in totals.items()]
+        entries.append(f"total;dur={(time.perf_counter_ns() - root.start_ns) / 1e6:.2f}")
+        return ", ".join(entries)
+
+    def to_otlp(self) -> dict:
+        """ExportTraceServiceRequest no mapeamento JSON do OTLP."""
+        def attribute(key: str, value: Any) -> dict:
+            if isinstance(value, bool):
+                return {"key": key, "value": {"boolValue": value}}
+            if isinstance(value, int):
+                return {"key": key, "value": {"intValue": str(value)}}
+            if isinstance(value, float):
+                return {"key": key, "value": {"doubleValue": value}}
+            return {"key": key, "value": {"stringValue": str(value)}}
+
+        spans = []
+        for span in self.spans:
+            end_ns = span.end_ns or time.perf_counter_ns()
+            spans.append({
+                "traceId": self.trace_id,
+                "spanId": span.span_id,
+                "parentSpanId": span.parent_id or "",
+                "name": span.name,
+                "kind": 2 if span.parent_id is None else 1,  # SERVER / INTERNAL
+                "startTimeUnixNano": str(span.start_ns + self.epoch_offset_ns),
+                "endTimeUnixNano": str(end_ns + self.epoch_offset_ns),
+                "attributes": [attribute(k, v) for k, v in span.attributes.items()],
+                "status": {"code": 2, "message": span.error} if span.error else {"code": 0},
+            })
+        return {"resourceSpans": [{
+            "resource": {"attributes": [attribute("service.name", "arbache-api")]},
+            "scopeSpans": [{"scope": {"name": "arbache-api"}, "spans": spans}],
+        }]}
+
+
+def trace_span(name: str, **attributes: Any) -> Any:
+    """
+    Abre um span filho do span corrente.
+
+    Sem trace ativo devolve um no-op compartilhado: o custo é um
+    ContextVar.get. Tarefas filhas (hedge) herdam o span corrente.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        return _NOOP_SPAN
+    trace = parent.trace
+    if len(trace.spans) >= TRACE_MAX_SPANS:
+        return _NOOP_SPAN
+    span = Span(trace, name, parent.span_id, attributes)
+    trace.spans.append(span)
+    return span
+
+
+def trace_request(request_id: str) -> None:
+    """Amarra o trace corrente ao request_id (mesmo id nos logs e no trace)."""
+    span = _current_span.get()
+    if span is None:
+        return
+    span.trace.spans[0].attributes["request_id"] = request_id
+    trace_id = request_id.replace("-", "")
+    if len(trace_id) == 32:
+        span.trace.trace_id = trace_id
+
+
+class OtlpFileExporter(AsyncLogWriter):
+    """Traces em OTLP/JSON, uma linha por trace, pela mesma fila em lotes dos logs."""
+
+    def __init__(self, path: str) -> None:
+        super().__init__(sample_rates={}, stream=open(path, "a", encoding="utf-8"))
+
+    def export(self, trace: RequestTrace) -> None:
+        self._enqueue(trace)
+
+    def _format(self, trace: RequestTrace) -> bytes:
+        return _log_json(trace.to_otlp())
+
+    def _overflow_line(self) -> Optional[bytes]:
+        return None  # descartes ficam só no contador
 
-    print(json.dumps(log_entry))
+    def close(self, timeout_s: float = 2.0) -> None:
+        super().close(timeout_s)
+        self.stream.close()
+
+
+trace_exporter: Optional[OtlpFileExporter] = (
+    OtlpFileExporter(TRACE_EXPORT_PATH) if TRACE_EXPORT_PATH else None
+)
+if trace_exporter is not None:
+    atexit.register(trace_exporter.close)
+
+
+class TracingMiddleware:
+    """
+    Decide a amostragem, abre o span raiz e injeta o Server-Timing.
+
+    O header sai no http.response.start: para respostas JSON todos os
+    estágios já terminaram; no SSE só os que vieram antes do stream.
+    """
+
+    def __init__(self, app: Any, sample_rate: float = TRACE_SAMPLE_RATE) -> None:
+        self.app = app
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http" or random.random() >= self.sample_rate:
+            await self.app(scope, receive, send)
+            return
+
+        trace = RequestTrace()
+        root = Span(trace, "request", None, {
+            "http.method": scope.get("method", ""),
+            "http.route": scope["path"] if scope["path"] in METRICS_ROUTES else "other",
+        })
+        trace.spans.append(root)
+
+        async def send_wrapper(message: dict) -> None:
+            if message["type"] == "http.response.start":
+                root.attributes["http.status_code"] = message["status"]
+                if TRACE_SERVER_TIMING:
+                    message = {**message, "headers": [
+                        *message.get("headers", []),
+                        (b"server-timing", trace.server_timing().encode()),
+                    ]}
+            await send(message)
+
+        with root:
+            await self.app(scope, receive, send_wrapper)
+
+        if trace_exporter is not None and (root.end_ns - root.start_ns) / 1e6 >= TRACE_EXPORT_MIN_MS:
+            trace_exporter.export(trace)
+
+
+# ===================================
+# UPSTREAM CONNECTION POOL
+# ===================================
+
+class UpstreamOverrideTransport(httpx.AsyncBaseTransport):
+    """Modo de teste: reescreve scheme/host/porta para o stub local."""
+
+    def __init__(self, target: str, limits: httpx.Limits) -> None:
+        url = httpx.URL(target)
+        self.scheme, self.host, self.port = url.scheme, url.host, url.port
+        self.inner = httpx.AsyncHTTPTransport(limits=limits)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        request.url = request.url.copy_with(scheme=self.scheme, host=self.host, port=self.port)
+        return await self.inner.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+
+class UpstreamClientPool:
+    """
+    Um httpx.AsyncClient de longa duração por host da allowlist.
+
+    Cada cliente mantém seu próprio pool keep-alive, então DNS, TCP e TLS
+    são pagos uma vez por conexão e não a cada chamada. Redirects ficam
+    desabilitados para que nenhuma requisição saia da allowlist.
+    """
+
+    def __init__(self) -> None:
+        self._clients: dict[str, httpx.AsyncClient] = {}
+
+    @staticmethod
+    def _http2_available() -> bool:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def _build_client(self) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=HTTP_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_S,
+        )
+        return httpx.AsyncClient(
+            timeout=httpx.Timeout(TIMEOUT_MS / 1000),
+            limits=limits,
+            http2=self.http2,
+            transport=UpstreamOverrideTransport(UPSTREAM_OVERRIDE_URL, limits) if UPSTREAM_OVERRIDE_URL else None,
+            follow_redirects=False,
+        )
+
+    def start(self) -> None:
+        """Cria um cliente por host permitido (chamado no startup)."""
+        for host in ALLOWED_HOSTS:
+            if host not in self._clients:
+                self._clients[host] = self._build_client()
+
+    def get(self, host: str) -> httpx.AsyncClient:
+        """Retorna o cliente do host; cria sob demanda fora do lifespan."""
+        if host not in ALLOWED_HOSTS:
+            raise ValueError(f"Host not in allowlist: {host}")
+        client = self._clients.get(host)
+        if client is None or client.is_closed:
+            client = self._build_client()
+            self._clients[host] = client
+        return client
+
+    @property
+    def http2(self) -> bool:
+        return HTTP2_ENABLED and self._http2_available()
+
+    async def aclose(self) -> None:
+        """Fecha todos os clientes (chamado no shutdown)."""
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            await client.aclose()
+
+
+upstream_pool = UpstreamClientPool()
+
+
+# ===================================
+# CIRCUIT BREAKER (por provedor)
+# ===================================
+
+class CircuitBreaker:
+    """
+    Fechado → aberto → meio-aberto, por provedor upstream.
+
+    Conta cada tentativa do secure_fetch/secure_stream. Abre com
+    BREAKER_CONSECUTIVE_FAILURES falhas seguidas ou, com pelo menos
+    BREAKER_MIN_CALLS chamadas na janela, taxa de erro ≥
+    BREAKER_ERROR_RATE. Aberto, recusa tudo por BREAKER_OPEN_S; depois
+    deixa passar até BREAKER_HALF_OPEN_PROBES sondas: sucesso fecha,
+    falha reabre. Respostas 4xx (exceto 429) e cancelamentos não contam.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        consecutive_failures: int = BREAKER_CONSECUTIVE_FAILURES,
+        error_rate: float = BREAKER_ERROR_RATE,
+        window: int = BREAKER_WINDOW,
+        min_calls: int = BREAKER_MIN_CALLS,
+        open_s: float = BREAKER_OPEN_S,
+        half_open_probes: int = BREAKER_HALF_OPEN_PROBES,
+    ) -> None:
+        self.name = name
+        self.consecutive_threshold = consecutive_failures
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.open_s = open_s
+        self.half_open_probes = half_open_probes
+        self._outcomes: deque[bool] = deque(maxlen=window)  # True = falha
+        self._failures_in_window = 0
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self.consecutive = 0
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.open_s:
+            self._state = self.HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    def available(self) -> bool:
+        """Sem consumir sonda: o provedor pode ser tentado agora?"""
+        state = self.state
+        return state == self.CLOSED or (
+            state == self.HALF_OPEN and self._probes < self.half_open_probes
+        )
+
+    def acquire(self) -> bool:
+        """Antes de cada tentativa; no meio-aberto reserva uma sonda."""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and self._probes < self.half_open_probes:
+            self._probes += 1
+            return True
+        self.rejected += 1
+        return False
+
+    def record(self, failed: Optional[bool]) -> None:
+        """Resultado da tentativa: True falhou, False ok, None neutro."""
+        if self._state == self.HALF_OPEN:
+            self._probes = max(0, self._probes - 1)
+            if failed:
+                self._open()
+            elif failed is False:
+                self._close()
+            return
+        if failed is None or self._state == self.OPEN:
+            return
+
+        if len(self._outcomes) == self._outcomes.maxlen and self._outcomes[0]:
+            self._failures_in_window -= 1
+        self._outcomes.append(failed)
+        if not failed:
+            self.consecutive = 0
+            return
+        self._failures_in_window += 1
+        self.consecutive += 1
+        if self.consecutive >= self.consecutive_threshold or (
+            len(self._outcomes) >= self.min_calls
+            and self._failures_in_window / len(self._outcomes) >= self.error_rate
+        ):
+            self._open()
+
+    def _open(self) -> None:
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self.opened += 1
+        secure_log("warn", "Circuit opened", "circuit-breaker", provider=self.name,
+                   consecutive_failures=self.consecutive,
+                   window_failures=self._failures_in_window, window_calls=len(self._outcomes))
+
+    def _close(self) -> None:
+        self._state = self.CLOSED
+        self._outcomes.clear()
+        self._failures_in_window = 0
+        self.consecutive = 0
+        secure_log("info", "Circuit closed", "circuit-breaker", provider=self.name)
+
+    def snapshot(self) -> dict[str, Any]:
+        calls = len(self._outcomes)
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive,
+            "window_error_rate": round(self._failures_in_window / calls, 4) if calls else 0.0,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
+
+
+circuit_breakers: dict[str, CircuitBreaker] = (
+    {name: CircuitBreaker(name) for name in UPSTREAM_PROVIDERS.values()} if BREAKER_ENABLED else {}
+)
+
+
+def provider_available(provider: str) -> bool:
+    breaker = circuit_breakers.get(provider)
+    return breaker is None or breaker.available()
+
+
+def provider_open(provider: str, request_id: str) -> bool:
+    """True se o circuito do provedor está aberto: quem chama pula para o fallback."""
+    if provider_available(provider):
+        return False
+    upstream_short_circuits.labels(provider).inc()
+    secure_log("warn", "Provider circuit open, skipping", request_id, provider=provider)
+    return True
+
+
+# ===================================
+# PRAZO (deadline) POR REQUISIÇÃO
+# ===================================
+
+# Instante (time.monotonic) em que a requisição corrente precisa responder
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+def start_deadline(request: Request) -> Optional[float]:
+    """Abre o orçamento da requisição: REQUEST_DEADLINE_MS ou o header, o menor."""
+    budget_ms = REQUEST_DEADLINE_MS
+    requested = request.headers.get(DEADLINE_HEADER)
+    if requested:
+        try:
+            client_ms = max(DEADLINE_CLIENT_MIN_MS, int(float(requested)))
+            budget_ms = min(budget_ms, client_ms) if budget_ms > 0 else client_ms
+        except ValueError:
+            pass
+    deadline = time.monotonic() + budget_ms / 1000 if budget_ms > 0 else None
+    _deadline.set(deadline)
+    return deadline
+
+
+def server_deadline() -> Optional[float]:
+    """Prazo só pelo orçamento do servidor (REQUEST_DEADLINE_MS), sem o header."""
+    return time.monotonic() + REQUEST_DEADLINE_MS / 1000 if REQUEST_DEADLINE_MS > 0 else None
+
+
+def deadline_remaining() -> Optional[float]:
+    """Segundos que restam do orçamento; None sem prazo."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def deadline_spent() -> bool:
+    """Não sobra tempo para mais uma chamada upstream."""
+    remaining = deadline_remaining()
+    return remaining is not None and remaining < DEADLINE_MIN_ATTEMPT_MS / 1000
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After em segundos (número ou data HTTP)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
 
 
 # ===================================
@@ -182,8 +1266,9 @@ async def secure_fetch(
     """
     Fetch seguro com:
     - Validação de URL contra allowlist
-    - Timeout
-    - Retry com backoff exponencial
+    - Conexões reaproveitadas do pool upstream
+    - Timeout limitado ao prazo restante da requisição
+    - Retry com backoff exponencial (ou Retry-After), só se couber no prazo
     - Logging estruturado
     """
     # Validar URL contra allowlist
@@ -191,48 +1276,213 @@ async def secure_fetch(
         secure_log("error", "URL not in allowlist", request_id, url=url)
         raise ValueError(f"URL not in allowlist: {url}")
 
-    timeout = httpx.Timeout(TIMEOUT_MS / 1000)
+    client = upstream_pool.get(urlparse(url).netloc)
+    provider = upstream_provider(url)
+    breaker = circuit_breakers.get(provider)
 
     for attempt in range(retries):
-        try:
-            secure_log("info", "HTTP request starting", request_id,
-                      url=url, attempt=attempt + 1, max_retries=retries)
-
-            async with httpx.AsyncClient(timeout=timeout) as client:
-                if method == "POST":
-                    response = await client.post(url, headers=headers, json=json_data)
-                else:
-                    response = await client.get(url, headers=headers)
-
+        remaining = deadline_remaining()
+        if remaining is not None and remaining < DEADLINE_MIN_ATTEMPT_MS / 1000:
+            deadline_skips.labels(provider).inc()
+            secure_log("warn", "Deadline budget spent, skipping attempt", request_id,
+                       provider=provider, attempt=attempt + 1,
+                       remaining_ms=round(remaining * 1000))
+            return None
+
+        if breaker is not None and not breaker.acquire():
+            upstream_short_circuits.labels(provider).inc()
+            secure_log("warn", "Provider circuit open, giving up", request_id,
+                       provider=provider, attempt=attempt + 1)
+            return None
+
+        attempt_timeout = TIMEOUT_MS / 1000 if remaining is None else min(TIMEOUT_MS / 1000, remaining)
+        retry_after: Optional[float] = None
+        started = time.perf_counter()
+        failed: Optional[bool] = True
+        with trace_span(f"fetch.{provider}", attempt=attempt + 1) as span:
+            try:
+                secure_log("info", "HTTP request starting", request_id,
+                          url=url, attempt=attempt + 1, max_retries=retries)
+                upstream_attempts.labels(provider).inc()
+
+                # Timeout do httpx é por fase; o asyncio.timeout limita o total
+                async with asyncio.timeout(attempt_timeout):
+                    if method == "POST":
+                        response = await client.post(url, headers=headers, json=json_data,
+                                                     timeout=attempt_timeout)
+                    else:
+                        response = await client.get(url, headers=headers, timeout=attempt_timeout)
+
+                upstream_duration.labels(provider).observe(time.perf_counter() - started)
+                upstream_responses.labels(provider, str(response.status_code)).inc()
+                span.set(status_code=response.status_code)
                 if response.status_code == 200:
+                    failed = False
                     secure_log("info", "HTTP request successful", request_id,
                               status_code=response.status_code)
-                    return response.json()
+                    data = response.json()
+                    if isinstance(data, dict):
+                        record_usage(provider, data.get("usage"))
+                    return data
 
                 secure_log("warn", "HTTP request failed", request_id,
                           status_code=response.status_code, attempt=attempt + 1)
 
                 # Não fazer retry em erros 4xx (exceto 429)
                 if 400 <= response.status_code < 500 and response.status_code != 429:
+                    failed = None  # erro nosso, não do provedor
                     return None
-
-        except httpx.TimeoutException:
-            secure_log("warn", "HTTP request timeout", request_id, attempt=attempt + 1)
-        except Exception as e:
-            secure_log("error", "HTTP request error", request_id,
-                      error=str(e), attempt=attempt + 1)
-
-        # Backoff exponencial
+                retry_after = parse_retry_after(response.headers.get("retry-after"))
+
+            except (httpx.TimeoutException, TimeoutError):
+                upstream_duration.labels(provider).observe(time.perf_counter() - started)
+                upstream_timeouts.labels(provider).inc()
+                span.set(error="timeout")
+                secure_log("warn", "HTTP request timeout", request_id, attempt=attempt + 1,
+                           timeout_s=round(attempt_timeout, 3))
+                # Cortada pelo nosso prazo, não pelo timeout normal: não é culpa do provedor
+                if attempt_timeout < TIMEOUT_MS / 1000:
+                    failed = None
+            except Exception as e:
+                upstream_duration.labels(provider).observe(time.perf_counter() - started)
+                upstream_errors.labels(provider).inc()
+                span.set(error=type(e).__name__)
+                secure_log("error", "HTTP request error", request_id,
+                          error=str(e), attempt=attempt + 1)
+            except asyncio.CancelledError:
+                failed = None
+                raise
+            finally:
+                if breaker is not None:
+                    breaker.record(failed)
+
+        # Backoff exponencial (inútil se o circuito acabou de abrir)
         if attempt < retries - 1:
+            if breaker is not None and not breaker.available():
+                upstream_short_circuits.labels(provider).inc()
+                secure_log("warn", "Provider circuit open, giving up", request_id,
+                           provider=provider, attempt=attempt + 1)
+                return None
             backoff = (BACKOFF_BASE_MS * (2 ** attempt)) / 1000
+            if retry_after is not None:
+                backoff = retry_after
+            remaining = deadline_remaining()
+            if remaining is None and backoff > RETRY_AFTER_MAX_S:
+                secure_log("warn", "Retry-After too long, giving up", request_id,
+                           retry_after_seconds=backoff)
+                return None
+            if remaining is not None and backoff + DEADLINE_MIN_ATTEMPT_MS / 1000 > remaining:
+                deadline_skips.labels(provider).inc()
+                secure_log("warn", "Retry does not fit deadline, giving up", request_id,
+                           backoff_seconds=backoff, retry_after=retry_after is not None,
+                           remaining_ms=round(remaining * 1000))
+                return None
+            upstream_retries.labels(provider).inc()
             secure_log("info", "Retrying with backoff", request_id,
                       backoff_seconds=backoff, next_attempt=attempt + 2)
-            await asyncio.sleep(backoff)
+            with trace_span("backoff", seconds=backoff, next_attempt=attempt + 2):
+                await asyncio.sleep(backoff)
 
     secure_log("error", "All retries exhausted", request_id, total_attempts=retries)
     return None
 
 
+async def secure_stream(
+    url: str,
+    request_id: str,
+    headers: Optional[dict] = None,
+    json_data: Optional[dict] = None,
+) -> AsyncIterator[dict]:
+    """
+    POST com resposta Server-Sent Events, mesma allowlist do secure_fetch.
+
+    Produz cada evento `data:` já decodificado. Não há retry: uma vez que
+    o stream começou, quem chama decide o fallback. Se o consumidor parar
+    de iterar (ex.: cliente desconectou), a conexão upstream é liberada.
+    """
+    if not validate_url(url):
+        secure_log("error", "URL not in allowlist", request_id, url=url)
+        raise ValueError(f"URL not in allowlist: {url}")
+
+    client = upstream_pool.get(urlparse(url).netloc)
+    provider = upstream_provider(url)
+    breaker = circuit_breakers.get(provider)
+    if breaker is not None and not breaker.acquire():
+        upstream_short_circuits.labels(provider).inc()
+        secure_log("warn", "Provider circuit open, giving up", request_id, provider=provider)
+        return
+
+    remaining = deadline_remaining()
+    if remaining is not None and remaining < DEADLINE_MIN_ATTEMPT_MS / 1000:
+        deadline_skips.labels(provider).inc()
+        secure_log("warn", "Deadline budget spent, skipping stream", request_id, provider=provider)
+        if breaker is not None:
+            breaker.record(None)
+        return
+    timeout = TIMEOUT_MS / 1000 if remaining is None else min(TIMEOUT_MS / 1000, remaining)
+
+    secure_log("info", "HTTP stream starting", request_id, url=url)
+    upstream_attempts.labels(provider).inc()
+    # O breaker olha só até os headers; o que acontece no meio do stream não conta
+    failed: Optional[bool] = True
+    try:
+        # O timeout do httpx é por leitura: o prazo total vem do asyncio.timeout,
+        # aplicado a cada espera (nunca em volta de um yield)
+        upstream_request = client.build_request("POST", url, headers=headers, json=json_data,
+                                                timeout=timeout)
+        async with asyncio.timeout(timeout):
+            response = await client.send(upstream_request, stream=True)
+        try:
+            status = response.status_code
+            upstream_responses.labels(provider, str(status)).inc()
+            failed = False if status == 200 else (None if 400 <= status < 500 and status != 429 else True)
+            if breaker is not None:
+                breaker.record(failed)
+                breaker = None
+            if response.status_code != 200:
+                secure_log("warn", "HTTP stream failed", request_id,
+                          status_code=response.status_code)
+                return
+
+            lines = response.aiter_lines()
+            while True:
+                try:
+                    async with asyncio.timeout(deadline_remaining()):
+                        line = await anext(lines)
+                except StopAsyncIteration:
+                    break
+                if not line.startswith("data:"):
+                    continue
+                payload = line[5:].strip()
+                if payload == "[DONE]":
+                    break
+                try:
+                    yield json.loads(payload)
+                except ValueError:
+                    continue
+        finally:
+            await response.aclose()
+
+        secure_log("info", "HTTP stream finished", request_id)
+    except httpx.TimeoutException:
+        upstream_timeouts.labels(provider).inc()
+        secure_log("warn", "HTTP stream timeout", request_id)
+    except TimeoutError:
+        # Prazo da requisição esgotado: não é falha do provedor
+        failed = None
+        upstream_timeouts.labels(provider).inc()
+        secure_log("warn", "HTTP stream cut by deadline", request_id)
+    except httpx.HTTPError as e:
+        upstream_errors.labels(provider).inc()
+        secure_log("error", "HTTP stream error", request_id, error=str(e))
+    except (asyncio.CancelledError, GeneratorExit):
+        failed = None
+        raise
+    finally:
+        if breaker is not None:
+            breaker.record(failed)
+
+
 # ===================================
 # CONTEXTO ARBACHE
 # ===================================
@@ -281,6 +1531,16 @@ ALLOWED_TOPICS = [
     "palestras", "painéis", "ecossistema", "icons.ai", "icons ai",
     "colabs", "co.labs", "e-learning", "parceiros", "serviços",
     "treinamento", "desenvolvimento", "coaching", "capacitação",
+    # Temas dos chips do frontend
+    "parceiro", "parceria", "solução", "especialista", "expertise", "pilar",
+    "ia", "inteligência artificial", "ods", "onu", "hubmulher", "reunião",
+]
+
+# Também contam como dentro do escopo no check_boundary
+BOUNDARY_GREETINGS = ["olá", "oi", "bom dia", "boa tarde", "boa noite", "hello", "hi", "ajuda", "help"]
+BOUNDARY_SERVICE_WORDS = [
+    "serviço", "oferecem", "fazem", "podem", "ajudar", "contratar", "atendem", "agendar",
+    "preço", "valor", "custo",
 ]
 
 CURATOR_SYSTEM_PROMPT = f"""Você é um assistente da Arbache Consulting, uma consultoria especializada em educação corporativa, liderança e sustentabilidade.
@@ -335,6 +1595,24 @@ class HealthResponseV1(BaseModel):
     status: str
     version: str
     services: dict[str, bool]
+    hedging: Optional[dict[str, float]] = None
+    response_cache: Optional[dict[str, float]] = None
+    research_cache: Optional[dict[str, float]] = None
+    single_flight: Optional[dict[str, float]] = None
+    chip_answers: Optional[dict[str, float]] = None
+    answer_store: Optional[dict[str, float]] = None
+    semantic_cache: Optional[dict[str, float]] = None
+    rate_limit: Optional[dict[str, float]] = None
+    logging: Optional[dict[str, float]] = None
+    circuit_breakers: Optional[dict[str, dict[str, Any]]] = None
+
+
+class ChipRefreshResponse(BaseModel):
+    """Response do refresh manual das respostas pré-computadas."""
+    model_config = ConfigDict(strict=True)
+
+    status: str
+    chip_answers: dict[str, float]
 
 
 class VersionResponseV1(BaseModel):
@@ -386,6 +1664,14 @@ class ChatResponseV2(BaseModel):
     request_id: str
 
 
+class ChatBatchRequest(BaseModel):
+    """Request do /v2/chat/batch: itens no formato do /v2/chat."""
+    model_config = ConfigDict(strict=True, extra='forbid')
+
+    items: list[ChatRequestV2] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS)
+    concurrency: Optional[int] = Field(None, ge=1)
+
+
 # ===================================
 # V2 SECTION CONTENT (server-side mirror)
 # ===================================
@@ -467,17 +1753,62 @@ SECTION_CONTENT_V2: dict[str, dict] = {
 
 
 # ===================================
-# V2 FAQ (instant responses)
+# NORMALIZAÇÃO DE TEXTO
 # ===================================
 
-FAQ_V2: dict[str, str] = {
-    'o que a arbache faz':
-        'A Arbache Consulting oferece soluções integradas em educação corporativa, liderança, ESG e sustentabilidade. Ajudamos organizações a desenvolver pessoas e gerar impacto positivo. Quer saber mais sobre alguma solução específica?',
-    'quem é ana paula arbache':
-        'Ana Paula Arbache é a fundadora e CEO da Arbache Consulting. PhD, SDG Pioneer reconhecida pela ONU, e especialista em educação corporativa, liderança e sustentabilidade com mais de duas décadas de experiência.',
-    'como entrar em contato':
-        'Você pode entrar em contato pelo formulário na seção Contato do nosso site. Nossa equipe retorna em até 24h úteis.',
-    'quais serviços vocês oferecem':
+# Palavras sem conteúdo (já normalizadas, sem acento)
+PT_STOP_WORDS = frozenset({
+    "o", "a", "os", "as", "um", "uma", "uns", "umas", "de", "do", "da", "dos",
+    "das", "em", "no", "na", "nos", "nas", "por", "para", "pra", "com", "que",
+    "e", "ou", "se", "me", "te", "eu", "voce", "voces", "vc", "vcs", "ao", "aos",
+    "isso", "isto", "esse", "essa", "sobre", "mais", "muito", "pode", "poderia",
+    "gostaria", "quero", "queria", "saber", "sao", "ser", "tem", "ter",
+    "ola", "oi", "favor", "obrigado", "obrigada",
+})
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]")
+
+# Caminho rápido: acentos do português e pontuação ASCII numa única
+# tradução; só texto com outros caracteres cai no NFKD + regex
+_FOLD_TABLE = str.maketrans(
+    "áàâãäéèêëíìîïóòôõöúùûüçñ" + "".join(c for c in string.punctuation if c != "_"),
+    "aaaaaeeeeiiiiooooouuuucn" + " " * (len(string.punctuation) - 1),
+)
+
+
+def normalize_text(text: str) -> str:
+    """Minúsculas, sem acentos, sem pontuação e com espaços colapsados."""
+    folded = text.lower().translate(_FOLD_TABLE)
+    if not folded.isascii():
+        decomposed = unicodedata.normalize("NFKD", folded)
+        folded = "".join(c for c in decomposed if not unicodedata.combining(c))
+        folded = _PUNCTUATION_RE.sub(" ", folded)
+    return " ".join(folded.split())
+
+
+_STEM_SUFFIXES = ("em", "am", "es", "s")
+
+
+def _light_stem(word: str) -> str:
+    """Remove plural/3ª pessoa do plural (fazem → faz, serviços → servico)."""
+    for suffix in _STEM_SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+# ===================================
+# V2 FAQ (instant responses)
+# ===================================
+
+FAQ_V2: dict[str, str] = {
+    'o que a arbache faz':
+        'A Arbache Consulting oferece soluções integradas em educação corporativa, liderança, ESG e sustentabilidade. Ajudamos organizações a desenvolver pessoas e gerar impacto positivo. Quer saber mais sobre alguma solução específica?',
+    'quem é ana paula arbache':
+        'Ana Paula Arbache é a fundadora e CEO da Arbache Consulting. PhD, SDG Pioneer reconhecida pela ONU, e especialista em educação corporativa, liderança e sustentabilidade com mais de duas décadas de experiência.',
+    'como entrar em contato':
+        'Você pode entrar em contato pelo formulário na seção Contato do nosso site. Nossa equipe retorna em até 24h úteis.',
+    'quais serviços vocês oferecem':
         'Oferecemos 11 soluções integradas: Trilhas Educacionais, Curadoria, Formação de Lideranças, Assessment com IA, Consultoria ESG, Mentoria, Auditorias, Imersões, Networking, Gestão de RH e Palestras.',
     'o que é o hubmulher':
         'O HubMulher é uma iniciativa voltada para o empoderamento feminino e liderança da mulher no mercado de trabalho. Promovemos eventos, mentorias e conteúdos para fortalecer a presença feminina em posições de liderança.',
@@ -494,27 +1825,569 @@ FAQ_V2: dict[str, str] = {
 }
 
 
+FAQ_MATCH_THRESHOLD = float(os.getenv("FAQ_MATCH_THRESHOLD", "0.75"))
+FAQ_TYPO_MIN_LENGTH = 5  # tokens menores não recebem tolerância a erro
+FAQ_TYPO_WEIGHT = 0.9  # peso de um token casado com 1 erro de digitação
+
+
+def faq_tokens(text: str) -> list[str]:
+    """Tokens normalizados, sem stop words e com stemming leve."""
+    return [
+        _light_stem(w) for w in normalize_text(text).split()
+        if w not in PT_STOP_WORDS
+    ]
+
+
+def _deletes(token: str) -> set[str]:
+    """Variações do token com um caractere removido."""
+    return {token[:i] + token[i + 1:] for i in range(len(token))}
+
+
+class FaqIndex:
+    """
+    Índice invertido das perguntas do FAQ.
+
+    Cada pergunta vira um conjunto de tokens (sem acento, sem stop words,
+    com stemming leve) ponderados por IDF. A busca só visita as entradas
+    que compartilham algum token com a mensagem e pontua pelo coeficiente
+    de Dice ponderado — a mensagem precisa cobrir a pergunta e vice-versa,
+    então "ia" sozinho não casa com "como funciona o assessment com ia".
+    Tokens fora do vocabulário são corrigidos com distância de edição 1
+    via índice de deleções (custo constante por token).
+    """
+
+    def __init__(self, faq: dict[str, str], threshold: float = FAQ_MATCH_THRESHOLD) -> None:
+        self.threshold = threshold
+        self._answers: list[str] = []
+        self._entry_tokens: list[frozenset[str]] = []
+        self._entry_weights: list[float] = []
+        self._postings: dict[str, list[int]] = defaultdict(list)
+        self._deletes: dict[str, set[str]] = defaultdict(set)
+        self._idf: dict[str, float] = {}
+
+        for key, answer in faq.items():
+            tokens = frozenset(faq_tokens(key))
+            if not tokens:
+                continue
+            entry = len(self._answers)
+            self._answers.append(answer)
+            self._entry_tokens.append(tokens)
+            for token in tokens:
+                self._postings[token].append(entry)
+
+        total = len(self._answers)
+        for token, entries in self._postings.items():
+            # IDF suavizado: tokens raros pesam mais que "arbache" ou "como"
+            self._idf[token] = 1.0 + math.log((1 + total) / (1 + len(entries)))
+            if len(token) >= FAQ_TYPO_MIN_LENGTH:
+                for variant in _deletes(token):
+                    self._deletes[variant].add(token)
+        self._entry_weights = [
+            sum(self._idf[t] for t in tokens) for tokens in self._entry_tokens
+        ]
+
+    def __len__(self) -> int:
+        return len(self._answers)
+
+    def _resolve(self, token: str) -> Optional[tuple[str, float]]:
+        """Token do vocabulário (ou correção com 1 erro) e seu fator de peso."""
+        if token in self._idf:
+            return token, 1.0
+        if len(token) < FAQ_TYPO_MIN_LENGTH:
+            return None
+        candidates = set(self._deletes.get(token, ()))
+        for variant in _deletes(token):
+            if variant in self._idf:
+                candidates.add(variant)
+            candidates.update(self._deletes.get(variant, ()))
+        if not candidates:
+            return None
+        # Determinístico: o mais raro (maior IDF) e depois ordem alfabética
+        best = min(candidates, key=lambda t: (-self._idf[t], t))
+        return best, FAQ_TYPO_WEIGHT
+
+    def match(self, message: str) -> Optional[tuple[str, float]]:
+        """Melhor resposta e score, ou None se nenhuma passa do threshold."""
+        resolved: dict[str, float] = {}
+        query_weight = 0.0
+        for token in set(faq_tokens(message)):
+            hit = self._resolve(token)
+            if hit is None:
+                # Token desconhecido ainda conta contra a cobertura
+                query_weight += 1.0 + math.log(1 + len(self))
+                continue
+            vocab_token, factor = hit
+            resolved[vocab_token] = max(resolved.get(vocab_token, 0.0), factor)
+            query_weight += self._idf[vocab_token]
+
+        if not resolved:
+            return None
+
+        # Filtro de prefixo: Dice >= t exige peso compartilhado >= t*qw/2.
+        # Só os tokens mais raros precisam gerar candidatos; os comuns
+        # (listas longas) apenas somam peso a candidatos já encontrados.
+        ordered = sorted(resolved.items(), key=lambda item: len(self._postings[item[0]]))
+        remaining = sum(self._idf[t] * f for t, f in ordered)
+        required = self.threshold * query_weight / 2
+        overlap: dict[int, float] = defaultdict(float)
+        suffix: list[tuple[str, float]] = []
+        for token, factor in ordered:
+            if remaining < required:
+                suffix.append((token, factor))
+                continue
+            weight = self._idf[token] * factor
+            for entry in self._postings[token]:
+                overlap[entry] += weight
+            remaining -= weight
+        for entry in overlap:
+            tokens = self._entry_tokens[entry]
+            for token, factor in suffix:
+                if token in tokens:
+                    overlap[entry] += self._idf[token] * factor
+
+        best: Optional[tuple[str, float]] = None
+        for entry, shared in overlap.items():
+            score = 2 * shared / (query_weight + self._entry_weights[entry])
+            if score >= self.threshold and (best is None or score > best[1]):
+                best = (self._answers[entry], score)
+        return best
+
+
+faq_index = FaqIndex(FAQ_V2)
+
+
+# ===================================
+# ESTADO COMPARTILHADO (workers / réplicas)
+# ===================================
+
+# memory:// (padrão, só este processo), redis://host:6379/0 ou sqlite:///caminho/state.db
+STATE_BACKEND_URL = os.getenv("STATE_BACKEND_URL", "memory://")
+STATE_BACKEND_TIMEOUT_S = float(os.getenv("STATE_BACKEND_TIMEOUT_S", "0.25"))
+STATE_KEY_PREFIX = os.getenv("STATE_KEY_PREFIX", "arbache:")
+STATE_MEMORY_MAX_KEYS = int(os.getenv("STATE_MEMORY_MAX_KEYS", "100000"))
+STATE_SQLITE_PURGE_S = 60  # intervalo entre limpezas de chaves vencidas
+
+
+class StateBackend(ABC):
+    """
+    Chave-valor com TTL para o estado que precisa valer entre processos.
+
+    `batch` é a operação principal: incrementa contadores de forma
+    atômica e lê outras chaves numa única ida ao backend, para que o
+    estado compartilhado custe no máximo um round-trip por requisição.
+    Valores lidos voltam como bytes (contadores inclusive, como no Redis).
+    """
+
+    name = "base"
+    shared = False
+
+    @abstractmethod
+    async def batch(
+        self,
+        incr: Optional[dict[str, int]] = None,
+        get: Optional[list[str]] = None,
+        ttl_s: float = 60,
+    ) -> dict[str, Any]:
+        """Incrementa `incr` (TTL renovado para `ttl_s`) e lê `get`; contadores voltam como int."""
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return (await self.batch(get=[key]))[key]
+
+    @abstractmethod
+    async def set(self, key: str, value: bytes, ttl_s: float) -> None:
+        """Grava `value` com validade de `ttl_s` segundos."""
+
+    async def aclose(self) -> None:
+        pass
+
+
+def _as_bytes(value: Any) -> Optional[bytes]:
+    if value is None or isinstance(value, bytes):
+        return value
+    return str(value).encode()
+
+
+class MemoryStateBackend(StateBackend):
+    """Implementação em processo: não compartilha nada, mas segue o mesmo contrato."""
+
+    name = "memory"
+
+    def __init__(self, max_keys: int = STATE_MEMORY_MAX_KEYS) -> None:
+        self.max_keys = max_keys
+        self._data: OrderedDict[str, tuple[Any, float]] = OrderedDict()
+
+    def _read(self, key: str, now: float) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        if item[1] <= now:
+            del self._data[key]
+            return None
+        return item[0]
+
+    def _write(self, key: str, value: Any, expires: float) -> None:
+        self._data[key] = (value, expires)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_keys:
+            self._data.popitem(last=False)
+
+    async def batch(
+        self,
+        incr: Optional[dict[str, int]] = None,
+        get: Optional[list[str]] = None,
+        ttl_s: float = 60,
+    ) -> dict[str, Any]:
+        now = time.monotonic()
+        result: dict[str, Any] = {}
+        for key, amount in (incr or {}).items():
+            value = (self._read(key, now) or 0) + amount
+            self._write(key, value, now + ttl_s)
+            result[key] = value
+        for key in get or ():
+            result[key] = _as_bytes(self._read(key, now))
+        return result
+
+    async def set(self, key: str, value: bytes, ttl_s: float) -> None:
+        self._write(key, value, time.monotonic() + ttl_s)
+
+
+class RedisStateBackend(StateBackend):
+    """
+    Backend Redis (ou qualquer servidor que fale o protocolo, como
+    KeyDB/Valkey/Dragonfly). O batch vai num único pipeline MULTI/EXEC.
+    """
+
+    name = "redis"
+    shared = True
+
+    def __init__(self, url: str, prefix: str = STATE_KEY_PREFIX,
+                 timeout_s: float = STATE_BACKEND_TIMEOUT_S) -> None:
+        if redis_asyncio is None:
+            raise RuntimeError("STATE_BACKEND_URL=redis:// requer o pacote redis")
+        self.prefix = prefix
+        # RESP2: suportado por qualquer servidor compatível com Redis
+        self._client = redis_asyncio.from_url(
+            url, protocol=2, socket_timeout=timeout_s, socket_connect_timeout=timeout_s
+        )
+
+    async def batch(
+        self,
+        incr: Optional[dict[str, int]] = None,
+        get: Optional[list[str]] = None,
+        ttl_s: float = 60,
+    ) -> dict[str, Any]:
+        incr = incr or {}
+        get = get or []
+        ttl_ms = max(1, int(ttl_s * 1000))
+        pipe = self._client.pipeline(transaction=True)
+        for key, amount in incr.items():
+            pipe.incrby(self.prefix + key, amount)
+            pipe.pexpire(self.prefix + key, ttl_ms)
+        for key in get:
+            pipe.get(self.prefix + key)
+        replies = await pipe.execute()
+
+        result: dict[str, Any] = {}
+        for i, key in enumerate(incr):
+            result[key] = int(replies[2 * i])
+        for i, key in enumerate(get, start=2 * len(incr)):
+            result[key] = replies[i]
+        return result
+
+    async def set(self, key: str, value: bytes, ttl_s: float) -> None:
+        await self._client.set(self.prefix + key, value, px=max(1, int(ttl_s * 1000)))
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+class SqliteStateBackend(StateBackend):
+    """
+    Backend SQLite (WAL) para vários processos no mesmo host.
+
+    Cada batch é uma transação IMMEDIATE executada numa thread, então os
+    incrementos são atômicos entre processos sem bloquear o event loop.
+    """
+
+    name = "sqlite"
+    shared = True
+
+    def __init__(self, path: str, prefix: str = STATE_KEY_PREFIX,
+                 timeout_s: float = STATE_BACKEND_TIMEOUT_S) -> None:
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, timeout=timeout_s, isolation_level=None, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS state ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL)"
+        )
+        self._next_purge = 0.0
+
+    def _batch_sync(self, incr: dict[str, int], get: list[str], ttl_s: float) -> dict[str, Any]:
+        now = time.time()
+        result: dict[str, Any] = {}
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                for key, amount in incr.items():
+                    cur.execute(
+                        "INSERT INTO state (key, value, expires) VALUES (?, ?, ?) "
+                        "ON CONFLICT(key) DO UPDATE SET "
+                        "value = CASE WHEN expires <= ? THEN excluded.value ELSE value + excluded.value END, "
+                        "expires = excluded.expires RETURNING value",
+                        (self.prefix + key, amount, now + ttl_s, now),
+                    )
+                    result[key] = int(cur.fetchone()[0])
+                for key in get:
+                    row = cur.execute(
+                        "SELECT value FROM state WHERE key = ? AND expires > ?",
+                        (self.prefix + key, now),
+                    ).fetchone()
+                    result[key] = _as_bytes(row[0]) if row else None
+                if now >= self._next_purge:
+                    cur.execute("DELETE FROM state WHERE expires <= ?", (now,))
+                    self._next_purge = now + STATE_SQLITE_PURGE_S
+                cur.execute("COMMIT")
+            except BaseException:
+                cur.execute("ROLLBACK")
+                raise
+        return result
+
+    async def batch(
+        self,
+        incr: Optional[dict[str, int]] = None,
+        get: Optional[list[str]] = None,
+        ttl_s: float = 60,
+    ) -> dict[str, Any]:
+        return await asyncio.to_thread(self._batch_sync, incr or {}, get or [], ttl_s)
+
+    def _set_sync(self, key: str, value: bytes, ttl_s: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO state (key, value, expires) VALUES (?, ?, ?)",
+                (self.prefix + key, value, time.time() + ttl_s),
+            )
+
+    async def set(self, key: str, value: bytes, ttl_s: float) -> None:
+        await asyncio.to_thread(self._set_sync, key, value, ttl_s)
+
+    async def aclose(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def create_state_backend(url: str = STATE_BACKEND_URL) -> StateBackend:
+    """Instancia o backend a partir da URL (memory://, redis://, rediss://, sqlite:///)."""
+    scheme = url.split("://", 1)[0].lower()
+    if scheme in ("redis", "rediss", "unix"):
+        return RedisStateBackend(url)
+    if scheme == "sqlite":
+        # sqlite:///relativo.db ou sqlite:////caminho/absoluto.db
+        path = url.split("://", 1)[1]
+        return SqliteStateBackend(path[1:] if path.startswith("/") else path or "state.db")
+    if scheme in ("", "memory"):
+        return MemoryStateBackend()
+    raise ValueError(f"STATE_BACKEND_URL não suportada: {url}")
+
+
+state_backend: StateBackend = create_state_backend()
+
+
 # ===================================
-# V2 RATE LIMITING (in-memory)
+# V2 RATE LIMITING
 # ===================================
 
 RATE_LIMIT_WINDOW = 60  # seconds
 RATE_LIMIT_MAX = 20  # requests per window
-_rate_limit_store: dict[str, list[float]] = defaultdict(list)
+RATE_LIMIT_MAX_CLIENTS = int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "50000"))
+RATE_LIMIT_SWEEP_S = 10  # intervalo mínimo entre varreduras de chaves ociosas
+
+# Proxies cujos X-Forwarded-For / X-Real-IP são confiáveis (IPs ou CIDRs).
+# Padrão: loopback (nginx no host) e a faixa das redes bridge do Docker.
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(net.strip(), strict=False)
+    for net in os.getenv("TRUSTED_PROXIES", "127.0.0.1/32,::1/128,172.16.0.0/12").split(",")
+    if net.strip()
+]
+
+
+def _parse_ip(value: str) -> Optional[ipaddress.IPv4Address | ipaddress.IPv6Address]:
+    try:
+        return ipaddress.ip_address(value.strip())
+    except ValueError:
+        return None
+
+
+def _is_trusted_proxy(ip: Optional[ipaddress.IPv4Address | ipaddress.IPv6Address]) -> bool:
+    return ip is not None and any(ip in net for net in TRUSTED_PROXIES)
 
 
-def check_rate_limit(client_ip: str) -> bool:
-    """Returns True if request is allowed, False if rate-limited."""
+def client_identity(request: Request) -> str:
+    """
+    IP do visitante para o rate limit.
+
+    Os headers de proxy só valem quando a conexão vem de um proxy
+    confiável; caso contrário qualquer cliente poderia escolher o próprio
+    bucket. No X-Forwarded-For vale o endereço mais à direita que não é
+    de um proxy confiável (os da esquerda são controlados pelo cliente).
+    """
+    # Sem endereço do cliente: conexão por Unix socket, só o nginx local
+    peer = request.client.host if request.client else "unix"
+    if request.client and not _is_trusted_proxy(_parse_ip(peer)):
+        return peer
+
+    forwarded = request.headers.get("x-forwarded-for")
+    if forwarded:
+        for hop in reversed(forwarded.split(",")):
+            ip = _parse_ip(hop)
+            if ip is None:
+                break
+            if not _is_trusted_proxy(ip):
+                return str(ip)
+
+    real_ip = _parse_ip(request.headers.get("x-real-ip", ""))
+    return str(real_ip) if real_ip is not None else peer
+
+
+class _WindowCounts:
+    __slots__ = ("window", "current", "previous")
+
+    def __init__(self, window: int) -> None:
+        self.window = window
+        self.current = 0
+        self.previous = 0
+
+
+class SlidingWindowRateLimiter:
+    """
+    Contador de janela deslizante: O(1) por verificação e memória limitada.
+
+    Cada cliente guarda só a contagem da janela fixa atual e da anterior;
+    a estimativa pondera a anterior pela fração ainda coberta pela janela
+    deslizante. As chaves ficam em ordem de último acesso, então as
+    ociosas (sem requisições nas duas últimas janelas) estão sempre no
+    início e saem numa varredura periódica amortizada. Acima de
+    `max_clients` o cliente menos recente é descartado.
+    """
+
+    def __init__(
+        self,
+        limit: int = RATE_LIMIT_MAX,
+        window_s: float = RATE_LIMIT_WINDOW,
+        max_clients: int = RATE_LIMIT_MAX_CLIENTS,
+        sweep_interval_s: float = RATE_LIMIT_SWEEP_S,
+    ) -> None:
+        self.limit = limit
+        self.window_s = window_s
+        self.max_clients = max_clients
+        self.sweep_interval_s = sweep_interval_s
+        self._clients: OrderedDict[str, _WindowCounts] = OrderedDict()
+        self._next_sweep = 0.0
+        self.allowed = 0
+        self.rejected = 0
+        self.evicted_idle = 0
+        self.evicted_capacity = 0
+
+    def allow(self, key: str, now: Optional[float] = None) -> bool:
+        now = time.monotonic() if now is None else now
+        window = int(now // self.window_s)
+        if now >= self._next_sweep:
+            self._sweep(window)
+            self._next_sweep = now + self.sweep_interval_s
+
+        counts = self._clients.get(key)
+        if counts is None:
+            counts = self._clients[key] = _WindowCounts(window)
+            if len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+                self.evicted_capacity += 1
+        else:
+            self._clients.move_to_end(key)
+            if counts.window != window:
+                counts.previous = counts.current if counts.window == window - 1 else 0
+                counts.current = 0
+                counts.window = window
+
+        elapsed = (now % self.window_s) / self.window_s
+        if counts.previous * (1 - elapsed) + counts.current >= self.limit:
+            self.rejected += 1
+            return False
+        counts.current += 1
+        self.allowed += 1
+        return True
+
+    def allow_counted(self, current: int, previous: int, elapsed: float) -> bool:
+        """
+        Decisão a partir de contadores já incrementados num backend
+        compartilhado (`current` inclui esta requisição).
+        """
+        if previous * (1 - elapsed) + current - 1 >= self.limit:
+            self.rejected += 1
+            return False
+        self.allowed += 1
+        return True
+
+    def _sweep(self, window: int) -> None:
+        clients = self._clients
+        while clients:
+            key, counts = next(iter(clients.items()))
+            if counts.window > window - 2:
+                break
+            del clients[key]
+            self.evicted_idle += 1
+
+    def stats(self) -> dict:
+        return {
+            "tracked_clients": len(self._clients),
+            "max_clients": self.max_clients,
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+            "evicted_idle": self.evicted_idle,
+            "evicted_capacity": self.evicted_capacity,
+        }
+
+
+rate_limiter = SlidingWindowRateLimiter()
+
+
+async def check_rate_limit(client_ip: str, prefetch: Optional[str] = None) -> bool:
+    """
+    Returns True if request is allowed, False if rate-limited.
+
+    Com backend compartilhado, o incremento do contador, a leitura da
+    janela anterior e o prefetch da chave `prefetch` do cache de
+    respostas vão no mesmo round-trip. Se o backend falhar, vale o
+    limite local deste processo.
+    """
+    if not state_backend.shared:
+        return rate_limiter.allow(client_ip)
+
     now = time.time()
-    window_start = now - RATE_LIMIT_WINDOW
-    # Clean old entries
-    _rate_limit_store[client_ip] = [
-        t for t in _rate_limit_store[client_ip] if t > window_start
-    ]
-    if len(_rate_limit_store[client_ip]) >= RATE_LIMIT_MAX:
-        return False
-    _rate_limit_store[client_ip].append(now)
-    return True
+    window = int(now // RATE_LIMIT_WINDOW)
+    current_key = f"rl:{client_ip}:{window}"
+    previous_key = f"rl:{client_ip}:{window - 1}"
+    try:
+        result = await state_backend.batch(
+            incr={current_key: 1},
+            get=[previous_key] + ([prefetch] if prefetch else []),
+            ttl_s=2 * RATE_LIMIT_WINDOW,
+        )
+    except Exception as e:
+        secure_log("warn", "Shared state unavailable, using local rate limit", "state",
+                   backend=state_backend.name, error=str(e))
+        return rate_limiter.allow(client_ip)
+
+    if prefetch:
+        response_cache.absorb(prefetch, result[prefetch])
+    elapsed = (now % RATE_LIMIT_WINDOW) / RATE_LIMIT_WINDOW
+    return rate_limiter.allow_counted(
+        result[current_key], int(result[previous_key] or 0), elapsed
+    )
 
 
 # ===================================
@@ -530,19 +2403,13 @@ ELABORATE_KEYWORDS = [
 
 def is_elaborate_question(message: str) -> bool:
     """Detecta se a pergunta requer pesquisa mais aprofundada."""
-    lower = message.lower()
-    if len(lower.split()) >= 10:
-        return True
-    return any(kw in lower for kw in ELABORATE_KEYWORDS)
+    return classify_message(message).elaborate
 
 
 def check_faq_v2(message: str) -> Optional[str]:
     """Tenta encontrar uma resposta FAQ."""
-    lower = message.lower().strip()
-    for key, answer in FAQ_V2.items():
-        if key in lower or lower in key:
-            return answer
-    return None
+    match = faq_index.match(message)
+    return match[0] if match else None
 
 
 def get_section_data_v2(section: Optional[str]) -> dict:
@@ -552,45 +2419,53 @@ def get_section_data_v2(section: Optional[str]) -> dict:
 
 def truncate_response(text: str, max_lines: int = 5) -> str:
     """Trunca resposta para máximo de linhas."""
-    lines = [l for l in text.split('\n') if l.strip()]
-    if len(lines) <= max_lines:
-        return text
-    return '\n'.join(lines[:max_lines])
+    # Percorre só até a linha max_lines + 1, sem quebrar o texto todo
+    lines: list[str] = []
+    start = 0
+    while True:
+        end = text.find('\n', start)
+        line = text[start:] if end < 0 else text[start:end]
+        if line.strip():
+            if len(lines) == max_lines:
+                return '\n'.join(lines)
+            lines.append(line)
+        if end < 0:
+            return text
+        start = end + 1
+
+
+# Gatilhos de follow-up, em ordem de prioridade: (tema, palavras, sugestões)
+FOLLOW_UP_TRIGGERS: list[tuple[str, list[str], list[str]]] = [
+    # Perguntou sobre serviços → detalhes
+    ("services", ['serviço', 'solução', 'oferecem', 'fazem'], [
+        'Como funcionam as trilhas educacionais?',
+        'O que é o Assessment com IA?',
+        'Como contratar uma mentoria?',
+    ]),
+    # Perguntou sobre a fundadora → mais sobre a empresa
+    ("founder", ['ana paula', 'fundadora', 'ceo'], [
+        'Quais são os serviços da Arbache?',
+        'O que é o ecossistema Arbache?',
+        'Como entrar em contato?',
+    ]),
+    ("esg", ['esg', 'sustentabilidade', 'ods', 'onu'], [
+        'O que é o HubMulher?',
+        'Qual o papel nos ODS da ONU?',
+        'Como a Arbache atua em ESG?',
+    ]),
+]
+_FOLLOW_UP_BY_TOPIC = {topic: suggestions for topic, _, suggestions in FOLLOW_UP_TRIGGERS}
 
 
 def generate_follow_up_suggestions(message: str, section: Optional[str]) -> list[str]:
     """Gera sugestões de follow-up baseadas na mensagem e seção."""
-    section_data = get_section_data_v2(section)
-    lower = message.lower()
+    topic = classify_message(message).follow_up
+    if topic:
+        return _FOLLOW_UP_BY_TOPIC[topic][:3]
 
-    suggestions: list[str] = []
-
-    # Se perguntou sobre serviços, sugere detalhes
-    if any(w in lower for w in ['serviço', 'solução', 'oferecem', 'fazem']):
-        suggestions = [
-            'Como funcionam as trilhas educacionais?',
-            'O que é o Assessment com IA?',
-            'Como contratar uma mentoria?',
-        ]
-    # Se perguntou sobre a fundadora, sugere mais sobre a empresa
-    elif any(w in lower for w in ['ana paula', 'fundadora', 'ceo']):
-        suggestions = [
-            'Quais são os serviços da Arbache?',
-            'O que é o ecossistema Arbache?',
-            'Como entrar em contato?',
-        ]
-    # Se perguntou sobre ESG
-    elif any(w in lower for w in ['esg', 'sustentabilidade', 'ods', 'onu']):
-        suggestions = [
-            'O que é o HubMulher?',
-            'Qual o papel nos ODS da ONU?',
-            'Como a Arbache atua em ESG?',
-        ]
-    else:
-        # Fallback: sugestões da seção atual
-        suggestions = section_data.get('suggestions', SECTION_CONTENT_V2['hero']['suggestions'])
-
-    return suggestions[:3]
+    # Fallback: sugestões da seção atual
+    section_data = get_section_data_v2(section)
+    return section_data.get('suggestions', SECTION_CONTENT_V2['hero']['suggestions'])[:3]
 
 
 # V2 system prompt — conversacional, humanizado, curto
@@ -618,11 +2493,191 @@ GREETINGS_V2 = ["olá", "oi", "bom dia", "boa tarde", "boa noite", "hello", "hi"
 
 def is_greeting(message: str) -> bool:
     """Detecta se a mensagem é uma saudação simples."""
-    lower = message.lower().strip().rstrip("!?.,:;")
-    if lower in GREETINGS_V2:
-        return True
-    words = lower.split()
-    return len(words) <= 3 and any(g in lower for g in GREETINGS_V2)
+    return classify_message(message).greeting
+
+
+# Estimativa local de tokens (sem tokenizer oficial): cada palavra custa
+# ceil(len / caracteres por token) e cada pontuação um token, mais o
+# overhead por mensagem. O tokenizer da Anthropic rende menos caracteres
+# por token em português que o da OpenAI (o200k).
+_TOKEN_PIECE_RE = re.compile(r"\w+|[^\w\s]")
+TOKEN_CHARS_PER_TOKEN = {"openai": 4.0, "anthropic": 3.4}
+TOKEN_MESSAGE_OVERHEAD = {"openai": 4, "anthropic": 3}
+
+
+def estimate_tokens(text: str, provider: str = "openai") -> int:
+    chars = TOKEN_CHARS_PER_TOKEN.get(provider, 4.0)
+    return sum(math.ceil(len(piece) / chars) for piece in _TOKEN_PIECE_RE.findall(text))
+
+
+def _truncate_to_tokens(text: str, tokens: int, provider: str) -> str:
+    """Mantém o fim do texto (onde costuma estar a pergunta de volta) dentro de `tokens`."""
+    chars = int(tokens * TOKEN_CHARS_PER_TOKEN.get(provider, 4.0))
+    tail = text[-chars:]
+    cut = tail.find(" ")
+    if 0 <= cut < len(tail) // 4:
+        tail = tail[cut + 1:]
+    while tail and estimate_tokens("…" + tail, provider) > tokens:
+        tail = tail[len(tail) // 10 + 1:]
+    return "…" + tail
+
+
+def compact_history(
+    conversation_history: Optional[list[ConversationMessage]],
+    provider: str,
+    budget: Optional[int] = None,
+    policy: Optional[str] = None,
+) -> tuple[list[dict], int]:
+    """
+    Histórico que cabe no orçamento de tokens, do turno mais novo para o
+    mais antigo. Retorna (mensagens, tokens estimados economizados).
+
+    Um turno é a pergunta do usuário com a resposta que veio dela; turnos
+    entram inteiros ou, com "truncate", o primeiro que não cabe entra com a
+    pergunta inteira e o fim da resposta. Assim a primeira mensagem é
+    sempre do usuário (exigência da Anthropic) e nenhuma resposta fica
+    sem a pergunta que a originou.
+    """
+    if not conversation_history:
+        return [], 0
+    budget = HISTORY_TOKEN_BUDGET if budget is None else budget
+    policy = policy or HISTORY_POLICY
+    overhead = TOKEN_MESSAGE_OVERHEAD.get(provider, 4)
+
+    turns: list[list[tuple[str, str, int]]] = []
+    for msg in conversation_history:
+        if msg.role == "user" or not turns:
+            turns.append([])
+        turns[-1].append((msg.role, msg.content, estimate_tokens(msg.content, provider) + overhead))
+    total = sum(cost for turn in turns for _, _, cost in turn)
+
+    kept: list[dict] = []
+    remaining = budget if budget > 0 else total
+    for turn in reversed(turns):
+        cost = sum(c for _, _, c in turn)
+        if cost <= remaining:
+            kept[:0] = [{"role": role, "content": content} for role, content, _ in turn]
+            remaining -= cost
+            continue
+        # Trunca só a última mensagem do turno (a resposta, ou a pergunta sozinha)
+        head = turn[:-1]
+        room = remaining - sum(c for _, _, c in head) - overhead
+        if policy == "truncate" and room >= HISTORY_TRUNCATE_MIN_TOKENS:
+            role, content, _ = turn[-1]
+            kept[:0] = [{"role": r, "content": c} for r, c, _ in head] + [
+                {"role": role, "content": _truncate_to_tokens(content, room, provider)}]
+        break
+    while kept and kept[0]["role"] != "user":
+        kept.pop(0)
+    used = sum(estimate_tokens(m["content"], provider) + overhead for m in kept)
+    return kept, total - used
+
+
+def _history_messages(
+    question: str,
+    conversation_history: Optional[list[ConversationMessage]],
+    provider: str,
+) -> list[dict]:
+    """Histórico recente (dentro do orçamento de tokens) + pergunta atual."""
+    messages, saved = compact_history(conversation_history, provider)
+    if conversation_history:
+        history_tokens_saved.labels(provider).observe(saved)
+        span = _current_span.get()
+        if span is not None:
+            span.set(history_tokens_saved=saved)
+
+    messages.append({"role": "user", "content": question})
+    return messages
+
+
+# Prompt caching dos provedores: o prefixo (prompt de sistema estático, com
+# ARBACHE_CONTEXT) é idêntico byte a byte em toda requisição; o que varia
+# (contexto da seção, histórico, pergunta) vem sempre depois dele. Os
+# provedores só cacheiam prefixos a partir de um tamanho mínimo, então as
+# marcas (prompt_cache_key na OpenAI, cache_control na Anthropic) só vão
+# quando o prompt estático passa dele; abaixo disso seriam só formato a mais
+PROMPT_CACHE_KEY = "arbache-curator"
+PROMPT_CACHE_MIN_TOKENS = {
+    "openai": int(os.getenv("OPENAI_PROMPT_CACHE_MIN_TOKENS", "1024")),
+    "anthropic": int(os.getenv("ANTHROPIC_PROMPT_CACHE_MIN_TOKENS", "4096")),  # Haiku 4.5
+}
+
+
+@lru_cache(maxsize=8)
+def prompt_cacheable(static_prompt: str, provider: str) -> bool:
+    """O prefixo estático tem o tamanho mínimo para o cache do provedor."""
+    return estimate_tokens(static_prompt, provider) >= PROMPT_CACHE_MIN_TOKENS[provider]
+
+
+def openai_cache_fields(static_prompt: str) -> dict:
+    """Campos de cache do payload OpenAI (vazio se o prefixo não é cacheável)."""
+    return {"prompt_cache_key": PROMPT_CACHE_KEY} if prompt_cacheable(static_prompt, "openai") else {}
+
+
+def section_context_message(section_context: str) -> str:
+    return f"Contexto da seção atual: {section_context}"
+
+
+def anthropic_system(static_prompt: str, *suffixes: str) -> list[dict]:
+    """System da Anthropic: bloco estático (cacheável, se couber) seguido dos blocos variáveis."""
+    static = {"type": "text", "text": static_prompt}
+    if prompt_cacheable(static_prompt, "anthropic"):
+        static["cache_control"] = {"type": "ephemeral"}
+    return [static, *({"type": "text", "text": suffix} for suffix in suffixes if suffix)]
+
+
+def build_openai_v2_payload(
+    question: str,
+    section_context: str,
+    conversation_history: Optional[list[ConversationMessage]],
+) -> dict:
+    """Payload OpenAI do v2 (usado pelo fluxo normal e pelo streaming)."""
+    return {
+        "model": "gpt-4o-mini",
+        "messages": [
+            {"role": "system", "content": CURATOR_SYSTEM_PROMPT_V2},
+            {"role": "system", "content": section_context_message(section_context)},
+            *_history_messages(question, conversation_history, "openai"),
+        ],
+        "max_tokens": 512,
+        "temperature": 0.7,
+        **openai_cache_fields(CURATOR_SYSTEM_PROMPT_V2),
+    }
+
+
+def build_curation_v2_payload(question: str, perplexity_raw: str) -> dict:
+    """Payload OpenAI para curadoria da pesquisa Perplexity no v2."""
+    return {
+        "model": "gpt-4o-mini",
+        "messages": [
+            {"role": "system", "content": CURATOR_SYSTEM_PROMPT_V2},
+            {
+                "role": "user",
+                "content": (
+                    f'Pergunta: "{question}"\n\n'
+                    f'Informações pesquisadas (REMOVA todas as referências):\n{perplexity_raw}\n\n'
+                    'Reescreva em no máximo 5 linhas, tom de vendas, sem mencionar fontes.'
+                ),
+            },
+        ],
+        "max_tokens": 512,
+        "temperature": 0.5,
+        **openai_cache_fields(CURATOR_SYSTEM_PROMPT_V2),
+    }
+
+
+def build_anthropic_v2_payload(
+    question: str,
+    section_context: str,
+    conversation_history: Optional[list[ConversationMessage]],
+) -> dict:
+    """Payload Anthropic do v2 (usado pelo fluxo normal e pelo streaming)."""
+    return {
+        "model": "claude-haiku-4-5-20251001",
+        "max_tokens": 256,
+        "system": anthropic_system(CURATOR_SYSTEM_PROMPT_V2, section_context_message(section_context)),
+        "messages": _history_messages(question, conversation_history, "anthropic"),
+    }
 
 
 async def query_openai_v2(
@@ -635,31 +2690,18 @@ async def query_openai_v2(
     if not Config.has_openai():
         secure_log("warn", "OpenAI not configured", request_id)
         return None
+    if provider_open("openai", request_id):
+        return None
 
     secure_log("info", "V2: Querying OpenAI (primary)", request_id)
 
-    messages: list[dict] = [
-        {"role": "system", "content": CURATOR_SYSTEM_PROMPT_V2 + f"\n\nContexto da seção atual: {section_context}"},
-    ]
-
-    # Adicionar histórico de conversa
-    if conversation_history:
-        for msg in conversation_history[-6:]:
-            messages.append({"role": msg.role, "content": msg.content})
-
-    messages.append({"role": "user", "content": question})
-
-    data = await secure_fetch(
-        url="https://api.openai.com/v1/chat/completions",
-        request_id=request_id,
-        headers=Config.get_openai_headers(),
-        json_data={
-            "model": "gpt-4o-mini",
-            "messages": messages,
-            "max_tokens": 512,
-            "temperature": 0.7,
-        },
-    )
+    with trace_span("openai"):
+        data = await secure_fetch(
+            url="https://api.openai.com/v1/chat/completions",
+            request_id=request_id,
+            headers=Config.get_openai_headers(),
+            json_data=build_openai_v2_payload(question, section_context, conversation_history),
+        )
 
     if data:
         result = data.get("choices", [{}])[0].get("message", {}).get("content")
@@ -671,37 +2713,24 @@ async def query_openai_v2(
 
 async def query_perplexity_v2(question: str, section_context: str, request_id: str) -> Optional[str]:
     """Perplexity para perguntas elaboradas no v2, com curadoria via OpenAI."""
-    perplexity_raw = await query_perplexity(question, request_id)
+    with trace_span("perplexity"):
+        perplexity_raw = await query_perplexity(question, request_id)
     if not perplexity_raw:
         return None
 
     # Curadoria via OpenAI
-    if not Config.has_openai():
+    if not Config.has_openai() or provider_open("openai", request_id):
         return perplexity_raw
 
     secure_log("info", "V2: Curating Perplexity response via OpenAI", request_id)
 
-    data = await secure_fetch(
-        url="https://api.openai.com/v1/chat/completions",
-        request_id=request_id,
-        headers=Config.get_openai_headers(),
-        json_data={
-            "model": "gpt-4o-mini",
-            "messages": [
-                {"role": "system", "content": CURATOR_SYSTEM_PROMPT_V2},
-                {
-                    "role": "user",
-                    "content": (
-                        f'Pergunta: "{question}"\n\n'
-                        f'Informações pesquisadas (REMOVA todas as referências):\n{perplexity_raw}\n\n'
-                        'Reescreva em no máximo 5 linhas, tom de vendas, sem mencionar fontes.'
-                    ),
-                },
-            ],
-            "max_tokens": 512,
-            "temperature": 0.5,
-        },
-    )
+    with trace_span("curation"):
+        data = await secure_fetch(
+            url="https://api.openai.com/v1/chat/completions",
+            request_id=request_id,
+            headers=Config.get_openai_headers(),
+            json_data=build_curation_v2_payload(question, perplexity_raw),
+        )
 
     if data:
         result = data.get("choices", [{}])[0].get("message", {}).get("content")
@@ -721,36 +2750,310 @@ async def query_anthropic_v2(
     if not Config.has_anthropic():
         secure_log("warn", "Anthropic not configured", request_id)
         return None
+    if provider_open("anthropic", request_id):
+        return None
 
     secure_log("info", "V2: Querying Anthropic (fallback)", request_id)
 
-    messages: list[dict] = []
+    with trace_span("anthropic"):
+        data = await secure_fetch(
+            url="https://api.anthropic.com/v1/messages",
+            request_id=request_id,
+            headers=Config.get_anthropic_headers(),
+            json_data=build_anthropic_v2_payload(question, section_context, conversation_history),
+        )
 
-    # Adicionar histórico de conversa
-    if conversation_history:
-        for msg in conversation_history[-6:]:
-            messages.append({"role": msg.role, "content": msg.content})
+    if data:
+        result = data.get("content", [{}])[0].get("text")
+        secure_log("info", "V2: Anthropic response received", request_id, has_content=bool(result))
+        return result
 
-    messages.append({"role": "user", "content": question})
+    return None
 
-    data = await secure_fetch(
+
+async def stream_openai_v2(payload: dict, request_id: str) -> AsyncIterator[str]:
+    """Deltas de texto da OpenAI (chat completions com stream=True)."""
+    if not Config.has_openai():
+        secure_log("warn", "OpenAI not configured", request_id)
+        return
+    if provider_open("openai", request_id):
+        return
+
+    async with aclosing(secure_stream(
+        url="https://api.openai.com/v1/chat/completions",
+        request_id=request_id,
+        headers=Config.get_openai_headers(),
+        json_data={**payload, "stream": True, "stream_options": {"include_usage": True}},
+    )) as events:
+        async for event in events:
+            if event.get("usage"):  # último chunk, sem choices
+                record_usage("openai", event["usage"])
+            choices = event.get("choices") or [{}]
+            delta = choices[0].get("delta", {}).get("content")
+            if delta:
+                yield delta
+
+
+async def stream_anthropic_v2(payload: dict, request_id: str) -> AsyncIterator[str]:
+    """Deltas de texto da Anthropic (messages com stream=True)."""
+    if not Config.has_anthropic():
+        secure_log("warn", "Anthropic not configured", request_id)
+        return
+    if provider_open("anthropic", request_id):
+        return
+
+    async with aclosing(secure_stream(
         url="https://api.anthropic.com/v1/messages",
         request_id=request_id,
         headers=Config.get_anthropic_headers(),
-        json_data={
-            "model": "claude-haiku-4-5-20251001",
-            "max_tokens": 256,
-            "system": CURATOR_SYSTEM_PROMPT_V2 + f"\n\nContexto da seção atual: {section_context}",
-            "messages": messages,
-        },
+        json_data={**payload, "stream": True},
+    )) as events:
+        async for event in events:
+            if event.get("type") == "message_start":
+                record_usage("anthropic", event.get("message", {}).get("usage"))
+            elif event.get("type") == "message_delta":
+                # Tokens de entrada já vieram no message_start
+                record_usage("anthropic", {"output_tokens": event.get("usage", {}).get("output_tokens", 0)})
+            if event.get("type") != "content_block_delta":
+                continue
+            delta = event.get("delta", {}).get("text")
+            if delta:
+                yield delta
+
+
+# ===================================
+# V2 HEDGING (OpenAI → Anthropic)
+# ===================================
+
+class HedgePolicy:
+    """
+    Decide quando disparar a Anthropic em paralelo à OpenAI.
+
+    O atraso do hedge é fixo (HEDGE_DELAY_MS) ou o p95 das últimas
+    latências bem-sucedidas da OpenAI. O gasto extra é limitado a
+    HEDGE_MAX_RATIO das chamadas primárias (mais um pequeno burst).
+    """
+
+    def __init__(self, window: int = 200) -> None:
+        self._latencies: deque[float] = deque(maxlen=window)
+        self.primary_calls = 0
+        self.fired = 0
+        self.won = 0
+        self.skipped = 0
+
+    def record_primary(self, seconds: float) -> None:
+        self._latencies.append(seconds)
+
+    def delay_seconds(self) -> float:
+        if HEDGE_DELAY_MS > 0:
+            return HEDGE_DELAY_MS / 1000
+        if len(self._latencies) < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_DELAY_MS / 1000
+        ordered = sorted(self._latencies)
+        return ordered[int(len(ordered) * 0.95) - 1]
+
+    def allow(self) -> bool:
+        """Respeita o teto de chamadas extras; conta o hedge se permitido."""
+        if self.fired >= self.primary_calls * HEDGE_MAX_RATIO + HEDGE_BURST:
+            self.skipped += 1
+            return False
+        self.fired += 1
+        return True
+
+    def snapshot(self) -> dict[str, float]:
+        return {
+            "enabled": float(HEDGE_ENABLED),
+            "delay_ms": round(self.delay_seconds() * 1000, 1),
+            "primary_calls": self.primary_calls,
+            "hedges_fired": self.fired,
+            "hedges_won": self.won,
+            "hedges_skipped": self.skipped,
+        }
+
+
+hedge_policy = HedgePolicy()
+
+
+async def query_v2_with_fallback(
+    question: str,
+    section_context: str,
+    conversation_history: Optional[list[ConversationMessage]],
+    request_id: str,
+) -> Optional[str]:
+    """
+    OpenAI primária com Anthropic como fallback ou hedge.
+
+    Sem hedge, a Anthropic só roda depois que a OpenAI desiste (com todos
+    os retries). Com hedge, se a OpenAI não respondeu dentro do atraso,
+    a Anthropic sobe em paralelo; vence a primeira resposta não vazia e a
+    outra chamada é cancelada.
+    """
+    if not (HEDGE_ENABLED and Config.has_openai() and Config.has_anthropic()):
+        response = await query_openai_v2(question, section_context, conversation_history, request_id)
+        if response:
+            mark_branch("openai")
+            return response
+        response = await query_anthropic_v2(question, section_context, conversation_history, request_id)
+        if response:
+            mark_branch("anthropic")
+        return response
+
+    hedge_policy.primary_calls += 1
+    started = time.monotonic()
+    primary = asyncio.create_task(
+        query_openai_v2(question, section_context, conversation_history, request_id)
     )
+    pending: set[asyncio.Task] = {primary}
+    hedge: Optional[asyncio.Task] = None
 
-    if data:
-        result = data.get("content", [{}])[0].get("text")
-        secure_log("info", "V2: Anthropic response received", request_id, has_content=bool(result))
-        return result
+    try:
+        done, _ = await asyncio.wait(pending, timeout=hedge_policy.delay_seconds())
+        # Hedge para um provedor com circuito aberto só gastaria o orçamento
+        if primary in done or not provider_available("anthropic") or not hedge_policy.allow():
+            response = await primary
+            if response:
+                hedge_policy.record_primary(time.monotonic() - started)
+                mark_branch("openai")
+                return response
+            response = await query_anthropic_v2(question, section_context, conversation_history, request_id)
+            if response:
+                mark_branch("anthropic")
+            return response
+
+        secure_log("info", "V2 hedge fired", request_id,
+                   delay_ms=round(hedge_policy.delay_seconds() * 1000))
+        hedge = asyncio.create_task(
+            query_anthropic_v2(question, section_context, conversation_history, request_id)
+        )
+        pending.add(hedge)
+
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    continue
+                response = task.result()
+                if not response:
+                    continue
+                if task is hedge:
+                    hedge_policy.won += 1
+                    secure_log("info", "V2 hedge won", request_id)
+                    mark_branch("anthropic")
+                else:
+                    hedge_policy.record_primary(time.monotonic() - started)
+                    mark_branch("openai")
+                return response
+        return None
+    finally:
+        for task in (primary, hedge):
+            if task is not None and not task.done():
+                task.cancel()
 
-    return None
+
+# ===================================
+# CLASSIFICADOR DE INTENÇÃO
+# ===================================
+
+ELABORATE_MIN_WORDS = 10
+GREETING_MAX_WORDS = 3
+
+# Plural (s/es) só é aceito em termos com pelo menos 4 letras: "hi" não vira "his"
+_INTENT_PLURAL_MIN_LENGTH = 4
+
+
+# Flexões verbais aceitas nos termos de pergunta elaborada: a busca por
+# substring antiga pegava "como funcionam" dentro de "como funciona..."
+_INTENT_VERB_ENDINGS = {
+    "a": ("am", "aram", "ava", "avam", "aria", "ariam"),  # funciona → funcionam, funcionaram...
+    "e": ("em",),  # explique → expliquem
+}
+
+
+def _intent_variants(phrase: str, conjugate: bool = False) -> set[str]:
+    """
+    Forma normalizada do termo e os plurais aceitos (-s, -es, -ão → -ões);
+    com `conjugate`, também as flexões verbais da última palavra.
+    """
+    base = normalize_text(phrase)
+    variants = {base}
+    if len(base) >= _INTENT_PLURAL_MIN_LENGTH:
+        variants.update((base + "s", base + "es"))
+    if base.endswith("ao"):
+        variants.add(base[:-2] + "oes")
+    last = base.rsplit(" ", 1)[-1]
+    if conjugate and len(last) >= _INTENT_PLURAL_MIN_LENGTH:
+        stem = base[:-1]
+        variants.update(stem + ending for ending in _INTENT_VERB_ENDINGS.get(base[-1], ()))
+    return variants
+
+
+class MessageIntent:
+    """Atributos de roteamento de uma mensagem, extraídos numa única varredura."""
+
+    __slots__ = ("words", "greeting", "in_scope", "elaborate", "follow_up")
+
+    def __init__(self, words: int, labels: set[str]) -> None:
+        self.words = words
+        self.greeting = "greeting" in labels and words <= GREETING_MAX_WORDS
+        self.in_scope = "topic" in labels or "scope" in labels
+        self.elaborate = words >= ELABORATE_MIN_WORDS or "elaborate" in labels
+        self.follow_up: Optional[str] = next(
+            (topic for topic, _, _ in FOLLOW_UP_TRIGGERS if topic in labels), None
+        )
+
+
+class IntentClassifier:
+    """
+    Casamento multi-termo por palavras inteiras sobre o texto normalizado.
+
+    Cada termo (e seus plurais) vira uma chave de dicionário; o índice
+    pela primeira palavra diz quais tamanhos de n-grama testar em cada
+    posição. Uma varredura das palavras da mensagem coleta os rótulos de
+    todos os termos presentes, inclusive sobrepostos ("ana paula arbache"
+    e "arbache"), e "hi" nunca casa dentro de "hierarquia".
+    """
+
+    def __init__(self, groups: dict[str, list[str]], conjugate: frozenset[str] = frozenset()) -> None:
+        labels: dict[str, set[str]] = defaultdict(set)
+        for label, phrases in groups.items():
+            for phrase in phrases:
+                for term in _intent_variants(phrase, conjugate=label in conjugate):
+                    labels[term].add(label)
+
+        self._labels = {term: frozenset(found) for term, found in labels.items()}
+        spans: dict[str, set[int]] = defaultdict(set)
+        for term in self._labels:
+            words = term.split()
+            spans[words[0]].add(len(words))
+        self._spans = {first: tuple(sorted(sizes)) for first, sizes in spans.items()}
+
+    def classify(self, message: str) -> MessageIntent:
+        words = normalize_text(message).split()
+        labels: set[str] = set()
+        for i, word in enumerate(words):
+            sizes = self._spans.get(word)
+            if sizes is None:
+                continue
+            for size in sizes:
+                found = self._labels.get(word if size == 1 else " ".join(words[i:i + size]))
+                if found:
+                    labels |= found
+        return MessageIntent(len(message.split()), labels)
+
+
+intent_classifier = IntentClassifier({
+    "topic": ALLOWED_TOPICS,
+    "scope": BOUNDARY_GREETINGS + BOUNDARY_SERVICE_WORDS,
+    "greeting": GREETINGS_V2,
+    "elaborate": ELABORATE_KEYWORDS,
+    **{topic: words for topic, words, _ in FOLLOW_UP_TRIGGERS},
+}, conjugate=frozenset({"elaborate"}))
+
+
+@lru_cache(maxsize=1024)
+def classify_message(message: str) -> MessageIntent:
+    """Classifica a mensagem uma vez; saudação, boundary, elaborada e follow-up reusam o resultado."""
+    return intent_classifier.classify(message)
 
 
 # ===================================
@@ -759,55 +3062,475 @@ async def query_anthropic_v2(
 
 def check_boundary(question: str) -> bool:
     """Verifica se a pergunta está dentro do escopo permitido."""
-    lower_question = question.lower()
+    return classify_message(question).in_scope
 
-    if any(topic in lower_question for topic in ALLOWED_TOPICS):
-        return True
 
-    greetings = ["olá", "oi", "bom dia", "boa tarde", "boa noite", "hello", "hi", "ajuda", "help"]
-    if any(g in lower_question for g in greetings):
-        return True
+_CITATION_RE = re.compile(r'\[\d+\]')
+_URL_RE = re.compile(r'https?://[^\s]+')
+_SOURCE_RE = re.compile(
+    r'(?:Source|Fonte|Reference|Referência|According to|De acordo com|Segundo)[:\s].*',
+    flags=re.IGNORECASE
+)
+_DATED_PAREN_RE = re.compile(r'\(.*?(?:2024|2025|2026).*?\)')
+_HEADER_RE = re.compile(r'^#{1,6}\s+', flags=re.MULTILINE)
+_BOLD_RE = re.compile(r'\*{1,2}([^*]+)\*{1,2}')
+_BULLET_RE = re.compile(r'^[\s]*[-•]\s+', flags=re.MULTILINE)
+_BLANK_LINES_RE = re.compile(r'\n{3,}')
+
+# _SOURCE_RE sem IGNORECASE, aplicada sobre text.lower(): o C do re só
+# acelera a busca de prefixo em padrões sensíveis a maiúsculas
+_SOURCE_LOWER_RE = re.compile(
+    r'(?:source|fonte|reference|referência|according to|de acordo com|segundo)[:\s]'
+)
+# Únicos caracteres em que str.lower() diverge do IGNORECASE para essas
+# palavras: o re casa "İ" e "ı" com "i" e "ſ" com "s" (e "İ".lower() ainda
+# muda o tamanho do texto). Trocados antes do lower(), as posições batem
+_CASE_FOLD_EXCEPTIONS = str.maketrans({"İ": "i", "ı": "i", "ſ": "s"})
+
+# A regex original de bullets só relê o texto dentro de sequências de
+# linhas em branco; sem nenhuma sequência de 8 ou mais, cada posição é
+# lida no máximo 8 vezes e o re (em C) é mais rápido que a varredura em
+# Python. A de parênteses não tem limite seguro (poucos "(" numa linha
+# de 1 MB já custam segundos), então usa sempre a varredura
+_BLANK_RUN_RE = re.compile(r'(?:\n[^\S\n]*){8}')
+_YEAR_RE = re.compile(r'202[456]')
+_SPACES_RE = re.compile(r'\s*')
+
+
+def _fold_case(text: str) -> str:
+    """text.lower() com as mesmas equivalências do IGNORECASE e o mesmo tamanho."""
+    # translate com dict é caro por caractere; quase nunca há o que trocar
+    if "İ" in text or "ı" in text or "ſ" in text:
+        text = text.translate(_CASE_FOLD_EXCEPTIONS)
+    return text.lower()
+
+
+def _strip_sources(text: str) -> str:
+    """Equivalente a _SOURCE_RE.sub('', text), buscando no texto em minúsculas."""
+    lower = _fold_case(text)
+    parts: list[str] = []
+    last = 0
+    while True:
+        match = _SOURCE_LOWER_RE.search(lower, last)
+        if not match:
+            break
+        parts.append(text[last:match.start()])
+        # ".*" vai até o fim da linha
+        last = text.find('\n', match.end())
+        if last < 0:
+            last = len(text)
+    parts.append(text[last:])
+    return ''.join(parts)
+
+
+def _strip_dated_parens(text: str) -> str:
+    r"""
+    Equivalente linear de re.sub(r'\(.*?(?:2024|2025|2026).*?\)', '', text).
+
+    A regex volta a varrer a linha inteira a partir de cada "(" sem
+    fechamento, o que é quadrático numa linha longa cheia de parênteses.
+    Aqui cada trecho é lido uma vez: se depois de um "(" não há ano, ou
+    não há ")" depois do ano, nenhum "(" seguinte da mesma linha casa.
+    """
+    if '(' not in text:
+        return text
+    parts: list[str] = []
+    last = pos = 0
+    line_end = -1
+    while True:
+        start = text.find('(', pos)
+        if start < 0:
+            break
+        if start > line_end:
+            line_end = text.find('\n', start)
+            if line_end < 0:
+                line_end = len(text)
+        year = _YEAR_RE.search(text, start + 1, line_end)
+        close = text.find(')', year.end(), line_end) if year else -1
+        if close < 0:
+            pos = line_end
+            continue
+        parts.append(text[last:start])
+        last = pos = close + 1
+    parts.append(text[last:])
+    return ''.join(parts)
+
+
+def _strip_bullets(text: str) -> str:
+    r"""
+    Equivalente linear de re.sub(r'^[\s]*[-•]\s+', '', text, flags=re.MULTILINE).
+
+    Como \s inclui quebras de linha, a regex relê toda uma sequência de
+    linhas em branco a partir de cada início de linha; aqui todos os
+    inícios de linha dentro da mesma sequência compartilham o resultado.
+    """
+    if '-' not in text and '•' not in text:
+        return text
+    if not _BLANK_RUN_RE.search(text):
+        return _BULLET_RE.sub('', text)
+    parts: list[str] = []
+    last = line_start = 0
+    length = len(text)
+    while True:
+        marker = _SPACES_RE.match(text, line_start).end()
+        if marker + 1 < length and text[marker] in '-•' and text[marker + 1].isspace():
+            end = _SPACES_RE.match(text, marker + 1).end()
+            parts.append(text[last:line_start])
+            last = end
+            if text[end - 1] == '\n':
+                line_start = end
+                continue
+            pos = end
+        else:
+            pos = marker
+        newline = text.find('\n', pos)
+        if newline < 0:
+            break
+        line_start = newline + 1
+    parts.append(text[last:])
+    return ''.join(parts)
 
-    service_words = ["serviço", "oferecem", "fazem", "podem", "ajudar", "contratar", "preço", "valor", "custo"]
-    if any(w in lower_question for w in service_words):
-        return True
 
-    return False
+def clean_response(text: str) -> str:
+    """
+    Remove referências, citações, links e formatação markdown da resposta.
+
+    Não é uma passada única: as regras rodam em sequência, como na
+    versão original, porque a ordem faz parte do resultado (o negrito
+    some antes dos bullets, as fontes antes dos parênteses etc.). São
+    no máximo oito passadas, cada uma em tempo linear no tamanho do
+    texto (sem regex com backtracking) e pulada quando o caractere que a
+    dispara não aparece, então o total também é linear.
+    """
+    return _clean_unstripped(text).strip()
 
 
-def clean_response(text: str) -> str:
-    """Remove referências, citações, links e formatação markdown da resposta."""
-    cleaned = re.sub(r'\[\d+\]', '', text)
-    cleaned = re.sub(r'https?://[^\s]+', '', cleaned)
-    cleaned = re.sub(
-        r'(?:Source|Fonte|Reference|Referência|According to|De acordo com|Segundo)[:\s].*',
-        '',
-        cleaned,
-        flags=re.IGNORECASE
-    )
-    cleaned = re.sub(r'\(.*?(?:2024|2025|2026).*?\)', '', cleaned)
+def _clean_unstripped(text: str) -> str:
+    """As regras de clean_response, sem o strip() final."""
+    cleaned = _CITATION_RE.sub('', text) if '[' in text else text
+    cleaned = _URL_RE.sub('', cleaned) if '://' in cleaned else cleaned
+    cleaned = _strip_sources(cleaned)
+    cleaned = _strip_dated_parens(cleaned)
     # Remove markdown headers
-    cleaned = re.sub(r'^#{1,6}\s+', '', cleaned, flags=re.MULTILINE)
+    if '#' in cleaned:
+        cleaned = _HEADER_RE.sub('', cleaned)
     # Remove bold/italic markdown
-    cleaned = re.sub(r'\*{1,2}([^*]+)\*{1,2}', r'\1', cleaned)
+    if '*' in cleaned:
+        cleaned = _BOLD_RE.sub(r'\1', cleaned)
     # Remove bullet points
-    cleaned = re.sub(r'^[\s]*[-•]\s+', '', cleaned, flags=re.MULTILINE)
-    cleaned = re.sub(r'\n{3,}', '\n\n', cleaned).strip()
+    cleaned = _strip_bullets(cleaned)
+    if '\n\n\n' in cleaned:
+        cleaned = _BLANK_LINES_RE.sub('\n\n', cleaned)
     return cleaned
 
 
+def sanitize_response(text: str, max_lines: int = 5) -> str:
+    """clean_response + truncate_response: o que de fato vai para o cliente."""
+    return truncate_response(clean_response(text), max_lines=max_lines)
+
+
+# Prefixos que podem iniciar uma remoção (fonte ou URL) e por isso
+# seguram o stream até serem resolvidos
+_STREAM_SOURCE_WORDS = (
+    "source", "fonte", "reference", "referência",
+    "according to", "de acordo com", "segundo",
+)
+_STREAM_HOLD_PREFIXES = _STREAM_SOURCE_WORDS + ("http://", "https://")
+_STREAM_HOLD_TAILS = frozenset(p[:k] for p in _STREAM_HOLD_PREFIXES for k in range(1, len(p) + 1))
+_STREAM_HOLD_LONGEST = max(map(len, _STREAM_HOLD_PREFIXES))
+_STREAM_TRIGGER_RE = re.compile(
+    r'[(\[]|https?://|' + '|'.join(_STREAM_SOURCE_WORDS)
+)
+_STREAM_RETRY_MIN = 256
+# Trecho que começa no meio de uma linha ganha esse prefixo antes de
+# passar pelo clean_response, para ^ (headers e bullets) não casar ali
+_STREAM_SENTINEL = "\x00"
+
+
+def _only_markers(line: str) -> bool:
+    """A linha ainda pode virar header ou bullet (só tem marcadores e espaços)."""
+    return all(c in "#-•" or c.isspace() for c in line)
+
+
+def _cut_after_lines(text: str, max_lines: int) -> tuple[str, bool]:
+    """Corta o texto no fim da linha não vazia número max_lines; diz se sobrou outra."""
+    count = 0
+    cut = start = 0
+    while True:
+        end = text.find('\n', start)
+        line_end = len(text) if end < 0 else end
+        if text[start:line_end].strip():
+            if count == max_lines:
+                return text[:cut], True
+            count += 1
+            cut = line_end
+        if end < 0:
+            return text, False
+        start = end + 1
+
+
+class StreamingCleaner:
+    """
+    Aplica clean_response + truncate_response sobre deltas de um stream.
+
+    O texto bruto é consumido em trechos que terminam num ponto que
+    nenhuma regra pode mais alterar: citação, URL, "Fonte:" e parênteses
+    com ano já resolvidos, header/bullet da linha decididos e nenhum "*"
+    sem par. Cada trecho passa pelo próprio clean_response, então o que
+    sai é sempre um prefixo de clean_response(raw_text), inclusive linhas
+    em branco e bullets partidos entre chunks.
+
+    Após `max_lines` linhas não vazias, `done` vira True. Os deltas
+    mantêm os separadores originais entre essas linhas ("\n\n" entre
+    parágrafos), enquanto truncate_response junta com "\n"; o texto
+    do evento final (sanitize_response) é o que vale.
+    """
+
+    def __init__(self, max_lines: int = 5) -> None:
+        self.max_lines = max_lines
+        self.done = False
+        self._raw: list[str] = []
+        # Bruto ainda não consumido e clean (sem strip) do que já foi
+        self._pending = ""
+        self._out = ""
+        self._consumed = False
+        self._sent = ""
+        # Um "*" sem par segura tudo até chegar outro "*"
+        self._blocked = False
+        # Retido grande (parênteses sem fechamento, linhas em branco): só
+        # relê depois de crescer um quarto, para não ficar quadrático
+        self._retry_at = 0
+
+    @property
+    def raw_text(self) -> str:
+        """Texto bruto consumido até agora."""
+        return "".join(self._raw)
+
+    def feed(self, chunk: str) -> str:
+        """Consome um delta e retorna o trecho limpo já seguro para enviar."""
+        if self.done or not chunk:
+            return ""
+        self._raw.append(chunk)
+        self._pending += chunk
+        if self._blocked and "*" not in chunk:
+            return ""
+        if len(self._pending) < self._retry_at:
+            return ""
+        return self._advance(final=False)
+
+    def flush(self) -> str:
+        """Libera o que restou ao fim do stream."""
+        if self.done:
+            return ""
+        return self._advance(final=True)
+
+    def _clean_piece(self, piece: str) -> str:
+        if not self._consumed:
+            return _clean_unstripped(piece)
+        return _clean_unstripped(_STREAM_SENTINEL + piece)[1:]
+
+    def _advance(self, final: bool) -> str:
+        pending = self._pending
+        if final:
+            end = len(pending)
+            cleaned = self._clean_piece(pending)
+        else:
+            end, cleaned = self._safe_piece(pending)
+        if end:
+            self._out += cleaned
+            self._pending = pending[end:]
+            self._consumed = True
+        held = len(self._pending)
+        self._retry_at = held + held // 4 if held > _STREAM_RETRY_MIN else 0
+
+        text = self._out.strip()
+        if not text.startswith(self._sent):
+            return ""
+        delta = text[len(self._sent):]
+        if final or "\n" in delta:
+            text, self.done = _cut_after_lines(text, self.max_lines)
+            delta = text[len(self._sent):]
+        self._sent = text
+        return delta
+
+    def _safe_piece(self, pending: str) -> tuple[int, str]:
+        """Maior prefixo do pendente que já pode ser consumido, e seu clean."""
+        self._blocked = False
+        end, removals = self._scan(pending)
+        while end:
+            end = self._settle(pending, end, removals)
+            if not end:
+                break
+            cleaned = self._clean_piece(pending[:end])
+            if "*" in cleaned:
+                # Um "*" sem par pode casar com o próximo "*" do stream:
+                # o trecho para no primeiro deles, que é o último início
+                # de "*" cujo prefixo limpo não deixa asterisco sobrando
+                self._blocked = True
+                star = end
+                while True:
+                    star = pending.rfind("*", 0, star)
+                    if "*" not in self._clean_piece(pending[:star]):
+                        break
+                end = star
+                continue
+            line_start = pending.rfind("\n", 0, end) + 1
+            if (line_start or not self._consumed) and _only_markers(cleaned[cleaned.rfind("\n") + 1:]):
+                # A linha começou no pendente e ainda pode virar header ou
+                # bullet (que passam de uma linha para a outra)
+                end = line_start
+                continue
+            return end, cleaned
+        return 0, ""
+
+    @staticmethod
+    def _settle(pending: str, end: int, removals: list[tuple[int, int]]) -> int:
+        """Recua o corte até um caractere real que não esteja dentro de uma remoção."""
+        # Espaços, quebras de linha e "*" no fim ainda mudam o que as
+        # regras fazem com o trecho; fonte, URL ou parênteses cortados ao
+        # meio deixam de casar
+        while True:
+            piece = pending[:end]
+            trimmed = piece.rstrip().rstrip("*")
+            while trimmed != piece:
+                piece, trimmed = trimmed, trimmed.rstrip().rstrip("*")
+            end = len(piece)
+            for start, stop in removals:
+                if start < end < stop:
+                    end = start
+                    break
+            else:
+                # Numa linha ainda aberta o "(" já segurou o stream; numa
+                # completa, o corte não pode ficar entre "(" e ")"
+                line_start = pending.rfind("\n", 0, end) + 1
+                paren = pending.find("(", line_start, end)
+                if paren >= 0 and ")" in pending[end:pending.find("\n", end)]:
+                    end = paren
+                    continue
+                return end
+
+    @staticmethod
+    def _scan(text: str) -> tuple[int, list[tuple[int, int]]]:
+        """
+        Até onde nenhuma regra de remoção pode mais alterar o texto, e os
+        trechos de fonte (início, fim) já resolvidos antes desse ponto.
+        """
+        # Fontes e parênteses são procurados depois de tiradas as citações
+        # e URLs, que podem juntar os dois lados numa palavra nova; a URL
+        # que chega ao fim do texto ainda pode crescer e fica
+        view, positions = text, range(len(text))
+        removals: list[tuple[int, int]] = []
+        for pattern, trigger in ((_CITATION_RE, "["), (_URL_RE, "://")):
+            if trigger not in view:
+                continue
+            parts: list[str] = []
+            kept: list[int] = []
+            last = 0
+            for match in pattern.finditer(view):
+                if match.end() == len(view) and pattern is _URL_RE:
+                    break
+                parts.append(view[last:match.start()])
+                kept.extend(positions[last:match.start()])
+                last = match.end()
+                if pattern is _URL_RE:
+                    removals.append((positions[match.start()], positions[last - 1] + 1))
+            parts.append(view[last:])
+            kept.extend(positions[last:])
+            view, positions = "".join(parts), kept
+
+        lower = _fold_case(view)
+        n = len(view)
+
+        def hold_removable(i: int) -> tuple[int, list[tuple[int, int]]]:
+            # Citação ou URL ainda aberta: quando sair, o que vem antes pode
+            # se juntar com o que vem depois numa fonte
+            for j in range(max(0, i - _STREAM_HOLD_LONGEST), i):
+                if lower[j:i] in _STREAM_HOLD_TAILS:
+                    return positions[j], removals
+            return positions[i], removals
+
+        i = 0
+        while True:
+            match = _STREAM_TRIGGER_RE.search(lower, i)
+            if not match:
+                break
+            i = match.start()
+            trigger = match.group()
+            if trigger == "(":
+                # Parênteses com ano vão até o fim da linha
+                if view.find("\n", i) < 0:
+                    return positions[i], removals
+            elif trigger == "[":
+                j = i + 1
+                while j < n and view[j].isdigit():
+                    j += 1
+                if j == n:
+                    return hold_removable(i)
+            elif trigger.startswith("http"):
+                return hold_removable(i)
+            elif match.end() == n:
+                return positions[i], removals
+            elif view[match.end()] == ":" or view[match.end()].isspace():
+                # A fonte vai até o fim da linha; "Fonte\n" engole a seguinte
+                line_end = view.find("\n", match.end() + 1)
+                if line_end < 0:
+                    return positions[i], removals
+                removals.append((positions[i], positions[line_end]))
+                i = line_end
+                continue
+            i += 1
+        # Palavra ainda incompleta no fim do texto (pode ser o começo de uma URL)
+        for j in range(max(i, n - _STREAM_HOLD_LONGEST), n):
+            if lower[j:] in _STREAM_HOLD_TAILS:
+                return hold_removable(j)
+        return len(text), removals
+
+
 # ===================================
 # CHAMADAS DE API (COM GUARDRAILS)
 # ===================================
 
 async def query_perplexity(question: str, request_id: str) -> Optional[str]:
-    """Busca informações via Perplexity AI com guardrails."""
+    """
+    Pesquisa via Perplexity, com o cache de pesquisa na frente.
+
+    Hit (fresco ou stale) volta na hora; entradas stale são revalidadas em
+    background. Miss busca e guarda o resultado.
+    """
+    key = research_cache.make_key("research", question)
+    await research_cache.load_shared(key)
+    await research_cache.load_persisted(key)
+    research = research_cache.get(key, refresh=lambda: fetch_perplexity_research(question, "cache"))
+    if research:
+        saved_s = research_cache.record_hit()
+        research_cache_lookups.labels("hit").inc()
+        research_cache_saved.labels().inc(saved_s)
+        secure_log("info", "Research cache hit", request_id, saved_ms=round(saved_s * 1000))
+        return research
+
+    research_cache_lookups.labels("miss").inc()
+    research = await fetch_perplexity_research(question, request_id)
+    if research:
+        research_cache.set(key, research)
+    return research
+
+
+async def fetch_perplexity_research(question: str, request_id: str) -> Optional[str]:
+    """
+    Busca informações via Perplexity AI com guardrails.
+
+    Não grava no cache: quem chama guarda (o miss em `query_perplexity`, a
+    revalidação em `ResponseCache._revalidate`), uma vez só.
+    """
     if not Config.has_perplexity():
         secure_log("warn", "Perplexity not configured", request_id)
         return None
+    if provider_open("perplexity", request_id):
+        return None
 
     secure_log("info", "Querying Perplexity", request_id)
 
+    started = time.perf_counter()
     data = await secure_fetch(
         url="https://api.perplexity.ai/chat/completions",
         request_id=request_id,
@@ -832,6 +3555,8 @@ async def query_perplexity(question: str, request_id: str) -> Optional[str]:
     if data:
         result = data.get("choices", [{}])[0].get("message", {}).get("content")
         secure_log("info", "Perplexity response received", request_id, has_content=bool(result))
+        if result:
+            research_cache.record_fetch(time.perf_counter() - started)
         return result
 
     return None
@@ -842,6 +3567,8 @@ async def curate_with_anthropic(question: str, perplexity_response: Optional[str
     if not Config.has_anthropic():
         secure_log("warn", "Anthropic not configured", request_id)
         return None
+    if provider_open("anthropic", request_id):
+        return None
 
     secure_log("info", "Curating with Anthropic", request_id)
 
@@ -858,76 +3585,934 @@ async def curate_with_anthropic(question: str, perplexity_response: Optional[str
         json_data={
             "model": "claude-haiku-4-5-20251001",
             "max_tokens": 1024,
-            "system": CURATOR_SYSTEM_PROMPT,
+            "system": anthropic_system(CURATOR_SYSTEM_PROMPT),
             "messages": [{"role": "user", "content": user_message}],
         }
-    )
+    )
+
+    if data:
+        result = data.get("content", [{}])[0].get("text")
+        secure_log("info", "Anthropic response received", request_id, has_content=bool(result))
+        return result
+
+    return None
+
+
+async def curate_with_openai(question: str, perplexity_response: Optional[str], request_id: str) -> Optional[str]:
+    """Curadoria via OpenAI (fallback) com guardrails."""
+    if not Config.has_openai():
+        secure_log("warn", "OpenAI not configured", request_id)
+        return None
+    if provider_open("openai", request_id):
+        return None
+
+    secure_log("info", "Curating with OpenAI (fallback)", request_id)
+
+    user_message = (
+        f'Pergunta do usuário: "{question}"\n\nInformações pesquisadas (REMOVA todas as referências e citações):\n{perplexity_response}\n\nResponda de forma natural, sem mencionar fontes ou pesquisas.'
+        if perplexity_response
+        else f'Pergunta do usuário: "{question}"\n\nResponda baseado no seu conhecimento sobre a Arbache Consulting.'
+    )
+
+    data = await secure_fetch(
+        url="https://api.openai.com/v1/chat/completions",
+        request_id=request_id,
+        headers=Config.get_openai_headers(),
+        json_data={
+            "model": "gpt-4o-mini",
+            "messages": [
+                {"role": "system", "content": CURATOR_SYSTEM_PROMPT},
+                {"role": "user", "content": user_message},
+            ],
+            "max_tokens": 1024,
+            "temperature": 0.7,
+            **openai_cache_fields(CURATOR_SYSTEM_PROMPT),
+        }
+    )
+
+    if data:
+        result = data.get("choices", [{}])[0].get("message", {}).get("content")
+        secure_log("info", "OpenAI response received", request_id, has_content=bool(result))
+        return result
+
+    return None
+
+
+# ===================================
+# ANSWER STORE (SQLite em disco)
+# ===================================
+
+class AnswerStore:
+    """
+    Cópia em disco das respostas curadas e das pesquisas do Perplexity.
+
+    SQLite em WAL num volume montado (ANSWER_STORE_PATH), para que um
+    container novo (deploy ou rollback) não comece com os caches frios:
+
+    - gravações ficam pendentes em memória e vão em lote, numa transação,
+      a cada ANSWER_STORE_FLUSH_S (thread, fora do event loop);
+    - no startup, `warm` copia as entradas mais recentes de cada cache
+      para o L1 em background, em fatias, sem segurar o readiness;
+    - um miss no L1 pode ser lido do disco (`fetch`, por chave primária);
+    - `compact` apaga o que passou da janela stale, limita o número de
+      linhas a ANSWER_STORE_MAX_ROWS e trunca o WAL.
+
+    Vários workers podem abrir o mesmo arquivo. Prazos em tempo de
+    parede (time.time()), que vale entre processos e reinícios.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA auto_vacuum=INCREMENTAL")  # só vale em arquivo novo
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA mmap_size=268435456")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "cache TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+            "fresh_until REAL NOT NULL, stale_until REAL NOT NULL, "
+            "PRIMARY KEY (cache, key)) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS answers_stale ON answers (stale_until)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS answers_recent ON answers (cache, fresh_until)")
+        self._pending: dict[tuple[str, str], tuple[str, float, float]] = {}
+        self.writes = 0
+        self.loaded = 0
+        self.disk_hits = 0
+        self.compacted = 0
+        self.load_ms: Optional[float] = None
+
+    def put(self, cache: str, key: str, value: str, fresh_until: float, stale_until: float) -> None:
+        """Enfileira a gravação (a última versão de cada chave vence)."""
+        self._pending[(cache, key)] = (value, fresh_until, stale_until)
+
+    def _write_sync(self, rows: list[tuple]) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO answers (cache, key, value, fresh_until, stale_until) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        rows = [(cache, key, *entry) for (cache, key), entry in pending.items()]
+        await asyncio.to_thread(self._write_sync, rows)
+        self.writes += len(rows)
+
+    def _fetch_sync(self, cache: str, key: str) -> Optional[tuple[str, float, float]]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT value, fresh_until, stale_until FROM answers "
+                "WHERE cache = ? AND key = ? AND stale_until > ?",
+                (cache, key, time.time()),
+            ).fetchone()
+
+    async def fetch(self, cache: str, key: str) -> Optional[tuple[str, float, float]]:
+        """Lê uma entrada ainda válida: (valor, fresh_until, stale_until) ou None."""
+        pending = self._pending.get((cache, key))
+        if pending is not None:
+            return pending
+        row = await asyncio.to_thread(self._fetch_sync, cache, key)
+        if row is not None:
+            self.disk_hits += 1
+        return row
+
+    def _oldest_to_load_sync(self, cache: str, limit: int) -> float:
+        """fresh_until da mais antiga entre as `limit` mais recentes (o L1 não cabe mais)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fresh_until FROM answers WHERE cache = ? "
+                "ORDER BY fresh_until DESC LIMIT 1 OFFSET ?",
+                (cache, max(0, limit - 1)),
+            ).fetchone()
+        return row[0] if row else 0.0
+
+    def _chunk_sync(self, cache: str, after: tuple[float, str],
+                    limit: int) -> list[tuple[str, str, float, float]]:
+        """Próxima fatia em ordem crescente de fresh_until (paginação por chave)."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT key, value, fresh_until, stale_until FROM answers "
+                "WHERE cache = ? AND (fresh_until, key) > (?, ?) AND stale_until > ? "
+                "ORDER BY fresh_until, key LIMIT ?",
+                (cache, after[0], after[1], time.time(), limit),
+            ).fetchall()
+
+    async def warm(self, caches: list["ResponseCache"]) -> None:
+        """Carga inicial do L1 (task de background do lifespan)."""
+        started = time.perf_counter()
+        for cache in caches:
+            # Das mais antigas para as mais novas: as recentes terminam no topo do LRU
+            try:
+                oldest = await asyncio.to_thread(self._oldest_to_load_sync, cache.persist_as,
+                                                 cache.max_entries)
+                after = (oldest, "")
+                while True:
+                    rows = await asyncio.to_thread(self._chunk_sync, cache.persist_as, after,
+                                                   ANSWER_STORE_LOAD_CHUNK)
+                    if not rows:
+                        break
+                    now = time.time()
+                    for key, value, fresh_until, stale_until in rows:
+                        # O que já chegou por requisições novas é mais recente
+                        if key not in cache._entries:
+                            cache._store(key, value, fresh_until - now, stale_until - now)
+                            self.loaded += 1
+                    after = (rows[-1][2], rows[-1][0])
+            except sqlite3.Error as e:
+                secure_log("warn", "Answer store load failed", "answer_store",
+                           cache=cache.persist_as, error=str(e))
+        self.load_ms = round((time.perf_counter() - started) * 1000, 1)
+        secure_log("info", "Answer store loaded", "answer_store",
+                   entries=self.loaded, duration_ms=self.load_ms)
+
+    def _compact_sync(self) -> int:
+        with self._lock:
+            removed = self._conn.execute(
+                "DELETE FROM answers WHERE stale_until <= ?", (time.time(),)
+            ).rowcount
+            removed += self._conn.execute(
+                "DELETE FROM answers WHERE (cache, key) IN (SELECT cache, key FROM answers "
+                "ORDER BY fresh_until DESC LIMIT -1 OFFSET ?)",
+                (ANSWER_STORE_MAX_ROWS,),
+            ).rowcount
+            # executescript roda o pragma até o fim (execute libera uma página só)
+            self._conn.executescript("PRAGMA incremental_vacuum;")
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return removed
+
+    async def compact(self) -> int:
+        removed = await asyncio.to_thread(self._compact_sync)
+        self.compacted += removed
+        if removed:
+            secure_log("info", "Answer store compacted", "answer_store", removed=removed)
+        return removed
+
+    async def run_forever(self) -> None:
+        """Grava pendências periodicamente e compacta de tempos em tempos."""
+        next_compact = time.monotonic() + ANSWER_STORE_COMPACT_S
+        while True:
+            await asyncio.sleep(ANSWER_STORE_FLUSH_S)
+            try:
+                await self.flush()
+                if time.monotonic() >= next_compact:
+                    next_compact = time.monotonic() + ANSWER_STORE_COMPACT_S
+                    await self.compact()
+            except Exception as e:
+                secure_log("warn", "Answer store maintenance failed", "answer_store", error=str(e))
+
+    async def aclose(self) -> None:
+        await self.flush()
+        with self._lock:
+            self._conn.close()
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "pending": len(self._pending),
+            "writes": self.writes,
+            "loaded": self.loaded,
+            "disk_hits": self.disk_hits,
+            "compacted": self.compacted,
+            "load_ms": self.load_ms or 0.0,
+        }
+
+
+def open_answer_store(path: str = ANSWER_STORE_PATH) -> Optional[AnswerStore]:
+    if not path:
+        return None
+    try:
+        return AnswerStore(path)
+    except (sqlite3.Error, OSError) as e:  # volume ausente: segue só com memória
+        secure_log("warn", "Answer store unavailable", "answer_store", path=path, error=str(e))
+        return None
+
+
+answer_store: Optional[AnswerStore] = open_answer_store()
+
+
+# ===================================
+# RESPONSE CACHE (TTL + LRU)
+# ===================================
+
+def history_hash(conversation_history: Optional[list[ConversationMessage]]) -> str:
+    """Hash estável do histórico de conversa (vazio quando não há histórico)."""
+    if not conversation_history:
+        return ""
+    digest = hashlib.sha1()
+    for msg in conversation_history:
+        digest.update(msg.role.encode())
+        digest.update(b"\x00")
+        digest.update(msg.content.encode())
+        digest.update(b"\x01")
+    return digest.hexdigest()
+
+
+class _CacheEntry:
+    __slots__ = ("value", "size", "fresh_until", "stale_until")
+
+    def __init__(self, value: str, size: int, fresh_until: float, stale_until: float) -> None:
+        self.value = value
+        self.size = size
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+
+
+class ResponseCache:
+    """
+    Cache LRU em processo com TTL e stale-while-revalidate.
+
+    Só guarda respostas curadas e limpas (nunca os fallbacks estáticos).
+    O tamanho de cada entrada é contabilizado em bytes e as entradas menos
+    usadas são removidas ao passar de `max_entries` ou `max_bytes`.
+
+    Com backend de estado compartilhado, esta é a camada L1: gravações
+    também vão (em background) para o backend, e um miss local pode ser
+    preenchido com `load_shared` ou pelo prefetch do rate limit.
+    """
+
+    # Overhead aproximado por entrada (objeto, slots, nó do OrderedDict)
+    ENTRY_OVERHEAD = 200
+
+    def __init__(
+        self,
+        ttl_s: int = RESPONSE_CACHE_TTL_S,
+        swr_s: int = RESPONSE_CACHE_SWR_S,
+        max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+        max_bytes: int = RESPONSE_CACHE_MAX_BYTES,
+        persist_as: Optional[str] = None,
+    ) -> None:
+        self.ttl_s = ttl_s
+        self.swr_s = swr_s
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.persist_as = persist_as  # nome no AnswerStore (None = só memória)
+        self._entries: OrderedDict[str, _CacheEntry] = OrderedDict()
+        self._refreshing: set[str] = set()
+        self._publishing: set[asyncio.Task] = set()
+        self.bytes = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.refreshes = 0
+        self.shared_hits = 0
+
+    @staticmethod
+    def make_key(
+        namespace: str,
+        message: str,
+        section: Optional[str] = None,
+        section_context: Optional[str] = None,
+        conversation_history: Optional[list[ConversationMessage]] = None,
+    ) -> str:
+        context = hashlib.sha1((section_context or "").encode()).hexdigest()[:12] if section_context else ""
+        return "|".join((
+            namespace,
+            normalize_text(message),
+            section or "",
+            context,
+            history_hash(conversation_history),
+        ))
+
+    def get(
+        self,
+        key: str,
+        refresh: Optional[Callable[[], Awaitable[Optional[str]]]] = None,
+    ) -> Optional[str]:
+        """
+        Retorna a resposta em cache ou None.
+
+        Entradas vencidas mas dentro da janela stale ainda são servidas, e
+        disparam (uma única vez por chave) `refresh` em background.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        now = time.monotonic()
+        if now >= entry.stale_until:
+            self._remove(key)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        if now < entry.fresh_until:
+            self.hits += 1
+            return entry.value
+
+        self.stale_hits += 1
+        if refresh is not None and key not in self._refreshing:
+            self._refreshing.add(key)
+            # Contexto limpo: a revalidação não herda prazo, trace nem ramo do visitante
+            asyncio.create_task(self._revalidate(key, refresh), context=Context())
+        return entry.value
+
+    def set(self, key: str, value: str) -> None:
+        self._store(key, value, self.ttl_s, self.ttl_s + self.swr_s)
+        if self.persist_as and answer_store is not None:
+            now = time.time()
+            answer_store.put(self.persist_as, key, value, now + self.ttl_s, now + self.ttl_s + self.swr_s)
+        if state_backend.shared:
+            task = asyncio.create_task(self._publish(key, value))
+            self._publishing.add(task)
+            task.add_done_callback(self._publishing.discard)
+
+    def absorb(self, key: str, raw: Optional[bytes]) -> None:
+        """Copia para o L1 uma entrada lida do backend compartilhado."""
+        if raw is None or key in self._entries:
+            return
+        try:
+            payload = json.loads(raw)
+            now = time.time()
+            fresh_s, stale_s = payload["fresh_until"] - now, payload["stale_until"] - now
+            value = payload["value"]
+        except (ValueError, KeyError, TypeError):
+            return
+        if stale_s > 0:
+            self._store(key, value, fresh_s, stale_s)
+            self.shared_hits += 1
+
+    async def load_shared(self, key: str) -> None:
+        """Num miss local, busca a chave no backend compartilhado (um round-trip)."""
+        if not state_backend.shared or key in self._entries:
+            return
+        try:
+            self.absorb(key, await state_backend.get(key))
+        except Exception as e:
+            secure_log("warn", "Shared response cache read failed", "cache",
+                       backend=state_backend.name, error=str(e))
+
+    async def load_persisted(self, key: str) -> None:
+        """Num miss local, busca a chave no AnswerStore em disco."""
+        if not self.persist_as or answer_store is None or key in self._entries:
+            return
+        try:
+            row = await answer_store.fetch(self.persist_as, key)
+        except sqlite3.Error as e:
+            secure_log("warn", "Answer store read failed", "cache", error=str(e))
+            return
+        if row is not None:
+            value, fresh_until, stale_until = row
+            now = time.time()
+            self._store(key, value, fresh_until - now, stale_until - now)
+
+    async def _publish(self, key: str, value: str) -> None:
+        now = time.time()
+        payload = json.dumps({
+            "value": value,
+            "fresh_until": now + self.ttl_s,
+            "stale_until": now + self.ttl_s + self.swr_s,
+        }).encode()
+        try:
+            await state_backend.set(key, payload, self.ttl_s + self.swr_s)
+        except Exception as e:
+            secure_log("warn", "Shared response cache write failed", "cache",
+                       backend=state_backend.name, error=str(e))
+
+    def _store(self, key: str, value: str, fresh_s: float, stale_s: float) -> None:
+        size = len(key.encode()) + len(value.encode()) + self.ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        now = time.monotonic()
+        self._entries[key] = _CacheEntry(value, size, now + fresh_s, now + stale_s)
+        self.bytes += size
+        while self._entries and (
+            len(self._entries) > self.max_entries or self.bytes > self.max_bytes
+        ):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.bytes = 0
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry.size
+
+    async def _revalidate(
+        self,
+        key: str,
+        refresh: Callable[[], Awaitable[Optional[str]]],
+    ) -> None:
+        try:
+            value = await refresh()
+            if value:
+                self.set(key, value)
+                self.refreshes += 1
+        except Exception as e:
+            secure_log("warn", "Response cache refresh failed", "cache", error=str(e))
+        finally:
+            self._refreshing.discard(key)
+
+    def stats(self) -> dict[str, float]:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "refreshes": self.refreshes,
+            "shared_hits": self.shared_hits,
+            "hit_rate": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+
+response_cache = ResponseCache(persist_as="responses")
+
+
+class ResearchCache(ResponseCache):
+    """
+    Cache da pesquisa bruta do Perplexity, chaveado só pela pergunta normalizada.
+
+    A pesquisa não depende de seção nem de histórico, então /chat, o v2
+    (elaboradas) e o streaming compartilham as entradas; num hit só a
+    curadoria é paga. TTL longo e revalidação em background. A latência
+    economizada é estimada pela média móvel das buscas reais.
+    """
+
+    # Peso da última busca na média móvel de latência
+    LATENCY_ALPHA = 0.2
+
+    def __init__(self) -> None:
+        super().__init__(
+            ttl_s=RESEARCH_CACHE_TTL_S,
+            swr_s=RESEARCH_CACHE_SWR_S,
+            max_entries=RESEARCH_CACHE_MAX_ENTRIES,
+            max_bytes=RESEARCH_CACHE_MAX_BYTES,
+            persist_as="research",
+        )
+        self.fetches = 0
+        self.fetch_latency_s = 0.0
+        self.saved_s = 0.0
+
+    def record_fetch(self, elapsed_s: float) -> None:
+        """Registra a latência de uma busca real (miss ou revalidação)."""
+        self.fetches += 1
+        if self.fetches == 1:
+            self.fetch_latency_s = elapsed_s
+        else:
+            self.fetch_latency_s += self.LATENCY_ALPHA * (elapsed_s - self.fetch_latency_s)
+
+    def record_hit(self) -> float:
+        """Conta um hit e retorna a latência upstream estimada que ele poupou."""
+        self.saved_s += self.fetch_latency_s
+        return self.fetch_latency_s
+
+    def stats(self) -> dict[str, float]:
+        return {
+            **super().stats(),
+            "fetches": self.fetches,
+            "fetch_latency_ms": round(self.fetch_latency_s * 1000, 1),
+            "saved_ms": round(self.saved_s * 1000),
+        }
+
+
+research_cache = ResearchCache()
+
+
+# ===================================
+# SINGLE-FLIGHT (requisições idênticas em voo)
+# ===================================
+
+class _Flight:
+    __slots__ = ("task", "branch")
+
+    def __init__(self, task: asyncio.Task, branch: _BranchMark) -> None:
+        self.task = task
+        self.branch = branch
+
+
+class SingleFlight:
+    """
+    Coalescência de pipelines idênticos em voo (por processo).
+
+    A primeira requisição com uma chave (a do cache de respostas:
+    mensagem normalizada + seção + contexto + hash do histórico) sobe o
+    pipeline como tarefa própria; as que chegam enquanto ele roda só
+    aguardam o mesmo resultado. Cada espera passa por `asyncio.shield`:
+    se o cliente de qualquer uma desconectar (inclusive o primeiro), só
+    a espera dele é cancelada, e o pipeline segue para os demais e
+    termina gravando o cache. O pipeline compartilhado roda com o
+    orçamento do servidor, não com o prazo de quem chegou primeiro (que
+    pode vir do header do cliente e ser bem curto); cada requisição
+    espera no máximo o próprio prazo e, ao esgotar, recebe None
+    (fallback estático).
+    """
+
+    def __init__(self) -> None:
+        self._flights: dict[str, _Flight] = {}
+        self.leaders = 0
+        self.followers = 0
+        self.abandoned = 0
+
+    async def run(self, key: str, compute: Callable[[], Awaitable[Optional[str]]]) -> Optional[str]:
+        flight = self._flights.get(key)
+        if flight is None:
+            self.leaders += 1
+            branch = _BranchMark()
+            # O pipeline herda o trace do primeiro, mas tem o próprio ramo e prazo
+            context = copy_context()
+            context.run(_chat_branch.set, branch)
+            context.run(_deadline.set, server_deadline())
+            task = asyncio.create_task(compute(), context=context)
+            flight = _Flight(task, branch)
+            self._flights[key] = flight
+            task.add_done_callback(lambda t: self._finish(key, t))
+        else:
+            self.followers += 1
+
+        try:
+            async with asyncio.timeout(deadline_remaining()):
+                result = await asyncio.shield(flight.task)
+        except TimeoutError:
+            return None
+        except asyncio.CancelledError:
+            self.abandoned += 1
+            raise
+        mark_branch(flight.branch.branch)
+        return result
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        self._flights.pop(key, None)
+        # Sem ninguém esperando, a exceção ainda precisa ser consumida
+        if not task.cancelled() and task.exception() is not None:
+            secure_log("warn", "Coalesced pipeline failed", "single_flight",
+                       error=str(task.exception()))
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "in_flight": len(self._flights),
+            "leaders": self.leaders,
+            "followers": self.followers,
+            "abandoned": self.abandoned,
+        }
 
-    if data:
-        result = data.get("content", [{}])[0].get("text")
-        secure_log("info", "Anthropic response received", request_id, has_content=bool(result))
-        return result
 
-    return None
+pipeline_flights = SingleFlight()
 
 
-async def curate_with_openai(question: str, perplexity_response: Optional[str], request_id: str) -> Optional[str]:
-    """Curadoria via OpenAI (fallback) com guardrails."""
-    if not Config.has_openai():
-        secure_log("warn", "OpenAI not configured", request_id)
-        return None
+# ===================================
+# SEMANTIC CACHE (vetores locais)
+# ===================================
 
-    secure_log("info", "Curating with OpenAI (fallback)", request_id)
+# Marca e interrogativos genéricos aparecem em quase toda pergunta
+# e não distinguem intenção
+_SEMANTIC_IGNORED = frozenset({"arbache", "consulting", "qual", "quais"})
 
-    user_message = (
-        f'Pergunta do usuário: "{question}"\n\nInformações pesquisadas (REMOVA todas as referências e citações):\n{perplexity_response}\n\nResponda de forma natural, sem mencionar fontes ou pesquisas.'
-        if perplexity_response
-        else f'Pergunta do usuário: "{question}"\n\nResponda baseado no seu conhecimento sobre a Arbache Consulting.'
-    )
 
-    data = await secure_fetch(
-        url="https://api.openai.com/v1/chat/completions",
-        request_id=request_id,
-        headers=Config.get_openai_headers(),
-        json_data={
-            "model": "gpt-4o-mini",
-            "messages": [
-                {"role": "system", "content": CURATOR_SYSTEM_PROMPT},
-                {"role": "user", "content": user_message},
-            ],
-            "max_tokens": 1024,
-            "temperature": 0.7,
+def question_features(text: str) -> "np.ndarray":
+    """
+    Contagens com sinal de trigramas de caractere + palavras, via hashing.
+
+    Roda local, sem API externa nem GPU. O hash (crc32) é estável entre
+    processos e o sinal por feature reduz o viés de colisões.
+    """
+    counts = [0] * SEMANTIC_DIM
+    words = [
+        w for w in normalize_text(text).split()
+        if w not in PT_STOP_WORDS and w not in _SEMANTIC_IGNORED
+    ]
+    for word in words:
+        word = _light_stem(word)
+        padded = f" {word} "
+        features = [padded[i:i + 3] for i in range(len(padded) - 2)]
+        features.append("w:" + word)
+        # Prefixo curto aproxima variações que o stem não cobre
+        features.append("p:" + word[:4])
+        for feature in features:
+            h = zlib.crc32(feature.encode())
+            counts[h % SEMANTIC_DIM] += -1 if h & 0x80000000 else 1
+    return np.array(counts, dtype=np.int16)
+
+
+def embed_question(text: str) -> "np.ndarray":
+    """Vetor float32 L2-normalizado da pergunta (cosseno = produto escalar)."""
+    vec = question_features(text).astype(np.float32)
+    norm = float(np.linalg.norm(vec))
+    return vec / norm if norm else vec
+
+
+class _SectionIndex:
+    """
+    Vetores de uma seção em layout transposto (dim x linhas), int8.
+
+    As contagens são limitadas a ±127 dos dois lados (armazenado e
+    pergunta), e a norma é a do vetor já limitado, então uma pergunta
+    tem cosseno 1 consigo mesma. A pergunta curta só tem ~30 dimensões
+    não nulas, então o produto escalar vira a soma ponderada de poucas
+    linhas contíguas num acumulador int32 (127 * 127 * SEMANTIC_DIM
+    não estoura) — bem menos memória lida por busca do que um produto
+    matricial denso em float32. Buffer circular.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        initial = min(capacity, 64)
+        self.counts = np.zeros((SEMANTIC_DIM, initial), dtype=np.int8)
+        self.inv_norms = np.zeros(initial, dtype=np.float32)
+        self.expires = np.zeros(initial, dtype=np.float64)
+        self.answers: list[Optional[str]] = [None] * initial
+        self._acc = np.zeros(initial, dtype=np.int32)
+        self._term = np.zeros(initial, dtype=np.int32)
+        self.size = 0
+        self._next = 0
+
+    @staticmethod
+    def _clip(counts: "np.ndarray") -> "np.ndarray":
+        return np.clip(counts, -127, 127).astype(np.int8)
+
+    def _grow(self) -> None:
+        grown = min(self.capacity, self.counts.shape[1] * 2)
+        counts = np.zeros((SEMANTIC_DIM, grown), dtype=np.int8)
+        counts[:, :self.size] = self.counts[:, :self.size]
+        self.counts = counts
+        self.inv_norms = np.resize(self.inv_norms, grown)
+        self.expires = np.resize(self.expires, grown)
+        self.answers.extend([None] * (grown - len(self.answers)))
+        self._acc = np.zeros(grown, dtype=np.int32)
+        self._term = np.zeros(grown, dtype=np.int32)
+
+    def add(self, counts: "np.ndarray", answer: str, expires_at: float) -> None:
+        clipped = self._clip(counts)
+        norm = float(np.linalg.norm(clipped))
+        if not norm:
+            return
+        if self.size < self.capacity and self.size == self.counts.shape[1]:
+            self._grow()
+        row = self._next
+        self.counts[:, row] = clipped
+        self.inv_norms[row] = 1.0 / norm
+        self.expires[row] = expires_at
+        self.answers[row] = answer
+        self._next = (row + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def scores(self, counts: "np.ndarray") -> "np.ndarray":
+        """Cosseno da pergunta contra todas as linhas da seção."""
+        n = self.size
+        clipped = self._clip(counts)
+        norm = float(np.linalg.norm(clipped))
+        if not norm:
+            return np.zeros(n, dtype=np.float32)
+        acc, term = self._acc[:n], self._term[:n]
+        acc[:] = 0
+        for dim in np.flatnonzero(clipped):
+            weight = int(clipped[dim])
+            row = self.counts[dim, :n]
+            # ±1 é o caso comum (feature vista uma vez): soma direta
+            if weight == 1:
+                np.add(acc, row, out=acc)
+            elif weight == -1:
+                np.subtract(acc, row, out=acc)
+            else:
+                np.multiply(row, weight, out=term, dtype=np.int32)
+                np.add(acc, term, out=acc)
+        return np.multiply(acc, self.inv_norms[:n] / norm, dtype=np.float32)
+
+    def top_k(self, counts: "np.ndarray", k: int, now: float) -> list[tuple[float, int]]:
+        if not self.size:
+            return []
+        scores = self.scores(counts)
+        k = min(k, self.size)
+        if k == 1:
+            idx = np.array([int(scores.argmax())])
+        else:
+            idx = np.argpartition(scores, -k)[-k:]
+            idx = idx[np.argsort(scores[idx])[::-1]]
+        # Validade só é conferida nos vencedores; se algum expirou,
+        # refaz a busca com as linhas vencidas mascaradas
+        if (self.expires[idx] < now).any():
+            scores[self.expires[:self.size] < now] = -1.0
+            idx = np.argpartition(scores, -k)[-k:]
+            idx = idx[np.argsort(scores[idx])[::-1]]
+        return [(float(scores[i]), int(i)) for i in idx]
+
+    @property
+    def nbytes(self) -> int:
+        return self.counts.nbytes + self.inv_norms.nbytes + self.expires.nbytes
+
+
+class SemanticCache:
+    """
+    Cache de respostas curadas para perguntas quase idênticas.
+
+    Cada seção tem sua própria matriz; a busca calcula o cosseno contra
+    todas as linhas de forma vetorizada e faz top-k. Responde quando a
+    similaridade passa de `threshold`.
+    """
+
+    def __init__(
+        self,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        ttl_s: int = SEMANTIC_CACHE_TTL_S,
+        max_per_section: int = SEMANTIC_CACHE_MAX_PER_SECTION,
+    ) -> None:
+        self.enabled = SEMANTIC_CACHE_ENABLED and np is not None
+        self.threshold = threshold
+        self.ttl_s = ttl_s
+        self.max_per_section = max_per_section
+        self._sections: dict[str, _SectionIndex] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def top_k(self, message: str, section: str, k: int = 3) -> list[tuple[float, str]]:
+        """As k respostas mais próximas da pergunta na seção, com o score."""
+        index = self._sections.get(section)
+        if not self.enabled or index is None:
+            return []
+        matches = index.top_k(question_features(message), k, time.time())
+        return [(score, index.answers[row]) for score, row in matches if score > 0]
+
+    def lookup(self, message: str, section: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        with trace_span("semantic_cache"):
+            matches = self.top_k(message, section, k=1)
+        if matches and matches[0][0] >= self.threshold:
+            self.hits += 1
+            return matches[0][1]
+        self.misses += 1
+        return None
+
+    def add(self, message: str, section: str, answer: str) -> None:
+        if not self.enabled:
+            return
+        index = self._sections.get(section)
+        if index is None:
+            index = self._sections[section] = _SectionIndex(self.max_per_section)
+        index.add(question_features(message), answer, time.time() + self.ttl_s)
+
+    def stats(self) -> dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": float(self.enabled),
+            "entries": sum(i.size for i in self._sections.values()),
+            "bytes": sum(i.nbytes for i in self._sections.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
         }
-    )
 
-    if data:
-        result = data.get("choices", [{}])[0].get("message", {}).get("content")
-        secure_log("info", "OpenAI response received", request_id, has_content=bool(result))
-        return result
 
-    return None
+semantic_cache = SemanticCache()
 
 
 # ===================================
 # LIFESPAN
 # ===================================
 
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+WARMUP_MESSAGES = (
+    "O que a Arbache faz?",
+    "Olá",
+    "Qual a previsão do tempo amanhã?",
+    "Como vocês desenvolvem lideranças para a agenda ESG em empresas com várias unidades?",
+)
+
+
+def warm_up() -> float:
+    """
+    Exercita os caminhos quentes antes de o worker aceitar conexões.
+
+    Roda no startup de cada worker: a primeira requisição real não paga
+    a montagem dos validadores/serializadores do Pydantic, o primeiro
+    uso de regex e numpy, nem o cache do classificador de intenção.
+    Não passa pelo rate limit nem pelos caches de resposta. Retorna a
+    duração em ms.
+    """
+    started = time.perf_counter()
+    section_data = get_section_data_v2(None)
+    for message in WARMUP_MESSAGES:
+        request = ChatRequestV2.model_validate({
+            "message": message,
+            "section": "hero",
+            "conversationHistory": [{"role": "user", "content": message}],
+        })
+        answer = check_faq_v2(request.message) or V2_STATIC_FALLBACK
+        classify_message(request.message)
+        cleaned = sanitize_response(answer)
+        cleaner = StreamingCleaner()
+        cleaner.feed(answer)
+        cleaner.flush()
+        response_cache.make_key("v2", message, "hero", None, request.conversationHistory)
+        if semantic_cache.enabled:
+            embed_question(message)
+        ChatResponseV2(
+            response=cleaned,
+            badges=section_data.get('badges', []),
+            suggestions=generate_follow_up_suggestions(message, "hero"),
+            request_id=str(uuid.uuid4()),
+        ).model_dump_json()
+    ChatRequestV1.model_validate({"message": WARMUP_MESSAGES[0]})
+    return (time.perf_counter() - started) * 1000
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Startup/shutdown events."""
     # Startup - inicializa config
     Config.initialize()
+    upstream_pool.start()
 
     startup_id = str(uuid.uuid4())
+    warmup_ms = round(warm_up(), 1) if WARMUP_ENABLED else None
     secure_log("info", "Backend starting", startup_id,
+               pid=os.getpid(),
+               warmup_ms=warmup_ms,
                perplexity=Config.has_perplexity(),
                anthropic=Config.has_anthropic(),
-               openai=Config.has_openai())
+               openai=Config.has_openai(),
+               http2=upstream_pool.http2,
+               state_backend=state_backend.name)
+    if UPSTREAM_OVERRIDE_URL:
+        secure_log("warn", "Test mode: upstream calls go to override", startup_id,
+                   upstream_override=UPSTREAM_OVERRIDE_URL)
+    elif os.getenv("UPSTREAM_OVERRIDE_URL"):
+        secure_log("warn", "UPSTREAM_OVERRIDE_URL ignored outside test mode", startup_id)
+
+    background: list[asyncio.Task] = []
+    if answer_store is not None:
+        # Carga do disco em background: o worker já atende enquanto o L1 enche
+        background.append(asyncio.create_task(answer_store.warm([response_cache, research_cache])))
+        background.append(asyncio.create_task(answer_store.run_forever()))
+    if CHIP_PRECOMPUTE_ENABLED:
+        background.append(asyncio.create_task(chip_answers.run_forever()))
 
     yield
 
     # Shutdown
+    for task in background:
+        task.cancel()
+    for task in background:
+        with suppress(asyncio.CancelledError):
+            await task
+    if answer_store is not None:
+        await answer_store.aclose()
+    await upstream_pool.aclose()
+    await state_backend.aclose()
     secure_log("info", "Backend shutting down", startup_id)
+    if trace_exporter is not None:
+        await asyncio.to_thread(trace_exporter.close)
+    await asyncio.to_thread(log_writer.close)
 
 
 # ===================================
@@ -955,6 +4540,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Tracing amostrado; desligado (TRACE_SAMPLE_RATE=0) não entra na pilha
+if TRACE_SAMPLE_RATE > 0:
+    app.add_middleware(TracingMiddleware)
+
+# Ramo no header (carga local); fora do modo de teste não entra na pilha
+if TEST_MODE:
+    app.add_middleware(BranchHeaderMiddleware)
+
+# Latência por rota (mais externo: inclui CORS e o corpo em streaming)
+app.add_middleware(MetricsMiddleware)
+
 
 # ===================================
 # ENDPOINTS
@@ -971,7 +4567,17 @@ async def health_check():
             "perplexity": Config.has_perplexity(),
             "anthropic": Config.has_anthropic(),
             "openai": Config.has_openai(),
-        }
+        },
+        hedging=hedge_policy.snapshot(),
+        response_cache=response_cache.stats(),
+        research_cache=research_cache.stats(),
+        single_flight=pipeline_flights.stats(),
+        chip_answers=chip_answers.stats(),
+        answer_store=answer_store.stats() if answer_store is not None else None,
+        semantic_cache=semantic_cache.stats(),
+        rate_limit=rate_limiter.stats(),
+        logging=log_writer.stats(),
+        circuit_breakers={name: b.snapshot() for name, b in circuit_breakers.items()},
     )
 
 
@@ -984,12 +4590,80 @@ async def version():
         sha=clean_sha,
         version=app_version,
         service="arbache-api",
-        timestamp=datetime.utcnow().isoformat() + "Z",
+        timestamp=datetime.now(timezone.utc).isoformat().removesuffix("+00:00") + "Z",
     )
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Métricas no formato de exposição do Prometheus (por processo/worker)."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+async def require_admin(raw_request: Request) -> None:
+    """
+    Bearer ADMIN_TOKEN; sem token configurado, o endpoint nem existe (404).
+
+    Usado como dependência da rota: roda antes de o corpo ser validado,
+    então sem token a requisição nem chega a montar os modelos.
+    """
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    token = raw_request.headers.get("authorization", "").removeprefix("Bearer ")
+    if not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Não autorizado.")
+
+
+@app.post("/admin/chips/refresh", response_model=ChipRefreshResponse, status_code=202,
+          dependencies=[Depends(require_admin)])
+async def refresh_chip_answers():
+    """Dispara a regeneração das respostas dos chips (só com ADMIN_TOKEN; por worker)."""
+    status = "scheduled" if chip_answers.trigger() else "running"
+    return ChipRefreshResponse(status=status, chip_answers=chip_answers.stats())
+
+
+V1_STATIC_FALLBACK = (
+    "Obrigado pela sua pergunta! A Arbache Consulting oferece soluções integradas "
+    "em educação corporativa, liderança e sustentabilidade.\n\n"
+    "Nossos principais serviços incluem:\n"
+    "• Trilhas e Programas Educacionais\n"
+    "• Formação de Lideranças\n"
+    "• Assessment de Soft Skills com IA\n"
+    "• Mentoria de Alto Impacto\n"
+    "• Consultoria em ESG e Sustentabilidade\n\n"
+    "Para mais informações ou para agendar uma conversa com nossa equipe, "
+    "entre em contato através do formulário no site.\n\n"
+    "Como posso ajudá-lo especificamente?"
+)
+
+
+async def run_v1_pipeline(message: str, request_id: str) -> Optional[str]:
+    """Perplexity → Anthropic → OpenAI. Retorna a resposta limpa ou None."""
+    with trace_span("perplexity"):
+        perplexity_response = await query_perplexity(message, request_id)
+
+    if deadline_spent():
+        secure_log("warn", "Deadline spent before curation", request_id)
+        return None
+    with trace_span("curation") as span:
+        response = await curate_with_anthropic(message, perplexity_response, request_id)
+        if response:
+            mark_branch("anthropic")
+            span.set(provider="anthropic")
+        else:
+            response = await curate_with_openai(message, perplexity_response, request_id)
+            if response:
+                mark_branch("openai")
+                span.set(provider="openai")
+
+    if not response:
+        return None
+    with trace_span("clean"):
+        return clean_response(response)
+
+
 @app.post("/chat", response_model=ChatResponseV1)
-async def chat(request: ChatRequestV1):
+async def chat(request: ChatRequestV1, raw_request: Request):
     """
     Endpoint principal de chat com MCP Guardrails.
 
@@ -1004,6 +4678,10 @@ async def chat(request: ChatRequestV1):
     """
     request_id = str(uuid.uuid4())
     message = request.message
+    started = time.perf_counter()
+    branch = start_branch()
+    trace_request(request_id)
+    start_deadline(raw_request)
 
     secure_log("info", "Chat request received", request_id,
                message_length=len(message),
@@ -1011,8 +4689,12 @@ async def chat(request: ChatRequestV1):
                section_context=request.sectionContext)
 
     # 1. Boundary check
-    if not check_boundary(message):
+    with trace_span("boundary"):
+        in_scope = check_boundary(message)
+    if not in_scope:
         secure_log("info", "Message outside boundary", request_id)
+        branch.branch = "boundary"
+        chat_branch_duration.labels("/chat", branch.branch).observe(time.perf_counter() - started)
         return ChatResponseV1(
             response=(
                 "Obrigado pelo seu interesse! Sou o assistente virtual da Arbache Consulting "
@@ -1023,43 +4705,48 @@ async def chat(request: ChatRequestV1):
             request_id=request_id,
         )
 
-    # 2. Query Perplexity
-    perplexity_response = await query_perplexity(message, request_id)
-
-    # 3. Curate with Anthropic
-    response = await curate_with_anthropic(message, perplexity_response, request_id)
+    # 2-4. Perplexity → curadoria (cache na frente)
+    with trace_span("cache"):
+        cache_key = response_cache.make_key("v1", message)
+        await response_cache.load_shared(cache_key)
+        await response_cache.load_persisted(cache_key)
+        cleaned_response = response_cache.get(
+            cache_key, refresh=lambda: run_v1_pipeline(message, str(uuid.uuid4()))
+        )
+    semantic_key = f"v1:{request.section or ''}"
+    if cleaned_response:
+        secure_log("info", "Response cache hit", request_id)
+        branch.branch = "cache"
+    elif cleaned_response := semantic_cache.lookup(message, semantic_key):
+        secure_log("info", "Semantic cache hit", request_id)
+        branch.branch = "semantic_cache"
+        response_cache.set(cache_key, cleaned_response)
+    else:
+        async def compute() -> Optional[str]:
+            result = await run_v1_pipeline(message, request_id)
+            if result:
+                response_cache.set(cache_key, result)
+                semantic_cache.add(message, semantic_key, result)
+            return result
 
-    # 4. Fallback to OpenAI
-    if not response:
-        response = await curate_with_openai(message, perplexity_response, request_id)
+        # Perguntas idênticas em voo compartilham um único pipeline
+        cleaned_response = await pipeline_flights.run(cache_key, compute)
 
-    # 5. Fallback estático
-    if not response:
+    # 5. Fallback estático (nunca vai para o cache)
+    if not cleaned_response:
         secure_log("warn", "Using static fallback", request_id)
-        response = (
-            "Obrigado pela sua pergunta! A Arbache Consulting oferece soluções integradas "
-            "em educação corporativa, liderança e sustentabilidade.\n\n"
-            "Nossos principais serviços incluem:\n"
-            "• Trilhas e Programas Educacionais\n"
-            "• Formação de Lideranças\n"
-            "• Assessment de Soft Skills com IA\n"
-            "• Mentoria de Alto Impacto\n"
-            "• Consultoria em ESG e Sustentabilidade\n\n"
-            "Para mais informações ou para agendar uma conversa com nossa equipe, "
-            "entre em contato através do formulário no site.\n\n"
-            "Como posso ajudá-lo especificamente?"
-        )
-
-    # 6. Clean response
-    cleaned_response = clean_response(response)
+        branch.branch = "static"
+        cleaned_response = clean_response(V1_STATIC_FALLBACK)
 
-    # 7. Validar output (Pydantic faz automaticamente)
-    result = ChatResponseV1(
-        response=cleaned_response,
-        request_id=request_id,
-    )
+    # 6. Validar output (Pydantic faz automaticamente)
+    with trace_span("validation"):
+        result = ChatResponseV1(
+            response=cleaned_response,
+            request_id=request_id,
+        )
 
     secure_log("info", "Chat response sent", request_id, response_length=len(cleaned_response))
+    chat_branch_duration.labels("/chat", branch.branch).observe(time.perf_counter() - started)
 
     return result
 
@@ -1068,51 +4755,274 @@ async def chat(request: ChatRequestV1):
 # V2 ENDPOINT
 # ===================================
 
-@app.post("/v2/chat", response_model=ChatResponseV2)
-async def chat_v2(request: ChatRequestV2, raw_request: Request):
-    """
-    Chat v2 — OpenAI primário, Perplexity para elaboradas, Claude fallback.
+V2_STATIC_FALLBACK = (
+    "Trabalhamos com educação corporativa, liderança e sustentabilidade. "
+    "Posso te contar mais sobre qualquer uma dessas áreas — qual te interessa?"
+)
 
-    Fluxo:
-    1. Rate limit check
-    2. FAQ check → resposta instantânea
-    3. Pergunta simples → OpenAI com contexto da seção
-    4. Pergunta elaborada → Perplexity + curadoria OpenAI
-    5. Fallback → Claude
-    6. Fallback estático
-    7. Limpa + trunca (5 linhas)
-    8. Gera sugestões de follow-up
+
+# ===================================
+# RESPOSTAS PRÉ-COMPUTADAS (chips de sugestão)
+# ===================================
+
+class _ChipAnswer:
+    __slots__ = ("answer", "section", "generated_at", "expires")
+
+    def __init__(self, answer: str, section: str, generated_at: float, expires: float) -> None:
+        self.answer = answer
+        self.section = section
+        self.generated_at = generated_at  # time.time(), para exibição
+        self.expires = expires  # time.monotonic()
+
+
+class ChipAnswerTable:
+    """
+    Respostas geradas de antemão para o conjunto fechado de perguntas dos
+    chips: as `suggestions` de SECTION_CONTENT_V2 e as de follow-up.
+
+    Um job em background roda o pipeline v2 para cada pergunta (com no
+    máximo CHIP_PRECOMPUTE_CONCURRENCY em paralelo) no startup e a cada
+    CHIP_REFRESH_INTERVAL_S, e guarda a resposta já limpa e truncada numa
+    tabela em memória consultada como o FAQ. Perguntas que o FAQ ou a
+    saudação já respondem ficam de fora (e vão para o log no startup).
+    Se uma regeneração falhar, a resposta anterior continua valendo até
+    CHIP_ANSWER_MAX_AGE_S.
+
+    Com AnswerStore, as respostas também vão para o disco (cache
+    "chips"): cada rodada primeiro carrega o que já existe e só regenera
+    o que passou de CHIP_REFRESH_INTERVAL_S, então um reinício ou outro
+    worker reaproveita o trabalho. Com backend compartilhado, só o worker
+    eleito na janela (contador no StateBackend) chama os LLMs; os demais
+    só carregam do disco.
     """
-    request_id = str(uuid.uuid4())
-    message = request.message
-    section = request.section
-    section_data = get_section_data_v2(section)
-    section_context = request.sectionContext or section_data.get('summary', '')
 
-    client_ip = raw_request.client.host if raw_request.client else "unknown"
+    persist_as = "chips"
+
+    def __init__(self) -> None:
+        self._questions: dict[str, tuple[str, str]] = {}
+        self._skipped: dict[str, str] = {}
+        for key, chip in self.questions().items():
+            if check_faq_v2(chip[0]):
+                self._skipped[chip[0]] = "faq"
+            elif is_greeting(chip[0]):
+                self._skipped[chip[0]] = "greeting"
+            else:
+                self._questions[key] = chip
+        self._answers: dict[str, _ChipAnswer] = {}
+        self._lock = asyncio.Lock()
+        self._manual: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.refreshes = 0
+        self.failures = 0
+        self.last_refresh_at: Optional[float] = None
+        self.last_refresh_ms: Optional[float] = None
+
+    @staticmethod
+    def questions() -> dict[str, tuple[str, str]]:
+        """Pergunta normalizada → (texto original, seção usada como contexto)."""
+        chips: dict[str, tuple[str, str]] = {}
+        for section, data in SECTION_CONTENT_V2.items():
+            for question in data.get('suggestions', []):
+                chips.setdefault(normalize_text(question), (question, section))
+        for suggestions in _FOLLOW_UP_BY_TOPIC.values():
+            for question in suggestions:
+                chips.setdefault(normalize_text(question), (question, "hero"))
+        return chips
+
+    def log_coverage(self) -> None:
+        """Loga os chips sem pré-computação e os que o boundary recusaria."""
+        for question, reason in self._skipped.items():
+            secure_log("info", "Chip not precomputed, answered without LLM", "precompute",
+                       question=question, reason=reason)
+        for question, _ in self._questions.values():
+            if not check_boundary(question):
+                # Sem resposta pré-computada, o clique cai na recusa do boundary
+                secure_log("warn", "Chip outside boundary", "precompute", question=question)
+
+    def lookup(self, message: str) -> Optional[str]:
+        entry = self._answers.get(normalize_text(message))
+        if entry is None or time.monotonic() >= entry.expires:
+            return None
+        self.hits += 1
+        return entry.answer
+
+    async def _generate(self, key: str, question: str, section: str,
+                        limit: asyncio.Semaphore) -> bool:
+        async with limit:
+            summary = get_section_data_v2(section).get('summary', '')
+            try:
+                answer = await run_v2_pipeline(question, summary, None, "precompute")
+            except Exception as e:
+                secure_log("warn", "Chip precompute failed", "precompute",
+                           question=question, error=str(e))
+                answer = None
+        if not answer:
+            return False
+        generated_at = time.time()
+        self._answers[key] = _ChipAnswer(
+            answer, section, generated_at, time.monotonic() + CHIP_ANSWER_MAX_AGE_S,
+        )
+        if answer_store is not None:
+            answer_store.put(self.persist_as, key, answer, generated_at + CHIP_REFRESH_INTERVAL_S,
+                             generated_at + max(CHIP_ANSWER_MAX_AGE_S, CHIP_REFRESH_INTERVAL_S))
+        return True
 
-    secure_log("info", "V2 chat request received", request_id,
-               message_length=len(message), section=section)
+    async def load_persisted(self) -> set[str]:
+        """Carrega do AnswerStore as respostas ainda válidas; retorna as que ainda estão frescas."""
+        fresh: set[str] = set()
+        if answer_store is None:
+            return fresh
+        for key, (_, section) in self._questions.items():
+            try:
+                row = await answer_store.fetch(self.persist_as, key)
+            except sqlite3.Error as e:
+                secure_log("warn", "Answer store read failed", "precompute", error=str(e))
+                return fresh
+            if row is None:
+                continue
+            answer, fresh_until, stale_until = row
+            now = time.time()
+            generated_at = fresh_until - CHIP_REFRESH_INTERVAL_S
+            current = self._answers.get(key)
+            if current is None or current.generated_at < generated_at:
+                self._answers[key] = _ChipAnswer(
+                    answer, section, generated_at, time.monotonic() + (stale_until - now),
+                )
+            if fresh_until > now:
+                fresh.add(key)
+        return fresh
+
+    async def _elected(self) -> bool:
+        """Com backend compartilhado e disco, só o primeiro worker da janela regenera."""
+        if not state_backend.shared or answer_store is None:
+            return True
+        key = f"chips:refresh:{int(time.time() // CHIP_REFRESH_INTERVAL_S)}"
+        try:
+            result = await state_backend.batch(incr={key: 1}, ttl_s=2 * CHIP_REFRESH_INTERVAL_S)
+        except Exception as e:
+            secure_log("warn", "Chip refresh election failed, refreshing locally", "precompute",
+                       backend=state_backend.name, error=str(e))
+            return True
+        return result[key] == 1
+
+    async def refresh(self, force: bool = False) -> dict[str, float]:
+        """
+        Uma rodada (uma por vez): carrega do disco e regenera o que não
+        está fresco, se este worker foi eleito. `force` regenera tudo.
+        """
+        async with self._lock:
+            started = time.perf_counter()
+            fresh = set() if force else await self.load_persisted()
+            pending = {key: chip for key, chip in self._questions.items() if key not in fresh}
+            if not pending:
+                secure_log("info", "Chip answers loaded from store", "precompute",
+                           questions=len(self._questions))
+                return self.stats()
+            if not (Config.has_openai() or Config.has_anthropic()):
+                secure_log("warn", "Chip precompute skipped, no LLM configured", "precompute")
+                return self.stats()
+            if not force and not await self._elected():
+                secure_log("info", "Chip precompute left to another worker", "precompute",
+                           pending=len(pending))
+                return self.stats()
+            limit = asyncio.Semaphore(CHIP_PRECOMPUTE_CONCURRENCY)
+            results = await asyncio.gather(*(
+                self._generate(key, question, section, limit)
+                for key, (question, section) in pending.items()
+            ))
+            if answer_store is not None:
+                # Os outros workers leem logo, sem esperar o flush periódico
+                try:
+                    await answer_store.flush()
+                except sqlite3.Error as e:
+                    secure_log("warn", "Answer store write failed", "precompute", error=str(e))
+            self.refreshes += 1
+            self.failures += results.count(False)
+            self.last_refresh_at = time.time()
+            self.last_refresh_ms = round((time.perf_counter() - started) * 1000, 1)
+            secure_log("info", "Chip answers refreshed", "precompute",
+                       questions=len(self._questions), generated=sum(results),
+                       duration_ms=self.last_refresh_ms)
+        return self.stats()
+
+    def trigger(self) -> bool:
+        """Refresh manual em background; False se já há uma rodada em andamento."""
+        if self._lock.locked() or (self._manual is not None and not self._manual.done()):
+            return False
+        self._manual = asyncio.create_task(self.refresh(force=True), context=Context())
+        return True
 
-    # 1. Rate limit
-    if not check_rate_limit(client_ip):
-        secure_log("warn", "V2 rate limit exceeded", request_id, client_ip=client_ip)
-        raise HTTPException(status_code=429, detail="Muitas requisições. Aguarde um momento.")
+    async def run_forever(self) -> None:
+        """
+        Job de background do lifespan: rodada no startup e depois periódica.
+        Enquanto faltar resposta (outro worker gerando), volta a carregar
+        do disco a cada CHIP_RELOAD_S.
+        """
+        self.log_coverage()
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                secure_log("error", "Chip precompute round failed", "precompute", error=str(e))
+            complete = len(self._answers) >= len(self._questions)
+            await asyncio.sleep(
+                CHIP_REFRESH_INTERVAL_S if complete else min(CHIP_RELOAD_S, CHIP_REFRESH_INTERVAL_S)
+            )
+
+    def stats(self) -> dict[str, float]:
+        now = time.time()
+        ages = [now - entry.generated_at for entry in self._answers.values()]
+        return {
+            "questions": len(self._questions),
+            "answers": len(self._answers),
+            "hits": self.hits,
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+            "last_refresh_at": self.last_refresh_at or 0.0,
+            "last_refresh_ms": self.last_refresh_ms or 0.0,
+            "oldest_answer_age_s": round(max(ages), 1) if ages else 0.0,
+        }
+
+
+chip_answers = ChipAnswerTable()
 
-    # 2. FAQ check
+
+def v2_shortcut_response(
+    request: ChatRequestV2,
+    section_data: dict,
+    request_id: str,
+) -> Optional[ChatResponseV2]:
+    """FAQ, chips pré-computados, saudação e boundary: respostas imediatas, sem LLM."""
+    message = request.message
+
+    # FAQ check
     faq_answer = check_faq_v2(message)
     if faq_answer:
         secure_log("info", "V2 FAQ hit", request_id)
+        mark_branch("faq")
         return ChatResponseV2(
             response=faq_answer,
             badges=section_data.get('badges', []),
-            suggestions=generate_follow_up_suggestions(message, section),
+            suggestions=generate_follow_up_suggestions(message, request.section),
+            request_id=request_id,
+        )
+
+    # Chip de sugestão com resposta pré-computada
+    chip_answer = chip_answers.lookup(message)
+    if chip_answer:
+        secure_log("info", "V2 precomputed chip hit", request_id)
+        mark_branch("chip")
+        return ChatResponseV2(
+            response=chip_answer,
+            badges=section_data.get('badges', []),
+            suggestions=generate_follow_up_suggestions(message, request.section),
             request_id=request_id,
         )
 
-    # 2.5 Greeting check — resposta rápida sem LLM
+    # Greeting check — resposta rápida sem LLM
     if is_greeting(message) and not request.conversationHistory:
         secure_log("info", "V2 greeting detected", request_id)
+        mark_branch("greeting")
         return ChatResponseV2(
             response="Olá! Que bom ter você aqui. O que gostaria de saber sobre a Arbache Consulting?",
             badges=section_data.get('badges', []),
@@ -1120,9 +5030,10 @@ async def chat_v2(request: ChatRequestV2, raw_request: Request):
             request_id=request_id,
         )
 
-    # 3. Boundary check
+    # Boundary check
     if not check_boundary(message):
         secure_log("info", "V2 message outside boundary", request_id)
+        mark_branch("boundary")
         return ChatResponseV2(
             response=(
                 "Sou o assistente da Arbache Consulting e posso ajudá-lo com "
@@ -1134,53 +5045,380 @@ async def chat_v2(request: ChatRequestV2, raw_request: Request):
             request_id=request_id,
         )
 
+    return None
+
+
+async def stream_curation_v2(question: str, perplexity_raw: str, request_id: str) -> AsyncIterator[str]:
+    """
+    Curadoria da pesquisa Perplexity em streaming.
+
+    Mesmo fallback de query_perplexity_v2: sem OpenAI, com o breaker
+    aberto ou se a curadoria não devolver nada, vai a pesquisa bruta.
+    """
+    curated = False
+    if Config.has_openai():
+        secure_log("info", "V2: Curating Perplexity response via OpenAI", request_id)
+        async with aclosing(stream_openai_v2(
+            build_curation_v2_payload(question, perplexity_raw), request_id
+        )) as deltas:
+            async for delta in deltas:
+                curated = True
+                yield delta
+    if not curated:
+        yield perplexity_raw
+
+
+async def run_v2_pipeline(
+    message: str,
+    section_context: str,
+    conversation_history: Optional[list[ConversationMessage]],
+    request_id: str,
+) -> Optional[str]:
+    """
+    Perplexity (elaboradas) → OpenAI → Claude.
+
+    Retorna a resposta já limpa e truncada, ou None se nenhum LLM respondeu.
+    """
     response: Optional[str] = None
 
-    # 4. Pergunta elaborada → Perplexity + curadoria
+    # Pergunta elaborada → Perplexity + curadoria
     if is_elaborate_question(message):
         secure_log("info", "V2 elaborate question detected", request_id)
         response = await query_perplexity_v2(message, section_context, request_id)
-
-    # 5. OpenAI (primário ou fallback de Perplexity)
-    if not response:
-        response = await query_openai_v2(
-            message, section_context, request.conversationHistory, request_id
+        if response:
+            mark_branch("elaborate")
+
+    # OpenAI (primário) → Claude (fallback ou hedge em paralelo)
+    if not response and deadline_spent():
+        secure_log("warn", "Deadline spent before LLM fallback", request_id)
+    elif not response:
+        response = await query_v2_with_fallback(
+            message, section_context, conversation_history, request_id
         )
 
-    # 6. Fallback → Claude (com prompt conversacional v2)
     if not response:
-        response = await query_anthropic_v2(
-            message, section_context, request.conversationHistory, request_id
-        )
+        return None
 
-    # 7. Fallback estático (conversacional, sem lista)
-    if not response:
-        secure_log("warn", "V2 using static fallback", request_id)
-        response = (
-            "Trabalhamos com educação corporativa, liderança e sustentabilidade. "
-            "Posso te contar mais sobre qualquer uma dessas áreas — qual te interessa?"
+    # Clean + truncate
+    with trace_span("sanitize"):
+        return sanitize_response(response)
+
+
+@app.post("/v2/chat", response_model=ChatResponseV2)
+async def chat_v2(request: ChatRequestV2, raw_request: Request):
+    """
+    Chat v2 — OpenAI primário, Perplexity para elaboradas, Claude fallback.
+
+    Fluxo:
+    1. Rate limit check
+    2. FAQ check → resposta instantânea
+    3. Pergunta simples → OpenAI com contexto da seção
+    4. Pergunta elaborada → Perplexity + curadoria OpenAI
+    5. Fallback → Claude
+    6. Fallback estático
+    7. Limpa + trunca (5 linhas)
+    8. Gera sugestões de follow-up
+    """
+    request_id = str(uuid.uuid4())
+    started = time.perf_counter()
+    branch = start_branch()
+    trace_request(request_id)
+    start_deadline(raw_request)
+
+    client_ip = client_identity(raw_request)
+
+    secure_log("info", "V2 chat request received", request_id,
+               message_length=len(request.message), section=request.section)
+
+    # 1. Rate limit (com backend compartilhado, já traz a entrada do cache)
+    cache_key = v2_cache_key(request)
+    with trace_span("rate_limit"):
+        allowed = await check_rate_limit(client_ip, prefetch=cache_key)
+    if not allowed:
+        secure_log("warn", "V2 rate limit exceeded", request_id, client_ip=client_ip)
+        rate_limit_rejections.labels("/v2/chat").inc()
+        raise HTTPException(status_code=429, detail="Muitas requisições. Aguarde um momento.")
+
+    result = await answer_v2(request, request_id, cache_key, prefetched=True)
+    chat_branch_duration.labels("/v2/chat", branch.branch).observe(time.perf_counter() - started)
+    return result
+
+
+def v2_cache_key(request: ChatRequestV2) -> str:
+    return response_cache.make_key(
+        "v2", request.message, request.section, request.sectionContext, request.conversationHistory
+    )
+
+
+async def answer_v2(request: ChatRequestV2, request_id: str, cache_key: str,
+                    prefetched: bool = False) -> ChatResponseV2:
+    """
+    Passos 2-8 do /v2/chat (depois do rate limit); também usado pelo batch.
+
+    `prefetched`: o rate limit já trouxe a chave do backend compartilhado
+    no mesmo round-trip, então não precisa buscar de novo.
+    """
+    message = request.message
+    section = request.section
+    section_data = get_section_data_v2(section)
+    section_context = request.sectionContext or section_data.get('summary', '')
+
+    # 2-3. FAQ, saudação e boundary — respostas imediatas sem LLM
+    with trace_span("shortcut"):
+        shortcut = v2_shortcut_response(request, section_data, request_id)
+    if shortcut:
+        return shortcut
+
+    # 4-6. Pipeline de LLMs (cache na frente)
+    with trace_span("cache"):
+        if not prefetched:
+            await response_cache.load_shared(cache_key)
+        await response_cache.load_persisted(cache_key)
+        cleaned = response_cache.get(
+            cache_key,
+            refresh=lambda: run_v2_pipeline(
+                message, section_context, request.conversationHistory, str(uuid.uuid4())
+            ),
         )
+    # Respostas com histórico dependem da conversa: só cache exato
+    semantic_key = None if request.conversationHistory else f"v2:{section or ''}"
+    if cleaned:
+        secure_log("info", "V2 response cache hit", request_id)
+        mark_branch("cache")
+    elif semantic_key and (cleaned := semantic_cache.lookup(message, semantic_key)):
+        secure_log("info", "V2 semantic cache hit", request_id)
+        mark_branch("semantic_cache")
+        response_cache.set(cache_key, cleaned)
+    else:
+        async def compute() -> Optional[str]:
+            result = await run_v2_pipeline(
+                message, section_context, request.conversationHistory, request_id
+            )
+            if result:
+                response_cache.set(cache_key, result)
+                if semantic_key:
+                    semantic_cache.add(message, semantic_key, result)
+            return result
 
-    # 8. Clean + truncate
-    cleaned = clean_response(response)
-    cleaned = truncate_response(cleaned, max_lines=5)
+        # Perguntas idênticas em voo compartilham um único pipeline
+        with trace_span("pipeline"):
+            cleaned = await pipeline_flights.run(cache_key, compute)
 
-    # 9. Gera sugestões
+    # 7. Fallback estático (conversacional, sem lista; nunca vai para o cache)
+    if not cleaned:
+        secure_log("warn", "V2 using static fallback", request_id)
+        mark_branch("static")
+        cleaned = sanitize_response(V2_STATIC_FALLBACK)
+
+    # 8. Gera sugestões
     suggestions = generate_follow_up_suggestions(message, section)
 
-    result = ChatResponseV2(
-        response=cleaned,
-        badges=section_data.get('badges', []),
-        suggestions=suggestions,
-        request_id=request_id,
-    )
+    with trace_span("validation"):
+        result = ChatResponseV2(
+            response=cleaned,
+            badges=section_data.get('badges', []),
+            suggestions=suggestions,
+            request_id=request_id,
+        )
 
     secure_log("info", "V2 chat response sent", request_id,
                response_length=len(cleaned))
-
     return result
 
 
+@app.post("/v2/chat/batch", dependencies=[Depends(require_admin)])
+async def chat_v2_batch(batch: ChatBatchRequest, raw_request: Request):
+    """
+    Muitas perguntas pelo mesmo pipeline do /v2/chat (jobs internos: aquecer
+    respostas, avaliar prompts). Só com ADMIN_TOKEN; sem rate limit por IP.
+
+    Itens idênticos (mesma chave do cache de respostas) rodam uma vez; no
+    máximo `concurrency` pipelines em paralelo. A resposta é NDJSON, uma
+    linha por item na ordem em que terminam ({"index", "status",
+    "response" | "error", "deduplicated"}) e uma linha final com o resumo.
+    Cada item tem o próprio prazo (REQUEST_DEADLINE_MS ou o header).
+    """
+    batch_id = str(uuid.uuid4())
+    started = time.perf_counter()
+    concurrency = min(batch.concurrency or BATCH_CONCURRENCY, BATCH_MAX_CONCURRENCY)
+
+    groups: dict[str, list[int]] = {}
+    for index, item in enumerate(batch.items):
+        groups.setdefault(v2_cache_key(item), []).append(index)
+    secure_log("info", "V2 batch received", batch_id,
+               items=len(batch.items), unique=len(groups), concurrency=concurrency)
+    batch_items.labels("unique").inc(len(groups))
+    batch_items.labels("deduplicated").inc(len(batch.items) - len(groups))
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_item(cache_key: str, indices: list[int]) -> tuple[list[int], dict]:
+        item = batch.items[indices[0]]
+        async with semaphore:
+            item_started = time.perf_counter()
+            # Ramo e prazo por item (a tarefa herda o contexto do batch)
+            branch = _BranchMark()
+            _chat_branch.set(branch)
+            start_deadline(raw_request)
+            request_id = str(uuid.uuid4())
+            try:
+                result = await answer_v2(item, request_id, cache_key)
+            except Exception as e:
+                secure_log("error", "V2 batch item failed", batch_id,
+                           error_type=type(e).__name__, item_request_id=request_id)
+                return indices, {"status": 500, "error": "Erro interno ao processar o item."}
+            chat_branch_duration.labels("/v2/chat/batch", branch.branch).observe(
+                time.perf_counter() - item_started
+            )
+            return indices, {"status": 200, "response": result.model_dump()}
+
+    async def lines() -> AsyncIterator[bytes]:
+        tasks = [asyncio.create_task(run_item(key, indices)) for key, indices in groups.items()]
+        failed = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                indices, outcome = await next_done
+                failed += len(indices) if outcome["status"] != 200 else 0
+                for position, index in enumerate(indices):
+                    line = {"index": index, **outcome, "deduplicated": position > 0}
+                    yield json.dumps(line, ensure_ascii=False).encode() + b"\n"
+        finally:
+            # Cliente desconectou: não vale continuar gastando com o resto
+            for task in tasks:
+                task.cancel()
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+        secure_log("info", "V2 batch done", batch_id,
+                   items=len(batch.items), unique=len(groups), failed=failed, elapsed_ms=elapsed_ms)
+        yield json.dumps({"done": True, "items": len(batch.items), "unique": len(groups),
+                          "failed": failed, "elapsed_ms": elapsed_ms}).encode() + b"\n"
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# ===================================
+# V2 STREAMING ENDPOINT (SSE)
+# ===================================
+
+def _sse_event(event: str, data: dict) -> str:
+    """Formata um evento Server-Sent Events."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/v2/chat/stream")
+async def chat_v2_stream(request: ChatRequestV2, raw_request: Request):
+    """
+    Chat v2 em streaming (SSE) — mesmo pipeline do /v2/chat.
+
+    Eventos:
+    - `delta`: {"text": ...} trecho já limpo, na ordem de chegada
+    - `done`: {"response", "badges", "suggestions", "request_id"} com a
+      resposta final limpa e truncada (igual à do /v2/chat)
+
+    FAQ, saudação e boundary retornam direto um único `done`.
+    """
+    request_id = str(uuid.uuid4())
+    message = request.message
+    section = request.section
+    section_data = get_section_data_v2(section)
+    section_context = request.sectionContext or section_data.get('summary', '')
+
+    started = time.perf_counter()
+    branch = start_branch()
+    trace_request(request_id)
+    start_deadline(raw_request)
+
+    client_ip = client_identity(raw_request)
+
+    secure_log("info", "V2 stream request received", request_id,
+               message_length=len(message), section=section)
+
+    with trace_span("rate_limit"):
+        allowed = await check_rate_limit(client_ip)
+    if not allowed:
+        secure_log("warn", "V2 rate limit exceeded", request_id, client_ip=client_ip)
+        rate_limit_rejections.labels("/v2/chat/stream").inc()
+        raise HTTPException(status_code=429, detail="Muitas requisições. Aguarde um momento.")
+
+    with trace_span("shortcut"):
+        shortcut = v2_shortcut_response(request, section_data, request_id)
+
+    async def events() -> AsyncIterator[str]:
+        if shortcut:
+            chat_branch_duration.labels("/v2/chat/stream", branch.branch).observe(
+                time.perf_counter() - started
+            )
+            yield _sse_event("done", shortcut.model_dump())
+            return
+
+        cleaner = StreamingCleaner(max_lines=5)
+        sources: list[tuple[str, AsyncIterator[str]]] = []
+
+        # Pergunta elaborada → pesquisa Perplexity, curadoria em streaming
+        if is_elaborate_question(message):
+            secure_log("info", "V2 elaborate question detected", request_id)
+            with trace_span("perplexity"):
+                research = await query_perplexity(message, request_id)
+            if research:
+                sources.append(("elaborate", stream_curation_v2(message, research, request_id)))
+
+        sources.append(("openai", stream_openai_v2(
+            build_openai_v2_payload(message, section_context, request.conversationHistory),
+            request_id,
+        )))
+        sources.append(("anthropic", stream_anthropic_v2(
+            build_anthropic_v2_payload(message, section_context, request.conversationHistory),
+            request_id,
+        )))
+
+        for name, source in sources:
+            if cleaner.raw_text or deadline_spent():
+                await source.aclose()
+                continue
+            branch.branch = name
+            with trace_span(f"stream.{name}"):
+                async with aclosing(source) as deltas:
+                    async for delta in deltas:
+                        out = cleaner.feed(delta)
+                        if out:
+                            yield _sse_event("delta", {"text": out})
+                        if cleaner.done:
+                            break
+
+        if not cleaner.raw_text:
+            secure_log("warn", "V2 using static fallback", request_id)
+            branch.branch = "static"
+            out = cleaner.feed(V2_STATIC_FALLBACK) + cleaner.flush()
+        else:
+            out = cleaner.flush()
+        if out:
+            yield _sse_event("delta", {"text": out})
+
+        cleaned = sanitize_response(cleaner.raw_text)
+        result = ChatResponseV2(
+            response=cleaned,
+            badges=section_data.get('badges', []),
+            suggestions=generate_follow_up_suggestions(message, section),
+            request_id=request_id,
+        )
+        secure_log("info", "V2 stream response sent", request_id,
+                   response_length=len(cleaned))
+        chat_branch_duration.labels("/v2/chat/stream", branch.branch).observe(
+            time.perf_counter() - started
+        )
+        yield _sse_event("done", result.model_dump())
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
+    # Workers, uvloop/httptools e Unix socket: ver serve.py
+    import serve
+    serve.main()
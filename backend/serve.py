@@ -0,0 +1,126 @@
+"""
+Arbache LP Backend - Launcher de produção
+
+Sobe `main:app` no uvicorn com:
+- workers dimensionados pelos CPUs realmente disponíveis (afinidade e
+  limite de CPU do cgroup, v1 ou v2), sobrescrevível por WEB_CONCURRENCY,
+  só quando STATE_BACKEND_URL é compartilhado (sqlite:// ou redis://);
+  com memory:// cada worker teria o próprio rate limit, caches,
+  single-flight e chips, então sobe um worker só
+- uvloop/httptools quando instalados (uvicorn[standard])
+- Unix domain socket opcional (UDS_PATH) para o proxy_pass do nginx
+  não passar pelo TCP de loopback
+
+O warmup de cada worker roda no lifespan de `main`, antes de ele
+começar a aceitar conexões.
+
+Uso:
+    python serve.py
+    STATE_BACKEND_URL=sqlite:////var/lib/arbache/state.db WEB_CONCURRENCY=4 \
+        UDS_PATH=/run/arbache/api.sock python serve.py
+"""
+
+import importlib.util
+import math
+import os
+import sys
+from typing import Optional
+
+import uvicorn
+
+CGROUP_V2_CPU_MAX = "/sys/fs/cgroup/cpu.max"
+CGROUP_V1_QUOTA = "/sys/fs/cgroup/cpu/cpu.cfs_quota_us"
+CGROUP_V1_PERIOD = "/sys/fs/cgroup/cpu/cpu.cfs_period_us"
+
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def cgroup_cpu_limit() -> Optional[float]:
+    """Limite de CPU do container (quota / período), ou None se não houver."""
+    cpu_max = _read(CGROUP_V2_CPU_MAX)
+    if cpu_max:
+        quota, _, period = cpu_max.partition(" ")
+        if quota != "max" and period:
+            return int(quota) / int(period)
+        return None
+
+    quota, period = _read(CGROUP_V1_QUOTA), _read(CGROUP_V1_PERIOD)
+    if quota and period and int(quota) > 0:
+        return int(quota) / int(period)
+    return None
+
+
+def available_cpus() -> int:
+    """CPUs que o processo pode de fato usar."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # macOS
+        cpus = os.cpu_count() or 1
+    limit = cgroup_cpu_limit()
+    if limit is not None:
+        cpus = min(cpus, max(1, math.ceil(limit)))
+    return max(1, cpus)
+
+
+def shared_state() -> bool:
+    """STATE_BACKEND_URL é visto por todos os workers (sqlite ou redis)."""
+    url = os.getenv("STATE_BACKEND_URL", "memory://")
+    return url.startswith(("sqlite://", "redis://", "rediss://"))
+
+
+def worker_count() -> int:
+    """WEB_CONCURRENCY se definido; senão um worker por CPU, até WORKERS_MAX,
+    se o estado for compartilhado, e um só com memory://."""
+    configured = os.getenv("WEB_CONCURRENCY")
+    if configured:
+        return max(1, int(configured))
+    if not shared_state():
+        return 1
+    return min(available_cpus(), int(os.getenv("WORKERS_MAX", "8")))
+
+
+def _has(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def server_options() -> dict:
+    options: dict = {
+        "workers": worker_count(),
+        "loop": "uvloop" if _has("uvloop") else "asyncio",
+        "http": "httptools" if _has("httptools") else "h11",
+        # O IP do visitante é resolvido em main.client_identity (TRUSTED_PROXIES)
+        "proxy_headers": False,
+        "server_header": False,
+        "timeout_keep_alive": int(os.getenv("KEEPALIVE_TIMEOUT_S", "30")),
+        "log_level": os.getenv("UVICORN_LOG_LEVEL", "warning"),
+    }
+    uds = os.getenv("UDS_PATH")
+    if uds:
+        options["uds"] = uds
+    else:
+        options["host"] = os.getenv("HOST", "0.0.0.0")
+        options["port"] = int(os.getenv("PORT", "8001"))
+    return options
+
+
+def main() -> None:
+    options = server_options()
+    if options["workers"] > 1 and not shared_state():
+        # Cada worker teria o próprio rate limit, caches e chips (N vezes o custo de LLM)
+        sys.exit(f"Refusing to start {options['workers']} workers with STATE_BACKEND_URL="
+                 f"{os.getenv('STATE_BACKEND_URL', 'memory://')}; use sqlite:/// or redis://, "
+                 "or WEB_CONCURRENCY=1")
+    bind = options.get("uds") or f"{options['host']}:{options['port']}"
+    print(f"Starting main:app on {bind} with {options['workers']} worker(s), "
+          f"loop={options['loop']} http={options['http']}", flush=True)
+    uvicorn.run("main:app", **options)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,8 @@ import { getSection, type SectionContent } from '@/lib/agent-content'
 import { curateResponse, truncateToLines } from '@/lib/agent-curate'
 
 const API_URL = process.env.NEXT_PUBLIC_API_URL || 'https://api.arbache.com'
+// Prazo total da resposta; o backend cai no fallback estático ao esgotar
+const CHAT_DEADLINE_MS = 15000
 
 const SECTION_IDS = [
   'hero', 'proposito', 'quem-somos', 'nosso-ecossistema',
@@ -170,7 +172,10 @@ export function AgentButton() {
     try {
       const response = await fetch(`${API_URL}/v2/chat`, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: {
+          'Content-Type': 'application/json',
+          'X-Request-Deadline-Ms': String(CHAT_DEADLINE_MS),
+        },
         body: JSON.stringify({
           message: userMessage,
           section: currentSection,